@@ -0,0 +1,118 @@
+"""Recall and speed of the HNSW index of `ann_lightfm` against exact scoring.
+
+Exact top-k is the brute-force dot product of user embeddings with all
+item vectors stored in the index, which is what the HNSW index with
+`negdotprod` space approximates. For every `efSearch` of the sweep it
+reports recall@k, single-query latency percentiles and throughput of
+batch queries.
+
+Usage: python -m benchmarks.ann [--users N] [--k K] [--ef 10 50 100] [--threads T] [--json PATH]
+"""
+import argparse
+import json
+import time
+import typing as tp
+
+import dill
+import numpy as np
+from numpy.typing import NDArray
+
+from service.configuration import COMPACT_ANN, ANN_index_path, ANN_user_emb
+from service.reco_models.fm_scoring import top_k_indices_batch
+from service.reco_models.loaders import use_compact
+from service.reco_models.reco_models import load_hnsw_index
+from service.reco_models.storage import load_array
+
+
+def load_user_embeddings() -> NDArray[np.float32]:
+    if use_compact(COMPACT_ANN):
+        return np.asarray(load_array(COMPACT_ANN, "user_emb"), dtype=np.float32)
+    with open(ANN_user_emb, "rb") as f:
+        return np.asarray(dill.load(f), dtype=np.float32)
+
+
+def exact_top_k(
+    users: NDArray[np.float32], items: NDArray[np.float32], k: int, chunk_size: int = 256
+) -> tp.Tuple[NDArray[np.int64], float]:
+    """Returns exact top-k item indices of every user and seconds spent"""
+    started_at = time.perf_counter()
+    top = [
+        top_k_indices_batch(users[start : start + chunk_size] @ items.T, k)
+        for start in range(0, users.shape[0], chunk_size)
+    ]
+    return np.vstack(top), time.perf_counter() - started_at
+
+
+def recall_at_k(found: tp.Sequence[NDArray[np.int32]], exact: NDArray[np.int64]) -> float:
+    k = exact.shape[1]
+    hits = sum(np.intersect1d(row, exact_row[:k]).shape[0] for row, exact_row in zip(found, exact))
+    return hits / (k * exact.shape[0])
+
+
+def measure(
+    index: tp.Any, users: NDArray[np.float32], exact: NDArray[np.int64], k: int, num_threads: int
+) -> tp.Dict[str, float]:
+    latencies = np.empty(users.shape[0])
+    for i, user in enumerate(users):
+        started_at = time.perf_counter()
+        index.knnQuery(user, k=k)
+        latencies[i] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    neighbours = index.knnQueryBatch(users, k=k, num_threads=num_threads)
+    batch_seconds = time.perf_counter() - started_at
+
+    return {
+        "recall": recall_at_k([ids for ids, _ in neighbours], exact),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "qps": users.shape[0] / latencies.sum(),
+        "batch_qps": users.shape[0] / batch_seconds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000, help="number of sampled users")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef", type=int, nargs="+", default=[10, 20, 50, 100, 200, 400])
+    parser.add_argument("--threads", type=int, default=0, help="threads of batch queries, all cores if 0")
+    parser.add_argument("--json", help="path to write results to")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    index = load_hnsw_index(ANN_index_path)
+    items = np.vstack([index[i] for i in range(len(index))]).astype(np.float32)
+    user_embeddings = load_user_embeddings()
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(user_embeddings.shape[0], size=min(args.users, user_embeddings.shape[0]), replace=False)
+    users = np.ascontiguousarray(user_embeddings[sample])
+
+    exact, exact_seconds = exact_top_k(users, items, args.k)
+    print(f"{items.shape[0]} items, {users.shape[0]} users, k={args.k}")
+    print(f"exact: {users.shape[0] / exact_seconds:10.0f} batch qps")
+
+    results = []
+    print(f"{'efSearch':>8} {'recall':>8} {'p50, ms':>8} {'p99, ms':>8} {'qps':>10} {'batch qps':>10}")
+    for ef_search in args.ef:
+        index.setQueryTimeParams({"efSearch": ef_search})
+        result = {"ef_search": ef_search, **measure(index, users, exact, args.k, args.threads)}
+        results.append(result)
+        print(
+            f"{ef_search:>8} {result['recall']:>8.4f} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+            f"{result['qps']:>10.0f} {result['batch_qps']:>10.0f}"
+        )
+
+    if args.json:
+        report = {
+            "k": args.k,
+            "users": users.shape[0],
+            "exact_batch_qps": users.shape[0] / exact_seconds,
+            "sweep": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
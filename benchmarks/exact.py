@@ -0,0 +1,61 @@
+"""Exact brute-force search against the HNSW index of `ann_lightfm`.
+
+Builds `ExactIndex` over the item vectors of `models/lightfm/items_index.hnsw`
+with every storage dtype and measures it the same way as the index:
+recall@k against float32 exact top-k, p50/p99 single-query latency,
+single-query and batch QPS.
+
+Usage: python -m benchmarks.exact [--users N] [--k K] [--ef EF] [--block-size B] [--json PATH]
+"""
+import argparse
+import json
+import typing as tp
+
+import numpy as np
+
+from benchmarks.ann import exact_top_k, load_user_embeddings, measure
+from service.configuration import ANN_index_path
+from service.reco_models.exact_index import DTYPES, ExactIndex
+from service.reco_models.reco_models import load_hnsw_index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000, help="number of sampled users")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef", type=int, default=None, help="efSearch of HNSW index, index default if not set")
+    parser.add_argument("--block-size", type=int, default=16384)
+    parser.add_argument("--threads", type=int, default=0, help="threads of HNSW batch queries, all cores if 0")
+    parser.add_argument("--json", help="path to write results to")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    hnsw = load_hnsw_index(ANN_index_path, args.ef)
+    indexes: tp.Dict[str, tp.Any] = {"hnsw": hnsw}
+    for dtype in DTYPES:
+        indexes[f"exact {dtype}"] = ExactIndex.from_hnsw(hnsw, dtype=dtype, block_size=args.block_size)
+
+    user_embeddings = load_user_embeddings()
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(user_embeddings.shape[0], size=min(args.users, user_embeddings.shape[0]), replace=False)
+    users = np.ascontiguousarray(user_embeddings[sample])
+    exact, _ = exact_top_k(users, indexes["exact float32"].items, args.k)
+    print(f"{len(hnsw)} items, {users.shape[0]} users, k={args.k}")
+
+    results = {}
+    print(f"{'index':>14} {'recall':>8} {'p50, ms':>8} {'p99, ms':>8} {'qps':>10} {'batch qps':>10}")
+    for name, index in indexes.items():
+        result = measure(index, users, exact, args.k, args.threads)
+        results[name] = result
+        print(
+            f"{name:>14} {result['recall']:>8.4f} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+            f"{result['qps']:>10.0f} {result['batch_qps']:>10.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"k": args.k, "users": users.shape[0], "indexes": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
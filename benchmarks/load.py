@@ -0,0 +1,310 @@
+"""Throughput and latency of `/reco/{model_name}/{user_id}` under concurrent load.
+
+Every route is queried with the same mix of user ids: hot users known to
+LightFM, picked with Zipf-like popularity so that some of them repeat as
+in production, cold users having only features, and unknown users. The
+share of every kind is set by `--mix`.
+
+Targets:
+    asgi: the app is created in this process and called directly, so
+        only the service is measured, without HTTP server and client
+    uvicorn, gunicorn: `main:app` is started in a subprocess, which is
+        given `--startup-timeout` seconds to load models, and queried
+        over HTTP with keep-alive connections from client threads
+    url: an already running service at `--url`
+
+The app reads its settings from the environment as usual, e.g.
+`MODELS_ENABLED` or `CACHE_ENABLED`. Every route served with these
+settings is queried unless `--models` are given. QPS and p50/p95/p99 latency of
+every route are printed and written to `--json` together with the
+commit and settings of the run. `--compare` prints the change against
+results of a previous run.
+
+Usage: python -m benchmarks.load [--target asgi] [--models baseline knn ...] [--requests N]
+    [--concurrency C] [--mix 0.7 0.2 0.1] [--json PATH] [--compare PATH]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+import typing as tp
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+from numpy.typing import NDArray
+
+from service.api.views import model_registry, served_routes
+from service.reco_models import LightFMArtifacts
+from service.reco_models.loaders import ModelFactory
+from service.settings import get_config
+
+USER_KINDS = ("hot", "cold", "unknown")
+# Larger ids are rejected with 404 before any model is queried
+MAX_USER_ID = 10**9
+TOKEN = "Team_5"
+
+Result = tp.Tuple[NDArray[np.float64], tp.Counter[int], float]
+
+
+def sample_users(
+    artifacts: LightFMArtifacts, n_users: int, mix: tp.Sequence[float], rng: np.random.Generator
+) -> tp.Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """Returns user ids and the kind of every user, an index into `USER_KINDS`"""
+    hot = np.asarray(artifacts.user_mapping.keys)
+    cold = np.asarray(artifacts.cold_users.keys)
+    kinds = rng.choice(len(USER_KINDS), size=n_users, p=np.asarray(mix) / np.sum(mix))
+    users = np.empty(n_users, dtype=np.int64)
+
+    # Zipf ranks over shuffled hot users, popular ones are requested again
+    hot_ranks = (rng.zipf(1.2, size=n_users) - 1) % hot.shape[0]
+    users[kinds == 0] = rng.permutation(hot)[hot_ranks[kinds == 0]]
+    users[kinds == 1] = rng.choice(cold, size=int(np.sum(kinds == 1)))
+    known_max = int(max(hot.max(), cold.max() if cold.shape[0] else 0))
+    users[kinds == 2] = rng.integers(known_max + 1, MAX_USER_ID, size=int(np.sum(kinds == 2)))
+    return users, kinds
+
+
+def load_artifacts(factory: tp.Optional[ModelFactory] = None) -> LightFMArtifacts:
+    """Loads artifacts users are sampled from, shared with LightFM routes built by `factory`"""
+    return (factory if factory is not None else ModelFactory()).light_fm_artifacts()
+
+
+def summarize(latencies: NDArray[np.float64], statuses: tp.Counter[int], seconds: float) -> tp.Dict[str, float]:
+    p50, p95, p99 = (np.percentile(latencies, [50, 95, 99]) * 1000).tolist() if latencies.shape[0] else [0.0] * 3
+    return {
+        "requests": int(latencies.shape[0]),
+        "errors": sum(count for status, count in statuses.items() if status != 200),
+        "qps": latencies.shape[0] / seconds if seconds else 0.0,
+        "mean_ms": float(latencies.mean() * 1000) if latencies.shape[0] else 0.0,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+async def run_asgi(app: tp.Any, model_name: str, users: NDArray[np.int64], concurrency: int) -> Result:
+    latencies = np.empty(users.shape[0])
+    statuses: tp.Counter[int] = Counter()
+
+    async def request(position: int) -> None:
+        path = f"/reco/{model_name}/{users[position]}"
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"authorization", f"Bearer {TOKEN}".encode())],
+            "client": ("127.0.0.1", 12345),
+            "server": ("127.0.0.1", 8080),
+        }
+        status = 0
+
+        async def receive() -> tp.Dict[str, tp.Any]:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: tp.Dict[str, tp.Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        started_at = time.perf_counter()
+        await app(scope, receive, send)
+        latencies[position] = time.perf_counter() - started_at
+        statuses[status] += 1
+
+    async def virtual_user(first: int) -> None:
+        for position in range(first, users.shape[0], concurrency):
+            await request(position)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(virtual_user(first) for first in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started_at
+
+
+def run_http(url: str, model_name: str, users: NDArray[np.int64], concurrency: int) -> Result:
+    parts = urlsplit(url)
+    latencies = np.empty(users.shape[0])
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+
+    def virtual_user(first: int) -> tp.Counter[int]:
+        statuses: tp.Counter[int] = Counter()
+        # One keep-alive connection per client thread
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+        try:
+            for position in range(first, users.shape[0], concurrency):
+                started_at = time.perf_counter()
+                connection.request("GET", f"/reco/{model_name}/{users[position]}", headers=headers)
+                response = connection.getresponse()
+                response.read()
+                latencies[position] = time.perf_counter() - started_at
+                statuses[response.status] += 1
+        finally:
+            connection.close()
+        return statuses
+
+    statuses: tp.Counter[int] = Counter()
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(virtual_user, first) for first in range(concurrency)]:
+            statuses.update(future.result())
+    return latencies, statuses, time.perf_counter() - started_at
+
+
+def start_server(target: str, port: int, workers: int) -> "subprocess.Popen[bytes]":
+    env = {**os.environ, "HOST": "127.0.0.1", "PORT": str(port)}
+    if target == "uvicorn":
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)]
+    else:
+        env["GUNICORN_WORKERS"] = str(workers)
+        command = [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.config.py"]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)  # nosec
+
+
+def wait_healthy(url: str, server: "subprocess.Popen[bytes]", timeout: float) -> None:
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=5)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server is not healthy after {timeout} s")
+
+
+def git_commit() -> tp.Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()  # nosec
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_header(args: argparse.Namespace, kinds: NDArray[np.int64]) -> None:
+    print(
+        f"{args.target}, {args.concurrency} clients, {args.requests} requests per route, "
+        + ", ".join(f"{kind} {np.mean(kinds == code):.0%}" for code, kind in enumerate(USER_KINDS))
+    )
+    print(f"{'route':>12} {'qps':>9} {'mean, ms':>9} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9} {'errors':>7}")
+
+
+def write_report(args: argparse.Namespace, results: tp.Dict[str, tp.Dict[str, float]]) -> None:
+    report = {
+        "commit": git_commit(),
+        "target": args.target,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "mix": dict(zip(USER_KINDS, args.mix)),
+        "seed": args.seed,
+        "routes": results,
+    }
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def print_comparison(results: tp.Dict[str, tp.Dict[str, float]], path: str) -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nChange against {path} ({previous.get('commit')}):")
+    print(f"{'route':>12} {'qps':>9} {'p50':>9} {'p99':>9}")
+    for model_name, result in results.items():
+        before = previous["routes"].get(model_name)
+        if not before:
+            continue
+        changes = [
+            result[metric] / before[metric] - 1 if before[metric] else 0.0 for metric in ("qps", "p50_ms", "p99_ms")
+        ]
+        print(f"{model_name:>12} " + " ".join(f"{change:>+9.1%}" for change in changes))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("asgi", "uvicorn", "gunicorn", "url"), default="asgi")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="service of url target")
+    parser.add_argument("--port", type=int, default=8765, help="port of started server")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--models", nargs="+", help="routes to query, all served ones by default")
+    parser.add_argument("--requests", type=int, default=5000, help="requests per route")
+    parser.add_argument("--warmup", type=int, default=200, help="requests per route before measurement")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--mix", type=float, nargs=3, default=[0.7, 0.2, 0.1], help="share of hot, cold, unknown")
+    parser.add_argument("--json", help="path to write results to")
+    parser.add_argument("--compare", help="path to results of a previous run")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    model_names = args.models or list(served_routes(get_config().models_config))
+    rng = np.random.default_rng(args.seed)
+    server = None
+    if args.target == "asgi":
+        # pylint: disable=import-outside-toplevel
+        from service.api.app import create_app
+
+        app = create_app(get_config())
+        # After `create_app`, which installs the event loop policy of the service
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(app.router.startup())
+        # Served routes are not required to include LightFM, the factory loads it then
+        builder = model_registry.current.builder
+        artifacts = load_artifacts(builder if isinstance(builder, ModelFactory) else None)
+
+        def run(model_name: str, users: NDArray[np.int64]) -> Result:
+            return loop.run_until_complete(run_asgi(app, model_name, users, args.concurrency))
+
+    else:
+        url = args.url if args.target == "url" else f"http://127.0.0.1:{args.port}"
+        if args.target != "url":
+            server = start_server(args.target, args.port, args.workers)
+            wait_healthy(url, server, args.startup_timeout)
+        artifacts = load_artifacts()
+
+        def run(model_name: str, users: NDArray[np.int64]) -> Result:
+            return run_http(url, model_name, users, args.concurrency)
+
+    users, kinds = sample_users(artifacts, args.requests + args.warmup, args.mix, rng)
+    print_header(args, kinds)
+    results = {}
+    try:
+        for model_name in model_names:
+            run(model_name, users[: args.warmup])
+            result = summarize(*run(model_name, users[args.warmup :]))
+            results[model_name] = result
+            print(
+                f"{model_name:>12} {result['qps']:>9.0f} {result['mean_ms']:>9.2f} {result['p50_ms']:>9.2f} "
+                f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['errors']:>7}"
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        elif args.target == "asgi":
+            loop.run_until_complete(app.router.shutdown())
+
+    if args.json:
+        write_report(args, results)
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Per-request overhead of the middleware stack.
+
+Compares the former `BaseHTTPMiddleware` implementations with the pure ASGI
+ones on a tiny JSON endpoint, calling the ASGI app directly so that
+no HTTP server or client time is measured.
+
+Usage: python -m benchmarks.middlewares [--requests N]
+"""
+import argparse
+import asyncio
+import logging
+import time
+import typing as tp
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import (
+    BaseHTTPMiddleware,
+    RequestResponseEndpoint,
+)
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message
+
+from service.api.middlewares import (
+    AccessMiddleware,
+    ExceptionHandlerMiddleware,
+)
+from service.log import access_logger, app_logger
+from service.models import Error
+from service.response import server_error
+
+
+class BaseHTTPAccessMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        started_at = time.perf_counter()
+        response = await call_next(request)
+        request_time = time.perf_counter() - started_at
+        access_logger.info(
+            msg="",
+            extra={
+                "request_time": round(request_time, 4),
+                "status_code": response.status_code,
+                "requested_url": request.url,
+                "method": request.method,
+            },
+        )
+        return response
+
+
+class BaseHTTPExceptionHandlerMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        try:
+            return await call_next(request)
+        except Exception as e:  # pylint: disable=W0703,W1203
+            app_logger.exception(msg=f"Caught unhandled {e.__class__} exception: {e}")
+            return server_error([Error(error_key="server_error", error_message="Internal Server Error")])
+
+
+def build_app(middlewares: tp.Sequence[tp.Type[tp.Any]]) -> ASGIApp:
+    app = FastAPI()
+
+    @app.get("/reco/{user_id}")
+    async def reco(user_id: int) -> tp.Dict[str, tp.Any]:
+        return {"user_id": user_id, "items": list(range(10))}
+
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+async def measure(app: ASGIApp, n_requests: int) -> float:
+    """Returns mean seconds per request"""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/reco/1",
+        "raw_path": b"/reco/1",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("127.0.0.1", 8080),
+    }
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        pass
+
+    for _ in range(100):
+        await app(dict(scope), receive, send)
+    started_at = time.perf_counter()
+    for _ in range(n_requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started_at) / n_requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    stacks: tp.Dict[str, tp.List[tp.Type[tp.Any]]] = {
+        "no middlewares": [],
+        "BaseHTTPMiddleware": [BaseHTTPExceptionHandlerMiddleware, BaseHTTPAccessMiddleware],
+        "pure ASGI": [ExceptionHandlerMiddleware, AccessMiddleware],
+    }
+    loop = asyncio.new_event_loop()
+    results = {
+        name: loop.run_until_complete(measure(build_app(stack), args.requests)) for name, stack in stacks.items()
+    }
+
+    baseline = results["no middlewares"]
+    for name, seconds in results.items():
+        print(f"{name:>20}: {seconds * 1e6:8.1f} us/request, overhead {(seconds - baseline) * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Micro-benchmarks of loading and predictions of every model on synthetic artifacts.
+
+Artifacts are generated by `benchmarks.synthetic` under `--root` unless
+they exist there, then converted to the compact format next to them.
+Every load path, from dill/pickle files and from compact files, and
+`predict` of every model for hot, cold and unknown users, as well as
+`predict_batch`, is timed call by call like `pytest-benchmark` does.
+
+Usage: python -m benchmarks.models [--root DIR] [--rounds N] [--batch-size B] [--json PATH]
+"""
+import argparse
+import json
+import os
+import time
+import typing as tp
+
+import numpy as np
+from numpy.typing import NDArray
+
+from benchmarks.synthetic import Scale, generate
+from service import configuration
+from service.reco_models import (
+    ANNLightFM,
+    ArtifactStore,
+    LightFMArtifacts,
+    OfflineKnnModel,
+    OnlineFM,
+    OnlineKnnModel,
+    PopularInCategory,
+    SimplePopularModel,
+)
+from service.reco_models.exact_index import ExactIndex
+
+K_RECS = 10
+
+
+def bench(func: tp.Callable[[int], tp.Any], rounds: int, warmup: int = 10) -> tp.Dict[str, float]:
+    """Times `func(i)` for every round `i` separately"""
+    for i in range(min(warmup, rounds)):
+        func(i)
+    timings = np.empty(rounds)
+    for i in range(rounds):
+        started_at = time.perf_counter()
+        func(i)
+        timings[i] = time.perf_counter() - started_at
+    return {
+        "rounds": rounds,
+        "min_us": float(timings.min() * 1e6),
+        "mean_us": float(timings.mean() * 1e6),
+        "p50_us": float(np.percentile(timings, 50) * 1e6),
+        "p99_us": float(np.percentile(timings, 99) * 1e6),
+        "ops": float(rounds / timings.sum()),
+    }
+
+
+def timed(load: tp.Callable[[], tp.Any]) -> tp.Tuple[tp.Any, tp.Dict[str, float]]:
+    started_at = time.perf_counter()
+    model = load()
+    seconds = time.perf_counter() - started_at
+    return model, {"rounds": 1, "min_us": seconds * 1e6, "mean_us": seconds * 1e6, "ops": 1 / seconds}
+
+
+class Paths:
+    """Paths of `service.configuration` under the root of synthetic artifacts"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def __getattr__(self, name: str) -> tp.Any:
+        value = getattr(configuration, name)
+        if isinstance(value, tuple):
+            return tuple(os.path.join(self.root, path) for path in value)
+        return os.path.join(self.root, value)
+
+
+def load_models(paths: Paths, results: tp.Dict[str, tp.Dict[str, float]]) -> tp.Dict[str, tp.Any]:
+    """Loads every model from files, converts it and loads it again from compact files"""
+    store = ArtifactStore(max_workers=1)
+    models: tp.Dict[str, tp.Any] = {}
+
+    popular, results["load popular"] = timed(
+        lambda: SimplePopularModel(paths.POPULAR_MODEL_USERS, paths.POPULAR_MODEL_RECS, ArtifactStore())
+    )
+    popular.save_compact(paths.COMPACT_POPULAR_MODEL)
+    models["popular"], results["load popular compact"] = timed(
+        lambda: SimplePopularModel.from_compact(paths.COMPACT_POPULAR_MODEL)
+    )
+
+    baseline, results["load baseline"] = timed(lambda: PopularInCategory(paths.POPULAR_IN_CATEGORY))
+    baseline.save_compact(paths.COMPACT_POPULAR_IN_CATEGORY)
+    models["baseline"], results["load baseline compact"] = timed(
+        lambda: PopularInCategory.from_compact(paths.COMPACT_POPULAR_IN_CATEGORY)
+    )
+
+    models["knn"], results["load knn"] = timed(lambda: OfflineKnnModel(paths.OFFLINE_KNN_MODEL_PATH, store))
+    models["online_knn"], results["load online_knn"] = timed(lambda: OnlineKnnModel(paths.ONLINE_KNN_MODEL_PATH, store))
+
+    artifacts, results["load light_fm"] = timed(
+        lambda: LightFMArtifacts(
+            ArtifactStore(),
+            name=paths.LIGHT_FM,
+            USER_MAPPING=paths.USER_MAPPING,
+            ITEM_MAPPING=paths.ITEM_MAPPING,
+            FEATURES_FOR_COLD=paths.FEATURES_FOR_COLD,
+            UNIQUE_FEATURES=paths.UNIQUE_FEATURES,
+        )
+    )
+    artifacts.save_compact(paths.COMPACT_LIGHT_FM)
+    artifacts, results["load light_fm compact"] = timed(lambda: LightFMArtifacts.from_compact(paths.COMPACT_LIGHT_FM))
+    models["light_fm_1"] = OnlineFM(artifacts, cold_with_fm=False)
+    models["light_fm_2"] = OnlineFM(artifacts)
+
+    ann, results["load ann_lightfm"] = timed(lambda: ANNLightFM(paths.ANN_PATHS, popular, store=ArtifactStore()))
+    ann.save_compact(paths.COMPACT_ANN)
+    models["ann_lightfm"], results["load ann_lightfm compact"] = timed(
+        lambda: ANNLightFM.from_compact(paths.COMPACT_ANN, paths.ANN_index_path, models["popular"])
+    )
+    models["ann_lightfm_exact"], results["load ann_lightfm_exact"] = timed(
+        lambda: ann.with_index(ExactIndex.from_hnsw(models["ann_lightfm"].index))
+    )
+    return models
+
+
+def predict_calls(
+    model: tp.Any, users: NDArray[np.int64], batch_size: int
+) -> tp.Tuple[tp.Callable[[int], tp.Any], tp.Callable[[int], tp.Any]]:
+    """Returns calls of `predict` and `predict_batch` of a model for the i-th user or batch"""
+    user_ids = users.tolist()
+    n_batches = max(len(user_ids) // batch_size, 1)
+
+    def batch(i: int) -> tp.List[int]:
+        start = i % n_batches * batch_size
+        return user_ids[start : start + batch_size]
+
+    return (
+        lambda i: model.predict(user_ids[i % len(user_ids)], K_RECS),
+        lambda i: model.predict_batch(batch(i), K_RECS),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="synthetic", help="directory of synthetic artifacts")
+    parser.add_argument("--users", type=int, default=Scale().hot_users, help="hot users of generated artifacts")
+    parser.add_argument("--rounds", type=int, default=2000, help="predict calls per model and user kind")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--json", help="path to write results to")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    paths = Paths(args.root)
+    if not os.path.exists(paths.LIGHT_FM):
+        print(f"Generating synthetic artifacts in {args.root}")
+        generate(args.root, Scale(hot_users=args.users), args.seed)
+
+    results: tp.Dict[str, tp.Dict[str, float]] = {}
+    models = load_models(paths, results)
+
+    rng = np.random.default_rng(args.seed)
+    artifacts = models["light_fm_2"].artifacts
+    users = {
+        "hot": rng.choice(np.asarray(artifacts.user_mapping.keys), size=args.rounds),
+        "cold": rng.choice(np.asarray(artifacts.cold_users.keys), size=args.rounds),
+        "unknown": rng.integers(10**8, 10**9, size=args.rounds),
+    }
+    for model_name, model in models.items():
+        for kind, kind_users in users.items():
+            predict, predict_batch = predict_calls(model, kind_users, args.batch_size)
+            results[f"{model_name} predict {kind}"] = bench(predict, args.rounds)
+            if kind == "hot":
+                n_batches = max(args.rounds // args.batch_size, 1)
+                results[f"{model_name} predict_batch {kind}"] = bench(predict_batch, n_batches, warmup=1)
+
+    print(f"{'benchmark':>40} {'rounds':>7} {'min, us':>11} {'mean, us':>11} {'p99, us':>11} {'ops':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:>40} {result['rounds']:>7} {result['min_us']:>11.1f} {result['mean_us']:>11.1f} "
+            f"{result.get('p99_us', result['mean_us']):>11.1f} {result['ops']:>10.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"root": args.root, "seed": args.seed, "benchmarks": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
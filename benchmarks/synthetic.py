@@ -0,0 +1,174 @@
+"""Synthetic model artifacts in the formats expected by the loaders.
+
+Writes every file listed in `service.configuration` under `--root`, so
+the service or the benchmarks can be run from there without the model
+files from Google Drive. Sizes follow the KION dataset by default:
+about a million users, 16k items, short watch histories with a heavy
+tail. Recos are random, only sizes and formats are realistic: categories
+and cold users features are named as in the real artifacts.
+
+Usage: python -m benchmarks.synthetic [--root DIR] [--users N] [--items N] [--components D]
+"""
+import argparse
+import os
+import pickle
+import typing as tp
+
+import dill
+import nmslib
+import numpy as np
+from lightfm import LightFM
+from numpy.typing import NDArray
+
+from benchmarks.user_knn import SyntheticUserKnn
+from service import configuration
+
+SEXES = ("М", "Ж")
+AGES = ("age_18_24", "age_25_34", "age_35_44", "age_45_54", "age_55_64", "age_65_inf")
+INCOMES = ("income_0_20", "income_20_40", "income_40_60", "income_60_90", "income_90_150", "income_150_inf")
+# Every category has recos, e.g. "age_25_34_income_20_40_Ж_0", the last part is the kids flag
+CATEGORIES = tuple(
+    f"{age}_{income}_{sex}_{kids}" for age in AGES for income in INCOMES for sex in SEXES for kids in (0, 1)
+)
+# Features of cold users, the values of `unique_features` are their strings
+FEATURES: tp.Dict[str, tp.Tuple[tp.Union[str, bool], ...]] = {
+    "sex": (*SEXES, "Unknown"),
+    "age": (*AGES, "Unknown"),
+    "income": (*INCOMES, "Unknown"),
+    "kids_flg": (True, False),
+}
+
+
+class Scale(tp.NamedTuple):
+    """Sizes of synthetic artifacts.
+
+    Attributes:
+        hot_users: The number of users with interactions
+        cold_users: The number of users having only features
+        items: The number of items
+        components: The number of LightFM components
+        mean_watched: The mean number of watched items of a hot user
+        recs: The number of precomputed recos of a user or category
+
+    """
+
+    hot_users: int = 900_000
+    cold_users: int = 60_000
+    items: int = 16_000
+    components: int = 32
+    mean_watched: float = 6.0
+    recs: int = 100
+
+
+def _dump(root: str, path: str, obj: tp.Any, use_pickle: bool = False) -> None:
+    full_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        (pickle if use_pickle else dill).dump(obj, f)
+
+
+def _lightfm(n_user_rows: int, n_items: int, components: int, rng: np.random.Generator) -> LightFM:
+    model = LightFM(no_components=components)
+    model._initialize(components, n_items, n_user_rows)  # pylint: disable=protected-access
+    model.item_embeddings = rng.normal(0, 0.1, (n_items, components)).astype(np.float32)
+    model.item_biases = rng.normal(0, 0.1, n_items).astype(np.float32)
+    model.user_embeddings = rng.normal(0, 0.1, (n_user_rows, components)).astype(np.float32)
+    model.user_biases = np.zeros(n_user_rows, dtype=np.float32)
+    return model
+
+
+def _watched(
+    users: NDArray[np.int64], items: NDArray[np.int64], scale: Scale, rng: np.random.Generator
+) -> tp.Dict[int, tp.List[int]]:
+    # Lognormal history lengths and item popularity give a heavy tail of both
+    lengths = rng.lognormal(np.log(scale.mean_watched) - 0.5, 1.0, users.shape[0]).astype(np.int64) + 1
+    lengths = np.minimum(lengths, 2000)
+    popularity = rng.lognormal(0, 2, items.shape[0])
+    watched = rng.choice(items, size=int(lengths.sum()), p=popularity / popularity.sum())
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    return {
+        user_id: np.unique(watched[offsets[i] : offsets[i + 1]]).tolist() for i, user_id in enumerate(users.tolist())
+    }
+
+
+def generate(root: str, scale: Scale = Scale(), seed: int = 42) -> None:
+    """Writes synthetic artifacts to the paths of `service.configuration` under `root`"""
+    rng = np.random.default_rng(seed)
+    external_users = rng.permutation(int((scale.hot_users + scale.cold_users) * 1.2))
+    hot = np.sort(external_users[: scale.hot_users])
+    cold = np.sort(external_users[scale.hot_users : scale.hot_users + scale.cold_users])
+    items = np.sort(rng.choice(scale.items * 2, size=scale.items, replace=False))
+    watched = _watched(hot, items, scale, rng)
+
+    def top() -> tp.List[int]:
+        return rng.choice(items, size=scale.recs, replace=False).tolist()
+
+    # Popular models
+    categories = rng.choice(len(CATEGORIES), size=hot.shape[0])
+    user_categories = {user_id: CATEGORIES[code] for user_id, code in zip(hot.tolist(), categories.tolist())}
+    _dump(root, configuration.POPULAR_MODEL_USERS, user_categories, use_pickle=True)
+    popular = {category: top() for category in CATEGORIES}
+    _dump(root, configuration.POPULAR_MODEL_RECS, {**popular, "popular_for_all": top()}, use_pickle=True)
+    _dump(
+        root,
+        configuration.POPULAR_IN_CATEGORY,
+        {
+            "user_to_watched_items_map": {user_id: set(user_items) for user_id, user_items in watched.items()},
+            "user_to_category_map": user_categories,
+            "category_to_popular_recs": {**popular, "default": top()},
+        },
+    )
+
+    # KNN models, a sample of users has precomputed recos
+    knn_users = rng.choice(hot, size=hot.shape[0] // 2, replace=False)
+    _dump(root, configuration.OFFLINE_KNN_MODEL_PATH, {user_id: top()[:10] for user_id in knn_users.tolist()})
+    neighbours = {user_id: rng.choice(hot, size=30) for user_id in knn_users.tolist()}
+    _dump(root, configuration.ONLINE_KNN_MODEL_PATH, SyntheticUserKnn(neighbours, watched, 10))
+
+    # LightFM with user ids and features as user features
+    features_codes = {name: rng.integers(len(values), size=cold.shape[0]).tolist() for name, values in FEATURES.items()}
+    features_for_cold = {
+        user_id: {name: FEATURES[name][codes[i]] for name, codes in features_codes.items()}
+        for i, user_id in enumerate(cold.tolist())
+    }
+    unique_features = np.array([str(value) for values in FEATURES.values() for value in values])
+    n_user_rows = hot.shape[0] + unique_features.shape[0]
+    _dump(root, configuration.LIGHT_FM, _lightfm(n_user_rows, scale.items, scale.components, rng))
+    _dump(root, configuration.USER_MAPPING, {user_id: i for i, user_id in enumerate(hot.tolist())})
+    _dump(root, configuration.ITEM_MAPPING, dict(enumerate(items.tolist())))
+    _dump(root, configuration.FEATURES_FOR_COLD, features_for_cold)
+    _dump(root, configuration.UNIQUE_FEATURES, unique_features)
+
+    # ANN over LightFM vectors with bias folded into the dot product
+    item_vectors = rng.normal(0, 0.1, (scale.items, scale.components + 1)).astype(np.float32)
+    user_vectors = rng.normal(0, 0.1, (hot.shape[0], scale.components + 1)).astype(np.float32)
+    index = nmslib.init(method="hnsw", space="negdotprod")
+    index.addDataPointBatch(item_vectors)
+    index.createIndex({"M": 16, "efConstruction": 100, "post": 0})
+    os.makedirs(os.path.dirname(os.path.join(root, configuration.ANN_index_path)), exist_ok=True)
+    index.saveIndex(os.path.join(root, configuration.ANN_index_path), save_data=True)
+    _dump(root, configuration.ANN_user_m, {user_id: i for i, user_id in enumerate(hot.tolist())})
+    _dump(root, configuration.ANN_item_inv_m, dict(enumerate(items.tolist())))
+    _dump(root, configuration.ANN_user_emb, user_vectors)
+    _dump(root, configuration.ANN_watched_u2i, watched)
+    _dump(root, configuration.ANN_COLD_RECO_DICT, {user_id: top()[:10] for user_id in cold.tolist()})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="synthetic", help="directory to write `models/` to")
+    defaults = Scale()
+    parser.add_argument("--users", type=int, default=defaults.hot_users, help="number of hot users")
+    parser.add_argument("--cold-users", type=int, default=defaults.cold_users)
+    parser.add_argument("--items", type=int, default=defaults.items)
+    parser.add_argument("--components", type=int, default=defaults.components)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    scale = Scale(hot_users=args.users, cold_users=args.cold_users, items=args.items, components=args.components)
+    generate(args.root, scale, args.seed)
+    print(f"Synthetic artifacts of {scale} written to {os.path.join(args.root, 'models')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Stand-in for the pickled user KNN model of synthetic artifacts"""
+import typing as tp
+from collections import Counter
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class SyntheticUserKnn:
+    """User KNN recommending items watched by the nearest neighbours.
+
+    It stands for the pickled model of `online_knn`. The class lives out
+    of `benchmarks.synthetic`, which is run as `__main__`, so dill pickles
+    it by reference and `benchmarks` must be importable when loaded.
+    """
+
+    def __init__(self, neighbours: tp.Dict[int, NDArray[np.int64]], watched: tp.Dict[int, tp.List[int]], n: int):
+        self.neighbours = neighbours
+        self.watched = watched
+        self.n = n
+
+    def predict(self, user_id: int) -> tp.Optional[tp.List[int]]:
+        neighbours = self.neighbours.get(user_id)
+        if neighbours is None:
+            return None
+        seen = set(self.watched.get(user_id, ()))
+        counts = Counter(
+            item_id
+            for neighbour in neighbours.tolist()
+            for item_id in self.watched.get(neighbour, ())
+            if item_id not in seen
+        )
+        return [item_id for item_id, _ in counts.most_common(self.n)]
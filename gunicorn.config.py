@@ -1,13 +1,21 @@
+import gc
+import os
+import tempfile
 from multiprocessing import cpu_count
 from os import getenv as env
 
 from service import log, settings
+from service.memory import format_memory, process_memory
+from service.metrics import clear_directory
 
 # The socket to bind.
 host = env("HOST", "0.0.0.0")
 port = int(env("PORT", "8080"))
 bind = f"{host}:{port}"
 
+# Metrics of workers are summed from their snapshots in this directory.
+os.environ.setdefault("METRICS_DIRECTORY", os.path.join(tempfile.gettempdir(), f"reco_service_metrics_{port}"))
+
 # The maximum number of pending connections.
 backlog = env("GUNICORN_BACKLOG", 2048)
 
@@ -72,6 +80,7 @@ limit_request_fields = env("GUNICORN_LIMIT_REQUEST_FIELDS", 64)
 limit_request_field_size = env("GUNICORN_LIMIT_REQUEST_FIELD_SIZE", 128)
 
 # Load application code before the worker processes are forked.
+# Models are then loaded once in the master and shared copy-on-write.
 preload_app = env("GUNICORN_PRELOAD_APP", False)
 
 # Disables the use of sendfile.
@@ -103,3 +112,23 @@ tmp_upload_dir = env("GUNICORN_TMP_UPLOAD_DIR", None)
 
 # Front-end’s IPs from which allowed to handle set secure headers.
 forwarded_allow_ips = env("GUNICORN_FORWARDER_ALLOW_IPS", "127.0.0.1")
+
+
+def on_starting(server):  # type: ignore
+    # Metrics of workers are summed from their files, drop ones of a previous run
+    clear_directory(settings.get_config().metrics_config.directory)
+
+
+def when_ready(server):  # type: ignore
+    # Move everything loaded by the master to the permanent generation,
+    # so garbage collection in workers does not touch and copy its pages.
+    gc.freeze()
+    server.log.info(f"Master memory: {format_memory(process_memory())}")
+
+
+def post_worker_init(worker):  # type: ignore
+    worker.log.info(f"Worker {worker.pid} memory: {format_memory(process_memory())}")
+
+
+def worker_exit(server, worker):  # type: ignore
+    server.log.info(f"Worker {worker.pid} memory at exit: {format_memory(process_memory())}")
@@ -3,9 +3,14 @@ import os
 import uvicorn
 
 from service.api.app import create_app
+from service.metrics import clear_directory
 from service.settings import get_config
 
 config = get_config()
+if __name__ == "__main__":
+    # Metrics of a previous run would be summed with the current ones,
+    # gunicorn clears them in `on_starting` before workers are forked
+    clear_directory(config.metrics_config.directory)
 app = create_app(config)
 
 
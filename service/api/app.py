@@ -5,11 +5,24 @@ from typing import Any, Dict
 import uvloop
 from fastapi import FastAPI
 
-from ..log import app_logger, setup_logging
+from ..log import (
+    app_logger,
+    setup_logging,
+    start_log_listener,
+    stop_log_listener,
+)
+from ..metrics import metrics
 from ..settings import ServiceConfig
 from .exception_handlers import add_exception_handlers
-from .middlewares import add_middlewares
-from .views import add_views
+from .executor import PredictExecutor
+from .middlewares import add_middlewares, add_profiling
+from .views import (
+    add_micro_batchers,
+    add_model_reloader,
+    add_models,
+    add_response_cache,
+    add_views,
+)
 
 __all__ = ("create_app",)
 
@@ -33,10 +46,27 @@ def create_app(config: ServiceConfig) -> FastAPI:
     setup_logging(config)
     setup_asyncio(thread_name_prefix=config.service_name)
 
+    metrics.configure(config.metrics_config.directory, config.metrics_config.flush_interval)
+
     app = FastAPI(debug=False)
+    app.add_event_handler("startup", start_log_listener)
+    app.add_event_handler("shutdown", stop_log_listener)
+    app.add_event_handler("shutdown", metrics.close)
     app.state.k_recs = config.k_recs
+    app.state.max_batch_size = config.max_batch_size
+    app.state.predict_executor = PredictExecutor.from_config(
+        config.executor_config,
+        thread_name_prefix=f"{config.service_name}_predict",
+    )
+    app.add_event_handler("shutdown", app.state.predict_executor.shutdown)
+    add_models(app, config.models_config, config.ann_config, config.exact_config)
+    add_micro_batchers(app, config.batching_config)
+    add_response_cache(app, config.cache_config)
+    add_model_reloader(app, config.reload_drain_timeout, config.reload_generation_path, config.reload_poll_interval)
 
     add_views(app)
+    # Innermost middleware, only the app is profiled
+    add_profiling(app, config.profiling_config)
     add_middlewares(app)
     add_exception_handlers(app)
 
@@ -0,0 +1,70 @@
+import asyncio
+import typing as tp
+from collections import defaultdict
+
+from service.reco_models.arrays import Reco
+
+BatchRunner = tp.Callable[..., tp.Awaitable[tp.Sequence[Reco]]]
+BatchKey = tp.Tuple[tp.Hashable, ...]
+Pending = tp.List[tp.Tuple[int, "asyncio.Future[Reco]"]]
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-user requests into one batch prediction.
+
+    Requests are collected for up to `max_delay` seconds or until
+    `max_batch_size` users are waiting, then scored with a single
+    `run_batch` call, and every waiting coroutine gets its own recos.
+    Requests with different `k_recs` or extra arguments are batched
+    separately, and extra arguments are passed to `run_batch` after
+    `k_recs`.
+
+    Attributes:
+        run_batch: The coroutine function scoring a list of users
+        max_batch_size: The number of users which triggers immediate flush
+        max_delay: The maximum time in seconds the first request waits
+
+    """
+
+    def __init__(self, run_batch: BatchRunner, max_batch_size: int = 64, max_delay: float = 0.002):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending: tp.DefaultDict[BatchKey, Pending] = defaultdict(list)
+        self._timers: tp.Dict[BatchKey, asyncio.TimerHandle] = {}
+        # The loop keeps only weak references to tasks
+        self._tasks: tp.Set["asyncio.Future[None]"] = set()
+
+    async def predict(self, user_id: int, k_recs: int, *args: tp.Hashable) -> Reco:
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Reco]" = loop.create_future()
+        key = (k_recs, *args)
+        pending = self._pending[key]
+        pending.append((user_id, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_delay, self._flush, key)
+        return await future
+
+    def _flush(self, key: BatchKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if batch:
+            task = asyncio.ensure_future(self._run(batch, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Pending, key: BatchKey) -> None:
+        try:
+            recos = await self.run_batch([user_id for user_id, _ in batch], *key)
+        except Exception as e:  # pylint: disable=broad-except
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), reco in zip(batch, recos):
+            if not future.done():
+                future.set_result(reco)
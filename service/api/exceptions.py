@@ -48,3 +48,47 @@ class BearerAccessTokenError(AppException):
         error_loc: tp.Optional[tp.Sequence[str]] = None,
     ):
         super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class BatchTooLargeError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        error_key: str = "batch_too_large",
+        error_message: str = "Too many users in batch",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class ReloadInProgressError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.CONFLICT,
+        error_key: str = "reload_in_progress",
+        error_message: str = "Models reload is already in progress",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class ModelsNotReadyError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.SERVICE_UNAVAILABLE,
+        error_key: str = "models_not_ready",
+        error_message: str = "Models are still loading",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class ProfilingDisabledError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.NOT_FOUND,
+        error_key: str = "profiling_disabled",
+        error_message: str = "Profiling is disabled",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
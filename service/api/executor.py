@@ -0,0 +1,89 @@
+import asyncio
+import typing as tp
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.thread import ThreadPoolExecutor
+from functools import partial
+
+from ..metrics import EXECUTOR_TASKS
+from ..profiling import current_profile, profiled_call
+from ..settings import ExecutorConfig
+
+T = tp.TypeVar("T")
+
+
+class PredictExecutor:
+    """Runs CPU-bound model predictions outside of the event loop.
+
+    Every model gets its own concurrency limit, so a slow model can not
+    occupy the whole pool, and requests above the limit wait in the queue
+    without blocking the loop. Only top-level functions should be passed
+    to `run` when a process pool is used, since they are pickled. During
+    a profiled request the prediction is run under `cProfile` too.
+
+    Attributes:
+        executor: The pool running predictions
+        max_concurrency: The maximum number of running predictions per model
+
+    """
+
+    def __init__(self, executor: Executor, max_concurrency: int):
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self._semaphores: tp.Dict[str, asyncio.Semaphore] = {}
+        self._queued: tp.DefaultDict[str, int] = defaultdict(int)
+        self._running: tp.DefaultDict[str, int] = defaultdict(int)
+
+    @classmethod
+    def from_config(cls, config: ExecutorConfig, thread_name_prefix: str = "") -> "PredictExecutor":
+        executor: Executor
+        if config.kind == "process":
+            executor = ProcessPoolExecutor(max_workers=config.max_workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=config.max_workers, thread_name_prefix=thread_name_prefix)
+        return cls(executor, config.max_concurrency)
+
+    def _semaphore(self, model_name: str) -> asyncio.Semaphore:
+        # Semaphores are created lazily to bind them to the running loop
+        if model_name not in self._semaphores:
+            self._semaphores[model_name] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[model_name]
+
+    async def run(self, model_name: str, func: tp.Callable[..., T], *args: tp.Any) -> T:
+        loop = asyncio.get_running_loop()
+        self._queued[model_name] += 1
+        self._report(model_name)
+        started = False
+        try:
+            async with self._semaphore(model_name):
+                started = True
+                self._queued[model_name] -= 1
+                self._running[model_name] += 1
+                self._report(model_name)
+                try:
+                    profile = current_profile.get()
+                    if profile is None:
+                        return await loop.run_in_executor(self.executor, partial(func, *args))
+                    result, stats = await loop.run_in_executor(self.executor, partial(profiled_call, func, *args))
+                    profile.add(stats)
+                    return result
+                finally:
+                    self._running[model_name] -= 1
+        finally:
+            if not started:
+                self._queued[model_name] -= 1
+            self._report(model_name)
+
+    def _report(self, model_name: str) -> None:
+        EXECUTOR_TASKS.set(self._queued[model_name], model=model_name, state="queued")
+        EXECUTOR_TASKS.set(self._running[model_name], model=model_name, state="running")
+
+    def stats(self) -> tp.Dict[str, tp.Dict[str, int]]:
+        """Returns number of queued and running predictions per model"""
+        return {
+            model_name: {"queued": self._queued[model_name], "running": self._running[model_name]}
+            for model_name in sorted(set(self._queued) | set(self._running))
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
@@ -1,54 +1,171 @@
+import asyncio
+import cProfile
+import random
+import re
 import time
+import typing as tp
+from http import HTTPStatus
 
-from fastapi import FastAPI, Request
-from starlette.middleware.base import (
-    BaseHTTPMiddleware,
-    RequestResponseEndpoint,
-)
+from fastapi import FastAPI
+from starlette.datastructures import URL
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from service.log import access_logger, app_logger
 from service.models import Error
+from service.profiling import (
+    ProfileRing,
+    RequestProfile,
+    current_profile,
+    profile_stats,
+)
 from service.response import server_error
+from service.settings import ProfilingConfig
 
+ROUTE_PATTERN = re.compile(r"^/reco/(\w+)/")
+
+
+class AccessMiddleware:
+    """Pure ASGI middleware writing access log line for every HTTP request"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class AccessMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self,
-        request: Request,
-        call_next: RequestResponseEndpoint,
-    ) -> Response:
         started_at = time.perf_counter()
-        response = await call_next(request)
-        request_time = time.perf_counter() - started_at
+        status_code = HTTPStatus.INTERNAL_SERVER_ERROR
 
-        status_code = response.status_code
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-        access_logger.info(
-            msg="",
-            extra={
-                "request_time": round(request_time, 4),
-                "status_code": status_code,
-                "requested_url": request.url,
-                "method": request.method,
-            },
-        )
-        return response
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_time = time.perf_counter() - started_at
+            access_logger.info(
+                msg="",
+                extra={
+                    "request_time": round(request_time, 4),
+                    "status_code": status_code,
+                    "requested_url": URL(scope=scope),
+                    "method": scope["method"],
+                },
+            )
 
 
-class ExceptionHandlerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self,
-        request: Request,
-        call_next: RequestResponseEndpoint,
-    ) -> Response:
+class ExceptionHandlerMiddleware:
+    """Pure ASGI middleware turning unhandled exceptions into 500 response"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_with_tracking(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            return await call_next(request)
+            await self.app(scope, receive, send_with_tracking)
         except Exception as e:  # pylint: disable=W0703,W1203
             app_logger.exception(msg=f"Caught unhandled {e.__class__} exception: {e}")
+            if response_started:
+                raise
             error = Error(error_key="server_error", error_message="Internal Server Error")
-            return server_error([error])
+            await server_error([error])(scope, receive, send)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling sampled reco requests and ones with the header
+
+    Profiles are saved to the ring under the model name of the route. Only
+    one request at a time is profiled in the event loop thread, since a
+    thread has a single profiler, requests profiled meanwhile get the
+    executor part only. The header is ignored unless the request has the
+    admin bearer `token`, so clients can not force profiling.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        ring: ProfileRing,
+        sample_rate: float = 0.0,
+        header: str = "X-Profile",
+        token: tp.Optional[str] = None,
+    ) -> None:
+        self.app = app
+        self.ring = ring
+        self.sample_rate = sample_rate
+        self.header = header.lower().encode()
+        self.authorization = f"Bearer {token}".encode() if token else None
+        self._loop_profiled = False
+
+    def _route(self, scope: Scope) -> tp.Optional[str]:
+        if scope["type"] != "http":
+            return None
+        match = ROUTE_PATTERN.match(scope["path"])
+        if match is None:
+            return None
+        headers = dict(scope["headers"])
+        flag = headers.get(self.header)
+        authorized = self.authorization is not None and headers.get(b"authorization") == self.authorization
+        if flag is not None and authorized:
+            return match.group(1) if flag.lower() in (b"1", b"true") else None
+        return match.group(1) if self.sample_rate > 0 and random.random() < self.sample_rate else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route = self._route(scope)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        loop_profile = None
+        if not self._loop_profiled:
+            self._loop_profiled = True
+            loop_profile = cProfile.Profile()
+            loop_profile.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if loop_profile is not None:
+                loop_profile.disable()
+                self._loop_profiled = False
+                profile.add(profile_stats(loop_profile))
+            current_profile.reset(token)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.ring.save, route, profile.stats())
+            except OSError as e:
+                app_logger.warning("Profile of %s is not saved: %s", route, e)
+
+
+def add_profiling(app: FastAPI, config: ProfilingConfig) -> None:
+    app.state.profile_ring = None
+    if not config.enabled:
+        return
+    app.state.profile_ring = ProfileRing(config.directory, config.max_profiles)
+    app.add_middleware(
+        ProfilingMiddleware,
+        ring=app.state.profile_ring,
+        sample_rate=config.sample_rate,
+        header=config.header,
+        token=config.token,
+    )
 
 
 def add_middlewares(app: FastAPI) -> None:
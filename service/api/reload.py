@@ -0,0 +1,148 @@
+import asyncio
+import os
+import tempfile
+import time
+import typing as tp
+
+from service.log import app_logger
+from service.reco_models import ModelRegistry, ModelSet
+
+ModelSetBuilder = tp.Callable[[], ModelSet]
+SwapCallback = tp.Callable[[], None]
+
+
+class ModelReloader:
+    """Replaces served models without restarting the worker.
+
+    New models are built in the default executor while the old ones keep
+    serving, then swapped in the registry at once. The reload finishes
+    when requests pinned to the old models are drained, after which the
+    old models are released.
+
+    Every worker owns its models. The worker serving the reload request
+    bumps the generation number in `generation_path`, and other workers
+    reload once they see it changed, checking the file at most every
+    `poll_interval` seconds.
+
+    Attributes:
+        registry: The registry of served models
+        build: The function building a new model set from artifacts
+        drain_timeout: The maximum time in seconds to wait for in-flight
+            requests of the old models
+        on_swap: The callbacks run in the executor right after swap, e.g.
+            cache invalidation
+        generation_path: The file with the number of requested reloads,
+            shared by all workers, only this worker is reloaded if not set
+        poll_interval: The interval in seconds of checking `generation_path`
+        generation: The last requested reload seen by this worker
+        state: The state of the last reload: idle, loading, draining or failed
+        error: The error of the last failed reload
+
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        build: ModelSetBuilder,
+        drain_timeout: float = 30.0,
+        on_swap: tp.Sequence[SwapCallback] = (),
+        generation_path: tp.Optional[str] = None,
+        poll_interval: float = 1.0,
+    ):
+        self.registry = registry
+        self.build = build
+        self.drain_timeout = drain_timeout
+        self.on_swap = list(on_swap)
+        self.generation_path = generation_path
+        self.poll_interval = poll_interval
+        self.generation = self._read_generation()
+        self.state = "idle"
+        self.error: tp.Optional[str] = None
+        self._task: tp.Optional["asyncio.Future[None]"] = None
+        self._next_poll = time.monotonic() + poll_interval
+
+    @property
+    def in_progress(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _read_generation(self) -> int:
+        if self.generation_path is None:
+            return 0
+        try:
+            with open(self.generation_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_generation(self, generation: int) -> None:
+        if self.generation_path is None:
+            return
+        directory = os.path.dirname(self.generation_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, self.generation_path)
+
+    def start(self) -> bool:
+        """Schedules reload of every worker, returns False if one is already in progress here"""
+        if self.in_progress:
+            return False
+        self.generation = max(self.generation, self._read_generation()) + 1
+        self._write_generation(self.generation)
+        self._task = asyncio.ensure_future(self.reload())
+        return True
+
+    def poll(self) -> None:
+        """Schedules reload if another worker requested it, at most every `poll_interval` seconds"""
+        now = time.monotonic()
+        if self.generation_path is None or now < self._next_poll:
+            return
+        self._next_poll = now + self.poll_interval
+        generation = self._read_generation()
+        # Reload in progress here is finished first, the request is seen again on the next poll
+        if generation > self.generation and not self.in_progress:
+            self.generation = generation
+            self._task = asyncio.ensure_future(self.reload())
+
+    async def reload(self) -> None:
+        self.state = "loading"
+        self.error = None
+        started_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            model_set = await loop.run_in_executor(None, self.build)
+        except Exception as e:  # pylint: disable=broad-except
+            self.state = "failed"
+            self.error = repr(e)
+            app_logger.exception("Models reload failed")
+            return
+
+        previous = self.registry.swap(model_set)
+        for callback in self.on_swap:
+            await loop.run_in_executor(None, callback)
+        app_logger.info(
+            "Models version %s loaded in %.1f s, draining version %s",
+            self.registry.version,
+            time.monotonic() - started_at,
+            previous.version,
+        )
+
+        self.state = "draining"
+        if not await self.registry.drain(previous, self.drain_timeout):
+            app_logger.warning(
+                "Models version %s still serves %s requests after %.1f s",
+                previous.version,
+                previous.in_flight,
+                self.drain_timeout,
+            )
+        self.state = "idle"
+
+    def status(self) -> tp.Dict[str, tp.Any]:
+        return {
+            "version": self.registry.version,
+            "generation": self.generation,
+            "state": self.state,
+            "error": self.error,
+        }
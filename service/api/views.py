@@ -1,69 +1,66 @@
-from typing import Any, Dict, List
+import asyncio
+import time
+from functools import partial
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer
 from fastapi.security.http import HTTPAuthorizationCredentials
 from pydantic import BaseModel
 
+from service.api.batching import BatchRunner, MicroBatcher
 from service.api.exceptions import (
+    BatchTooLargeError,
     BearerAccessTokenError,
     ModelNotFoundError,
+    ModelsNotReadyError,
+    ProfilingDisabledError,
+    ReloadInProgressError,
     UserNotFoundError,
 )
+from service.api.reload import ModelReloader
 from service.api.responses import (
     AuthorizationResponse,
     ForbiddenResponse,
     NotFoundError,
 )
-from service.configuration import (
-    ANN_PATHS,
-    FEATURES_FOR_COLD,
-    ITEM_MAPPING,
-    LIGHT_FM,
-    OFFLINE_KNN_MODEL_PATH,
-    ONLINE_KNN_MODEL_PATH,
-    POPULAR_IN_CATEGORY,
-    POPULAR_MODEL_RECS,
-    POPULAR_MODEL_USERS,
-    UNIQUE_FEATURES,
-    USER_MAPPING,
-)
 from service.log import app_logger
+from service.metrics import (
+    CACHE_LOOKUPS,
+    FALLBACKS,
+    PREDICTIONS,
+    REQUEST_SECONDS,
+    STAGE_SECONDS,
+    metrics,
+)
+from service.profiling import ProfileRing, folded_stacks
 from service.reco_models import (
-    ANNLightFM,
-    OfflineKnnModel,
-    OnlineFM,
-    OnlineKnnModel,
-    PopularInCategory,
-    SimplePopularModel,
-)
-
-baseline_model = PopularInCategory(POPULAR_IN_CATEGORY)
-popular_model = SimplePopularModel(
-    POPULAR_MODEL_USERS,
-    POPULAR_MODEL_RECS,
-)
-offline_knn_model = OfflineKnnModel(OFFLINE_KNN_MODEL_PATH)
-online_knn_model = OnlineKnnModel(ONLINE_KNN_MODEL_PATH)
-# Use LightFM model to predict recos for cold with features,
-# popular for others
-online_fm_part_popular = OnlineFM(
-    name=LIGHT_FM,
-    USER_MAPPING=USER_MAPPING,
-    ITEM_MAPPING=ITEM_MAPPING,
-    FEATURES_FOR_COLD=FEATURES_FOR_COLD,
-    UNIQUE_FEATURES=UNIQUE_FEATURES,
-)
-#  Use popular model to predict recos for all cold
-online_fm_all_popular = OnlineFM(
-    name=LIGHT_FM,
-    cold_with_fm=False,
-    USER_MAPPING=USER_MAPPING,
-    ITEM_MAPPING=ITEM_MAPPING,
-    FEATURES_FOR_COLD=FEATURES_FOR_COLD,
-    UNIQUE_FEATURES=UNIQUE_FEATURES,
-)
-ann_lightfm = ANNLightFM(ANN_PATHS, popular_model)
+    ModelRegistry,
+    ModelSet,
+    ResponseCache,
+    Route,
+    SqliteCacheBackend,
+    build_routes,
+)
+from service.reco_models.arrays import Reco
+from service.reco_models.loaders import (
+    DEFAULT_FALLBACKS,
+    FALLBACK_MODELS,
+    SERVED_MODELS,
+    ModelFactory,
+)
+from service.response import reco_batch_response, reco_response
+from service.settings import (
+    AnnConfig,
+    BatchingConfig,
+    CacheConfig,
+    ExactConfig,
+    ModelsConfig,
+)
+
+model_registry = ModelRegistry()
 
 
 class RecoResponse(BaseModel):
@@ -71,6 +68,14 @@ class RecoResponse(BaseModel):
     items: List[int]
 
 
+class RecoBatchRequest(BaseModel):
+    user_ids: List[int]
+
+
+class RecoBatchResponse(BaseModel):
+    recos: List[RecoResponse]
+
+
 bearer_scheme = HTTPBearer()
 
 router = APIRouter()
@@ -82,14 +87,84 @@ responses: Dict[str, Any] = {
 }
 
 
+def get_route(routes: Dict[str, Route], models: ModelSet, model_name: str) -> Route:
+    route = routes.get(model_name, None)
+    if route is None or route.name not in models:
+        raise ModelNotFoundError(error_message=f"Model {model_name} not found")
+    return route
+
+
+def predict(models: ModelSet, route: Route, user_id: int, k_recs: int) -> Reco:
+    model_name, *fallbacks = route.chain
+    with STAGE_SECONDS.time(model=route.name, stage="scoring"):
+        reco = models.get(model_name).predict(user_id, k_recs)
+    PREDICTIONS.inc(model=route.name)
+
+    for fallback in fallbacks:
+        if reco is not None and len(reco) > 0:
+            break
+        FALLBACKS.inc(model=route.name)
+        with STAGE_SECONDS.time(model=route.name, stage="fallback"):
+            reco = models.get(fallback).predict(user_id, k_recs)
+    return reco if reco is not None else []
+
+
+def predict_batch(models: ModelSet, route: Route, user_ids: List[int], k_recs: int) -> List[Reco]:
+    model_name, *fallbacks = route.chain
+    with STAGE_SECONDS.time(model=route.name, stage="scoring"):
+        recos: List[Optional[Reco]] = list(models.get(model_name).predict_batch(user_ids, k_recs))
+    PREDICTIONS.inc(len(user_ids), model=route.name)
+
+    for fallback in fallbacks:
+        missing = [position for position, reco in enumerate(recos) if reco is None or len(reco) == 0]
+        if not missing:
+            break
+        FALLBACKS.inc(len(missing), model=route.name)
+        with STAGE_SECONDS.time(model=route.name, stage="fallback"):
+            fallback_recos = models.get(fallback).predict_batch([user_ids[position] for position in missing], k_recs)
+        for position, reco in zip(missing, fallback_recos):
+            recos[position] = reco
+    return [reco if reco is not None else [] for reco in recos]
+
+
 @router.get(
     path="/health",
     tags=["Health"],
 )
-async def health() -> str:
+async def health(request: Request) -> str:
+    if not model_registry.current.is_loaded(request.app.state.preload_models):
+        raise ModelsNotReadyError()
     return "I am alive"
 
 
+@router.get(
+    path="/health/executor",
+    tags=["Health"],
+)
+async def executor_stats(request: Request) -> Dict[str, Dict[str, int]]:
+    return request.app.state.predict_executor.stats()
+
+
+@router.get(
+    path="/health/cache",
+    tags=["Health"],
+)
+async def cache_stats(request: Request) -> Dict[str, int]:
+    response_cache: Optional[ResponseCache] = request.app.state.response_cache
+    return response_cache.stats() if response_cache is not None else {}
+
+
+@router.get(
+    path="/metrics",
+    tags=["Health"],
+    response_class=PlainTextResponse,
+)
+async def get_metrics() -> PlainTextResponse:
+    # Snapshots of other processes are read from disk
+    content = await asyncio.get_running_loop().run_in_executor(None, metrics.render)
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @router.get(
     path="/reco/{model_name}/{user_id}",
     tags=["Recommendations"],
@@ -101,38 +176,271 @@ async def get_reco(
     model_name: str,
     user_id: int,
     token: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-) -> RecoResponse:
-    app_logger.info(f"Request for model: {model_name}, user_id: {user_id}")
+) -> JSONResponse:
+    started_at = time.perf_counter()
+    app_logger.info("Request for model: %s, user_id: %s", model_name, user_id)
 
     if token.credentials != "Team_5":
         raise BearerAccessTokenError()
     if user_id > 10**9:
         raise UserNotFoundError(error_message=f"User {user_id} not found")
 
+    request.app.state.model_reloader.poll()
     k_recs = request.app.state.k_recs
+    with model_registry.acquire() as models:
+        route = get_route(request.app.state.routes, models, model_name)
+        reco = None
+        response_cache: Optional[ResponseCache] = None
+        if model_name in request.app.state.cached_models:
+            response_cache = request.app.state.response_cache
+            reco = await response_cache.get_async(model_name, user_id, k_recs, models.version)
+            CACHE_LOOKUPS.inc(model=model_name, result="hit" if reco is not None else "miss")
+
+        if reco is None:
+            micro_batcher = request.app.state.micro_batchers.get(model_name, None)
+            if micro_batcher is not None:
+                reco = await micro_batcher.predict(user_id, k_recs, models)
+            else:
+                reco = await request.app.state.predict_executor.run(model_name, predict, models, route, user_id, k_recs)
+
+            if response_cache is not None:
+                await response_cache.put_async(model_name, user_id, k_recs, reco, models.version)
+    with STAGE_SECONDS.time(model=model_name, stage="serialization"):
+        response = reco_response(user_id, reco, models.version)
+    REQUEST_SECONDS.observe(time.perf_counter() - started_at, model=model_name, endpoint="reco")
+    return response
+
+
+@router.post(
+    path="/reco/{model_name}/batch",
+    tags=["Recommendations"],
+    response_model=RecoBatchResponse,
+    responses=responses,  # type: ignore
+)
+async def get_reco_batch(
+    request: Request,
+    model_name: str,
+    body: RecoBatchRequest,
+    token: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+) -> JSONResponse:
+    started_at = time.perf_counter()
+    app_logger.info("Batch request for model: %s, users: %s", model_name, len(body.user_ids))
 
-    reco = None
-    model_names = ["test_model", "baseline", "knn", "online_knn", "light_fm_1", "light_fm_2", "ann_lightfm"]
-    if model_name == "test_model":
-        reco = list(range(k_recs))
-    if model_name == "baseline":
-        reco = baseline_model.predict(user_id, k_recs)
-    if model_name in ("knn", "online_knn"):
-        reco = offline_knn_model.predict(user_id) if model_name == "knn" else online_knn_model.predict(user_id)
-    if model_name in ("light_fm_1", "light_fm_2"):
-        reco = (
-            online_fm_all_popular.predict(user_id, k_recs)
-            if model_name == "light_fm_1"
-            else online_fm_part_popular.predict(user_id, k_recs)
+    if token.credentials != "Team_5":
+        raise BearerAccessTokenError()
+    if len(body.user_ids) > request.app.state.max_batch_size:
+        raise BatchTooLargeError(
+            error_message=f"Batch of {len(body.user_ids)} users exceeds {request.app.state.max_batch_size}"
         )
-    if model_name == "ann_lightfm":
-        reco = ann_lightfm.predict(user_id)
+    unknown_users = [user_id for user_id in body.user_ids if user_id > 10**9]
+    if unknown_users:
+        raise UserNotFoundError(error_message=f"Users {unknown_users} not found")
 
-    if model_name not in model_names:
-        raise ModelNotFoundError(error_message=f"Model {model_name} not found")
-    if not reco:
-        reco = popular_model.predict(user_id, k_recs)
-    return RecoResponse(user_id=user_id, items=reco)
+    request.app.state.model_reloader.poll()
+    k_recs = request.app.state.k_recs
+    with model_registry.acquire() as models:
+        route = get_route(request.app.state.routes, models, model_name)
+        recos = await request.app.state.predict_executor.run(
+            model_name, predict_batch, models, route, body.user_ids, k_recs
+        )
+    with STAGE_SECONDS.time(model=model_name, stage="serialization"):
+        response = reco_batch_response(body.user_ids, recos, models.version)
+    REQUEST_SECONDS.observe(time.perf_counter() - started_at, model=model_name, endpoint="batch")
+    return response
+
+
+@router.post(
+    path="/admin/reload",
+    tags=["Admin"],
+    status_code=HTTPStatus.ACCEPTED,
+    responses=responses,  # type: ignore
+)
+async def reload_models(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+) -> Dict[str, Any]:
+    if token.credentials != "Team_5":
+        raise BearerAccessTokenError()
+    model_reloader: ModelReloader = request.app.state.model_reloader
+    if not model_reloader.start():
+        raise ReloadInProgressError()
+    app_logger.info("Models reload started")
+    return model_reloader.status()
+
+
+@router.get(
+    path="/admin/reload",
+    tags=["Admin"],
+    responses=responses,  # type: ignore
+)
+async def reload_status(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+) -> Dict[str, Any]:
+    if token.credentials != "Team_5":
+        raise BearerAccessTokenError()
+    return request.app.state.model_reloader.status()
+
+
+def profile_ring(request: Request) -> ProfileRing:
+    ring: Optional[ProfileRing] = request.app.state.profile_ring
+    if ring is None:
+        raise ProfilingDisabledError()
+    return ring
+
+
+def load_folded_stacks(ring: ProfileRing, model_name: str) -> str:
+    n_profiles, stats = ring.load(model_name)
+    if stats is None:
+        return ""
+    return f"# {n_profiles} profiles\n" + "\n".join(folded_stacks(stats)) + "\n"
+
+
+@router.get(
+    path="/admin/profiles",
+    tags=["Admin"],
+    responses=responses,  # type: ignore
+)
+async def list_profiles(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+) -> Dict[str, int]:
+    if token.credentials != "Team_5":
+        raise BearerAccessTokenError()
+    return profile_ring(request).routes()
+
+
+@router.get(
+    path="/admin/profiles/{model_name}",
+    tags=["Admin"],
+    response_class=PlainTextResponse,
+    responses=responses,  # type: ignore
+)
+async def get_profiles(
+    request: Request,
+    model_name: str,
+    token: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+) -> PlainTextResponse:
+    """Returns stored profiles of the model route aggregated into folded stacks for flamegraph.pl"""
+    if token.credentials != "Team_5":
+        raise BearerAccessTokenError()
+    ring = profile_ring(request)
+    content = await asyncio.get_running_loop().run_in_executor(None, load_folded_stacks, ring, model_name)
+    return PlainTextResponse(content)
+
+
+def batch_runner(app: FastAPI, model_name: str) -> BatchRunner:
+    async def run_batch(user_ids: List[int], k_recs: int, models: ModelSet) -> List[Reco]:
+        route = app.state.routes[model_name]
+        return await app.state.predict_executor.run(model_name, predict_batch, models, route, user_ids, k_recs)
+
+    return run_batch
+
+
+def add_micro_batchers(app: FastAPI, config: BatchingConfig) -> None:
+    app.state.micro_batchers = {}
+    if not config.enabled:
+        return
+    for model_name in config.models:
+        app.state.micro_batchers[model_name] = MicroBatcher(
+            batch_runner(app, model_name),
+            max_batch_size=config.max_batch_size,
+            max_delay=config.max_delay_ms / 1000,
+        )
+
+
+def add_response_cache(app: FastAPI, config: CacheConfig) -> None:
+    app.state.response_cache = None
+    app.state.cached_models = frozenset()
+    if not config.enabled:
+        return
+    backend = SqliteCacheBackend(config.sqlite_path, ttl=config.ttl_seconds) if config.sqlite_path else None
+    app.state.response_cache = ResponseCache(maxsize=config.maxsize, ttl=config.ttl_seconds, backend=backend)
+    app.state.cached_models = frozenset(config.models)
+
+
+def served_routes(config: ModelsConfig) -> Dict[str, Route]:
+    """Returns routes served with `config`, keyed by name"""
+    names = config.enabled if config.enabled is not None else [*SERVED_MODELS, *config.plugins]
+    return build_routes([name for name in names if name not in FALLBACK_MODELS], DEFAULT_FALLBACKS, config.fallbacks)
+
+
+def add_models(app: FastAPI, config: ModelsConfig, ann_config: AnnConfig, exact_config: ExactConfig) -> None:
+    app.state.routes = served_routes(config)
+    # Fallbacks of enabled routes are served too
+    enabled = {model_name for route in app.state.routes.values() for model_name in route.chain}
+    # Health check waits for these models
+    app.state.preload_models = sorted(enabled) if config.loading != "lazy" else []
+    app.state.warmup_workers = config.warmup_workers
+    app.state.model_factory = partial(
+        ModelFactory,
+        config.artifact_workers,
+        config.artifact_processes,
+        ann_config.dict(),
+        exact_config.dict(),
+        config.plugins,
+    )
+    if model_registry.current.builder is None or model_registry.current.enabled != enabled:
+        factory = app.state.model_factory()
+        model_registry.swap(ModelSet(version=factory.version, builder=factory, enabled=enabled))
+
+    if config.loading == "eager":
+        # Loaded before fork, so workers share the models pages
+        model_registry.current.warm_up(app.state.preload_models, config.warmup_workers)
+        log_models_loaded()
+    elif config.loading == "background":
+        app.add_event_handler("startup", partial(warm_up_models, app, config.startup_budget))
+
+
+async def warm_up_models(app: FastAPI, startup_budget: Optional[float]) -> None:
+    loop = asyncio.get_running_loop()
+    warm_up = asyncio.ensure_future(
+        loop.run_in_executor(None, model_registry.current.warm_up, app.state.preload_models, app.state.warmup_workers)
+    )
+    try:
+        await asyncio.wait_for(asyncio.shield(warm_up), startup_budget)
+    except asyncio.TimeoutError:
+        app_logger.warning("Models are still loading after startup budget of %s s", startup_budget)
+        warm_up.add_done_callback(log_warm_up)
+        return
+    log_models_loaded()
+
+
+def log_warm_up(warm_up: "asyncio.Future[None]") -> None:
+    if warm_up.exception() is not None:
+        app_logger.error("Models warm-up failed: %r", warm_up.exception())
+    else:
+        log_models_loaded()
+
+
+def log_models_loaded() -> None:
+    builder = model_registry.current.builder
+    if isinstance(builder, ModelFactory):
+        builder.store.log_stats()
+    model_registry.log_memory_usage()
+
+
+def build_model_set(model_factory: Callable[[], ModelFactory], max_workers: int) -> ModelSet:
+    current = model_registry.current
+    factory = model_factory()
+    model_set = ModelSet(version=factory.version, builder=factory, enabled=current.enabled)
+    # Models loaded so far are ready before swap, others stay lazy
+    model_set.warm_up(list(current.models), max_workers)
+    return model_set
+
+
+def add_model_reloader(
+    app: FastAPI, drain_timeout: float, generation_path: Optional[str] = None, poll_interval: float = 1.0
+) -> None:
+    on_swap = []
+    response_cache: Optional[ResponseCache] = app.state.response_cache
+    if response_cache is not None:
+        # Entries of the new version shared by workers reloaded earlier are kept
+        on_swap.append(lambda: response_cache.invalidate(model_registry.version))
+    build = partial(build_model_set, app.state.model_factory, app.state.warmup_workers)
+    app.state.model_reloader = ModelReloader(
+        model_registry, build, drain_timeout, on_swap, generation_path=generation_path, poll_interval=poll_interval
+    )
 
 
 def add_views(app: FastAPI) -> None:
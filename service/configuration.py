@@ -29,3 +29,10 @@ ANN_PATHS = (
     ANN_watched_u2i,
     ANN_COLD_RECO_DICT,
 )
+
+# Compact memory-mapped artifacts converted from the files above
+# with `make convert_models`. They are preferred if exist.
+COMPACT_POPULAR_MODEL = "models/compact/popular"
+COMPACT_POPULAR_IN_CATEGORY = "models/compact/popular_in_category"
+COMPACT_LIGHT_FM = "models/compact/light_fm"
+COMPACT_ANN = "models/compact/ann_lightfm"
@@ -1,7 +1,12 @@
 import logging.config
+import logging.handlers
+import queue
+import random
+import threading
 import typing as tp
 
-from .settings import ServiceConfig
+from .metrics import LOG_RECORDS_DROPPED
+from .settings import LogConfig, ServiceConfig
 
 app_logger = logging.getLogger("app")
 access_logger = logging.getLogger("access")
@@ -19,6 +24,139 @@ class ServiceNameFilter(logging.Filter):
         return super().filter(record)
 
 
+class SamplingFilter(logging.Filter):
+    """Passes only `rate` share of INFO and lower records, others always pass"""
+
+    def __init__(self, rate: float = 1.0) -> None:
+        self.rate = rate
+
+        super().__init__()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or self.rate >= 1.0 or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Puts records to a bounded queue and drops them when it is full
+
+    Records are not formatted here, it is done by `BatchingQueueListener`
+    in the background thread. Dropped records are counted in `dropped`
+    and exported by `LOG_RECORDS_DROPPED`.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[tp.Optional[logging.LogRecord]]") -> None:
+        self.queue: "queue.Queue[tp.Optional[logging.LogRecord]]" = log_queue
+        self.dropped = 0
+
+        super().__init__(log_queue)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """Stream handler which leaves flushing to `BatchingQueueListener`"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+
+class BatchingQueueListener:
+    """Writes queued records with handlers of their loggers in a background thread
+
+    Records are taken from the queue in batches of up to `batch_size` and
+    handlers are flushed once per batch instead of once per record. The
+    number of records dropped by `queue_handler` is logged on stop.
+    """
+
+    def __init__(
+        self,
+        log_queue: "queue.Queue[tp.Optional[logging.LogRecord]]",
+        handlers: tp.Dict[str, tp.List[logging.Handler]],
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        queue_handler: tp.Optional[DroppingQueueHandler] = None,
+    ) -> None:
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_handler = queue_handler
+        self._thread: tp.Optional[threading.Thread] = None
+
+    def ensure_started(self) -> None:
+        # Threads do not survive fork, so workers start their own one
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="log_listener", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+        self._thread = None
+        if self.queue_handler is not None and self.queue_handler.dropped:
+            # The queue is not served anymore, so the record is written directly
+            record = app_logger.makeRecord(
+                app_logger.name,
+                logging.WARNING,
+                __file__,
+                0,
+                "Dropped %d log records since the queue was full",
+                (self.queue_handler.dropped,),
+                None,
+            )
+            self._handle([record])
+
+    def _get_batch(self) -> "tp.List[tp.Optional[logging.LogRecord]]":
+        """Waits for up to `batch_size` records, raises `queue.Empty` if none came in `flush_interval`"""
+        batch = [self.queue.get(timeout=self.flush_interval)]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _handle(self, batch: "tp.List[tp.Optional[logging.LogRecord]]") -> bool:
+        """Writes records of `batch`, returns True if it has the stop sentinel"""
+        stopped = False
+        used_handlers: tp.Set[logging.Handler] = set()
+        for record in batch:
+            if record is None:
+                stopped = True
+                continue
+            for handler in self.handlers.get(record.name, ()):
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+                    used_handlers.add(handler)
+        for handler in used_handlers:
+            handler.flush()
+        return stopped
+
+    def _run(self) -> None:
+        stopped = False
+        while not stopped:
+            try:
+                batch = self._get_batch()
+            except queue.Empty:
+                continue
+            stopped = self._handle(batch)
+
+
+log_listener: tp.Optional[BatchingQueueListener] = None
+
+
 def get_config(service_config: ServiceConfig) -> tp.Dict[str, tp.Any]:
     level = service_config.log_config.level
     datetime_format = service_config.log_config.datetime_format
@@ -139,6 +277,58 @@ def get_config(service_config: ServiceConfig) -> tp.Dict[str, tp.Any]:
     return config
 
 
+def setup_queue_logging(log_config: LogConfig) -> BatchingQueueListener:
+    """Moves `app` and `access` handlers behind a queue served by a background thread"""
+    log_queue: "queue.Queue[tp.Optional[logging.LogRecord]]" = queue.Queue(maxsize=log_config.queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    handlers: tp.Dict[str, tp.List[logging.Handler]] = {}
+    for logger in (app_logger, access_logger):
+        handlers[logger.name] = []
+        for handler in logger.handlers:
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, BufferedStreamHandler):
+                buffered_handler = BufferedStreamHandler(handler.stream)
+                buffered_handler.setLevel(handler.level)
+                buffered_handler.setFormatter(handler.formatter)
+                for handler_filter in handler.filters:
+                    buffered_handler.addFilter(handler_filter)
+                handler = buffered_handler
+            handlers[logger.name].append(handler)
+        logger.handlers = [queue_handler]
+
+    listener = BatchingQueueListener(
+        log_queue,
+        handlers,
+        batch_size=log_config.batch_size,
+        flush_interval=log_config.flush_interval,
+        queue_handler=queue_handler,
+    )
+    listener.ensure_started()
+    return listener
+
+
 def setup_logging(service_config: ServiceConfig) -> None:
+    global log_listener  # pylint: disable=global-statement
+
     config = get_config(service_config)
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
     logging.config.dictConfig(config)
+
+    log_config = service_config.log_config
+    for logger_filter in list(app_logger.filters):
+        if isinstance(logger_filter, SamplingFilter):
+            app_logger.removeFilter(logger_filter)
+    app_logger.addFilter(SamplingFilter(log_config.info_sample_rate))
+    if log_config.use_queue:
+        log_listener = setup_queue_logging(log_config)
+
+
+def start_log_listener() -> None:
+    if log_listener is not None:
+        log_listener.ensure_started()
+
+
+def stop_log_listener() -> None:
+    if log_listener is not None:
+        log_listener.stop()
@@ -0,0 +1,42 @@
+import os
+import typing as tp
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read_smaps_rollup(pid: tp.Union[int, str]) -> tp.Dict[str, int]:
+    usage: tp.Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                usage[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return usage
+
+
+def process_memory(pid: tp.Union[int, str] = "self") -> tp.Dict[str, int]:
+    """Returns resident, shared and private memory of a process in bytes
+
+    Shared memory includes pages inherited from gunicorn master and not
+    yet copied on write, so with preloaded models it should be close to
+    the models size while private memory stays small.
+    """
+    try:
+        usage = _read_smaps_rollup(pid)
+        return {
+            "resident": usage.get("Rss", 0),
+            "shared": usage.get("Shared_Clean", 0) + usage.get("Shared_Dirty", 0),
+            "private": usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0),
+        }
+    except OSError:
+        pass
+    try:
+        with open(f"/proc/{pid}/statm", "r", encoding="utf-8") as f:
+            _, resident, shared = (int(value) * PAGE_SIZE for value in f.read().split()[:3])
+        return {"resident": resident, "shared": shared, "private": resident - shared}
+    except OSError:
+        return {}
+
+
+def format_memory(usage: tp.Dict[str, int]) -> str:
+    return " ".join(f"{name}={size / 2**20:.1f}MiB" for name, size in usage.items())
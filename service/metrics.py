@@ -0,0 +1,409 @@
+import atexit
+import fcntl
+import json
+import math
+import multiprocessing.util
+import os
+import tempfile
+import threading
+import time
+import typing as tp
+from contextlib import contextmanager
+from uuid import uuid4
+
+LabelValues = tp.Tuple[str, ...]
+Snapshot = tp.Dict[str, tp.List[tp.List[tp.Any]]]
+Collected = tp.Dict[str, tp.Dict[LabelValues, tp.Any]]
+
+# Seconds, from a cached reco to a slow batch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+FILE_PREFIX = "metrics_"
+# Counters and histograms of exited processes summed together
+EXITED_FILE = "exited.json"
+# Held while files of a process are created or merged into `EXITED_FILE`
+DIRECTORY_LOCK = "directory.lock"
+
+
+class Metric:
+    """Metric with values per combination of labels, kept in process memory"""
+
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: tp.Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: tp.Dict[LabelValues, tp.Any] = {}
+
+    def _key(self, labels: tp.Dict[str, tp.Any]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self) -> None:
+        self.values = {}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, value: float = 1, **labels: tp.Any) -> None:
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + value
+            self.registry.dirty = True
+
+
+class Gauge(Metric):
+    """Gauge of the current process, values of live processes are summed"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: tp.Any) -> None:
+        with self.registry.lock:
+            self.values[self._key(labels)] = value
+            self.registry.dirty = True
+
+
+class Histogram(Metric):
+    """Histogram keeping counts of observations per bucket and their sum"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        labelnames: tp.Sequence[str] = (),
+        buckets: tp.Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value: float, **labels: tp.Any) -> None:
+        key = self._key(labels)
+        position = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self.registry.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Count of every bucket followed by the sum
+                counts = self.values[key] = [0.0] * (len(self.buckets) + 1)
+            counts[position] += 1
+            counts[-1] += value
+            self.registry.dirty = True
+
+    @contextmanager
+    def time(self, **labels: tp.Any) -> tp.Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+
+class MetricsRegistry:
+    """Metrics of the service rendered in Prometheus text format.
+
+    Every process keeps its own values in memory. To aggregate them
+    across gunicorn workers and processes of a prediction pool, each
+    process writes a snapshot to `directory` from a background thread
+    every `flush_interval` seconds if its values changed, and once more
+    on exit, and collection sums snapshots of all processes. Values are
+    reset in a forked child, it reports only its own observations.
+
+    A process holds a lock on its own lock file until it exits, which
+    tells live processes from exited ones regardless of reused pids.
+    Collection merges counters and histograms of exited processes into
+    a single file and removes their files, so totals do not drop when a
+    worker restarts and recycled workers do not pile up. Gauges are
+    summed over live processes only.
+
+    Attributes:
+        directory: The directory shared by processes, only this process
+            is reported if not set
+        flush_interval: The number of seconds between snapshots
+        metrics: The registered metrics by name
+        dirty: Whether values changed since the last snapshot
+
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, directory: tp.Optional[str] = None, flush_interval: float = 1.0) -> None:
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.metrics: tp.Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self._closed = threading.Event()
+        self._flusher: tp.Optional[threading.Thread] = None
+        self._name: tp.Optional[str] = None
+        self._lock_file: tp.Optional[tp.IO[str]] = None
+        atexit.register(self.close)
+        # Processes of multiprocessing leave with `os._exit`, skipping `atexit`
+        multiprocessing.util.register_after_fork(self, MetricsRegistry._close_at_process_exit)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        self._ensure_flusher()
+
+    def configure(self, directory: tp.Optional[str], flush_interval: float = 1.0) -> None:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory or None
+        self.flush_interval = flush_interval
+        self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        # Threads do not survive fork, so every process starts its own one
+        running = self._flusher is not None and self._flusher.is_alive() and not self._closed.is_set()
+        if self.directory is None or running:
+            return
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._run_flusher, name="metrics_flusher", daemon=True)
+        self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        closed = self._closed
+        while not closed.wait(self.flush_interval):
+            if self.dirty:
+                self.flush()
+
+    def close(self) -> None:
+        """Stops periodic snapshots and writes the last one"""
+        self._closed.set()
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def _after_fork(self) -> None:
+        self.reset()
+        # The lock stays with the parent, closing the inherited descriptor does not release it
+        if self._lock_file is not None:
+            self._lock_file.close()
+        self._name = None
+        self._lock_file = None
+        self._flusher = None
+        self._ensure_flusher()
+
+    def _close_at_process_exit(self) -> None:
+        multiprocessing.util.Finalize(self, self.close, exitpriority=0)
+
+    def _register(self, metric: Metric) -> tp.Any:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tp.Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tp.Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tp.Sequence[str] = (),
+        buckets: tp.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def reset(self) -> None:
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.reset()
+            self.dirty = False
+
+    def snapshot(self) -> tp.Dict[str, tp.List[tp.List[tp.Any]]]:
+        """Returns values of this process as `[labels, value]` pairs by metric name"""
+        with self.lock:
+            return {
+                name: [
+                    [list(key), list(value) if isinstance(value, list) else value]
+                    for key, value in metric.values.items()
+                ]
+                for name, metric in self.metrics.items()
+                if metric.values
+            }
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(tp.cast(str, self.directory), file_name)
+
+    @contextmanager
+    def _directory_lock(self) -> tp.Iterator[None]:
+        with open(self._path(DIRECTORY_LOCK), "a", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _own_name(self) -> str:
+        """Returns the name of files of this process, locking its lock file until exit"""
+        if self._name is None:
+            name = f"{FILE_PREFIX}{os.getpid()}_{uuid4().hex[:8]}"
+            with self._directory_lock():
+                lock_file = open(
+                    self._path(f"{name}.lock"), "w", encoding="utf-8"
+                )  # pylint: disable=consider-using-with
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._name, self._lock_file = name, lock_file
+        return self._name
+
+    def _is_alive(self, name: str) -> bool:
+        try:
+            with open(self._path(f"{name}.lock"), "r", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        except FileNotFoundError:
+            return False
+        return False
+
+    def _read(self, file_name: str) -> Snapshot:
+        try:
+            with open(self._path(file_name), "r", encoding="utf-8") as f:
+                return tp.cast(Snapshot, json.load(f))
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, file_name: str, snapshot: Snapshot) -> None:
+        """Writes `snapshot`, replacing the previous one atomically"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self._path(file_name))
+
+    def flush(self) -> None:
+        """Writes snapshot of this process"""
+        if self.directory is None:
+            return
+        self.dirty = False
+        self._write(f"{self._own_name()}.json", self.snapshot())
+
+    def _process_names(self) -> tp.List[str]:
+        """Returns names of files of other processes"""
+        return [
+            file_name[: -len(".lock")]
+            for file_name in os.listdir(tp.cast(str, self.directory))
+            if file_name.startswith(FILE_PREFIX) and file_name.endswith(".lock") and file_name != f"{self._name}.lock"
+        ]
+
+    def _merge_exited(self) -> None:
+        """Adds counters and histograms of exited processes to `EXITED_FILE` and removes their files"""
+        with self._directory_lock():
+            exited = [name for name in self._process_names() if not self._is_alive(name)]
+            if not exited:
+                return
+            snapshots = [self._read(EXITED_FILE), *(self._read(f"{name}.json") for name in exited)]
+            total = self._sum((False, snapshot) for snapshot in snapshots)
+            self._write(
+                EXITED_FILE,
+                {
+                    name: [[list(key), value] for key, value in values.items()]
+                    for name, values in total.items()
+                    if values
+                },
+            )
+            for name in exited:
+                for file_name in (f"{name}.json", f"{name}.lock"):
+                    try:
+                        os.remove(self._path(file_name))
+                    except FileNotFoundError:
+                        pass
+
+    def _snapshots(self) -> tp.Iterator[tp.Tuple[bool, Snapshot]]:
+        """Yields snapshot of every process with the flag of a live one"""
+        yield True, self.snapshot()
+        if self.directory is None:
+            return
+        self._merge_exited()
+        yield False, self._read(EXITED_FILE)
+        for name in self._process_names():
+            yield self._is_alive(name), self._read(f"{name}.json")
+
+    def collect(self) -> Collected:
+        """Returns values of every metric summed over processes"""
+        return self._sum(self._snapshots())
+
+    def _sum(self, snapshots: tp.Iterable[tp.Tuple[bool, Snapshot]]) -> Collected:
+        """Sums values of `snapshots`, gauges are taken from live ones only"""
+        collected: Collected = {name: {} for name in self.metrics}
+        for alive, snapshot in snapshots:
+            for name, values in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not alive):
+                    continue
+                for key, value in values:
+                    key = tuple(key)
+                    if metric.kind == "histogram":
+                        total = collected[name].get(key)
+                        if total is None or len(total) != len(value):
+                            collected[name][key] = list(value)
+                        else:
+                            collected[name][key] = [a + b for a, b in zip(total, value)]
+                    else:
+                        collected[name][key] = collected[name].get(key, 0) + value
+        return collected
+
+    def render(self) -> str:
+        """Returns all metrics in Prometheus text exposition format"""
+        lines: tp.List[str] = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(values.items()):
+                labels = list(zip(metric.labelnames, key))
+                if isinstance(metric, Histogram):
+                    cumulative = 0.0
+                    for bound, count in zip(metric.buckets, value):
+                        cumulative += count
+                        bucket_labels = format_labels(labels + [("le", format_value(bound))])
+                        lines.append(f"{name}_bucket{bucket_labels} {format_value(cumulative)}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(value[-1])}")
+                    lines.append(f"{name}_count{format_labels(labels)} {format_value(cumulative)}")
+                else:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_labels(labels: tp.Sequence[tp.Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = ((name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def clear_directory(directory: tp.Optional[str]) -> None:
+    """Removes snapshots of a previous run, to be called once before the service starts"""
+    if directory is None or not os.path.isdir(directory):
+        return
+    for file_name in os.listdir(directory):
+        if file_name.startswith((FILE_PREFIX, ".tmp_")) or file_name == EXITED_FILE:
+            os.remove(os.path.join(directory, file_name))
+
+
+metrics = MetricsRegistry()
+
+REQUEST_SECONDS = metrics.histogram("reco_request_seconds", "Latency of recommendation requests", ("model", "endpoint"))
+STAGE_SECONDS = metrics.histogram(
+    "reco_stage_seconds", "Time of scoring, popular fallback and serialization of recos", ("model", "stage")
+)
+SEEN_FILTER_SECONDS = metrics.histogram(
+    "reco_seen_filter_seconds",
+    "Time of filtering seen items out of candidates of one user",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01),
+)
+PREDICTIONS = metrics.counter("reco_predictions_total", "Users recommended by a model", ("model",))
+FALLBACKS = metrics.counter(
+    "reco_fallbacks_total", "Users recommended by popular model instead of the requested one", ("model",)
+)
+CACHE_LOOKUPS = metrics.counter("reco_cache_lookups_total", "Lookups of response cache", ("model", "result"))
+EXECUTOR_TASKS = metrics.gauge("predict_executor_tasks", "Predictions in executor", ("model", "state"))
+LOG_RECORDS_DROPPED = metrics.counter("log_records_dropped_total", "Log records dropped since the log queue was full")
@@ -0,0 +1,188 @@
+"""Opt-in profiling of single requests.
+
+A profiled request is run under `cProfile` in the event loop thread and
+its prediction under another `cProfile` in the executor, see
+`profiled_call`. Both are merged into one profile saved to a bounded
+ring of files shared by all workers. Profiles of a route are aggregated
+into folded stacks, the input format of flamegraph.pl and speedscope.
+
+Coroutines of other requests running on the loop at the same time are
+captured by the loop profile too, only the executor part belongs to the
+profiled request alone.
+"""
+import cProfile
+import marshal
+import os
+import pstats
+import tempfile
+import time
+import typing as tp
+from contextvars import ContextVar
+
+# (file, line, function) -> (primitive calls, calls, self time, cumulative time, callers)
+Stats = tp.Dict[tp.Tuple[str, int, str], tp.Tuple[tp.Any, ...]]
+
+T = tp.TypeVar("T")
+
+SUFFIX = ".prof"
+
+
+class RequestProfile:
+    """Stats of every profiler run on behalf of one request"""
+
+    def __init__(self) -> None:
+        self.parts: tp.List[Stats] = []
+
+    def add(self, stats: Stats) -> None:
+        self.parts.append(stats)
+
+    def stats(self) -> Stats:
+        merged = pstats.Stats()
+        for part in self.parts:
+            merged.add(_stats_object(part))
+        return tp.cast(Stats, merged.stats)  # type: ignore[attr-defined]
+
+
+current_profile: ContextVar[tp.Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def _stats_object(stats: Stats) -> pstats.Stats:
+    """Returns `pstats.Stats` over raw stats, they are only loadable from an object with `create_stats`"""
+
+    class Loaded:
+        def __init__(self) -> None:
+            self.stats = stats
+
+        def create_stats(self) -> None:
+            pass
+
+    return pstats.Stats(Loaded())  # type: ignore[arg-type]
+
+
+def profile_stats(profile: cProfile.Profile) -> Stats:
+    profile.create_stats()
+    return tp.cast(Stats, profile.stats)  # type: ignore[attr-defined]
+
+
+def profiled_call(func: tp.Callable[..., T], *args: tp.Any) -> tp.Tuple[T, Stats]:
+    """Calls `func` under `cProfile` and returns its result with the stats
+
+    It is top-level and returns plain stats, so it is run in a process pool as well.
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        result = func(*args)
+    finally:
+        profile.disable()
+    return result, profile_stats(profile)
+
+
+class ProfileRing:
+    """Profiles of requests stored as files in `directory`, at most `max_profiles` of them.
+
+    File names start with the route, so profiles of a route are found
+    without reading others. The oldest files are removed when a new one
+    exceeds the limit, which is shared by all processes writing there.
+
+    Attributes:
+        directory: The directory of profile files
+        max_profiles: The maximum number of stored profiles
+
+    """
+
+    def __init__(self, directory: str, max_profiles: int = 200) -> None:
+        self.directory = directory
+        self.max_profiles = max_profiles
+        os.makedirs(directory, exist_ok=True)
+
+    def _files(self) -> tp.List[str]:
+        return [file_name for file_name in os.listdir(self.directory) if file_name.endswith(SUFFIX)]
+
+    def save(self, route: str, stats: Stats) -> str:
+        file_name = f"{route}.{time.time_ns()}.{os.getpid()}{SUFFIX}"
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_")
+        with os.fdopen(fd, "wb") as f:
+            marshal.dump(stats, f)
+        os.replace(tmp_path, os.path.join(self.directory, file_name))
+        self._trim()
+        return file_name
+
+    def _trim(self) -> None:
+        # Names hold the creation time after the route
+        files = sorted(self._files(), key=lambda file_name: int(file_name.split(".")[-3]))
+        for file_name in files[: max(len(files) - self.max_profiles, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
+
+    def routes(self) -> tp.Dict[str, int]:
+        """Returns the number of stored profiles of every route"""
+        counts: tp.Dict[str, int] = {}
+        for file_name in self._files():
+            route = file_name.rsplit(".", 3)[0]
+            counts[route] = counts.get(route, 0) + 1
+        return counts
+
+    def load(self, route: str) -> tp.Tuple[int, tp.Optional[pstats.Stats]]:
+        """Returns the number of profiles of `route` and their aggregated stats"""
+        merged: tp.Optional[pstats.Stats] = None
+        n_profiles = 0
+        for file_name in self._files():
+            if file_name.rsplit(".", 3)[0] != route:
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name), "rb") as f:
+                    stats = _stats_object(marshal.load(f))
+            except (FileNotFoundError, EOFError, ValueError, TypeError):
+                # Removed by another process or being replaced
+                continue
+            n_profiles += 1
+            if merged is None:
+                merged = stats
+            else:
+                merged.add(stats)
+        return n_profiles, merged
+
+
+def _label(func: tp.Tuple[str, int, str]) -> str:
+    file_name, line, name = func
+    if file_name == "~":
+        # Built-in functions
+        return name
+    return f"{name} ({os.path.basename(file_name)}:{line})"
+
+
+def folded_stacks(stats: pstats.Stats, max_depth: int = 64, min_share: float = 1e-4) -> tp.List[str]:
+    """Returns stacks with self time in microseconds, e.g. `main;predict;argsort 1200`
+
+    cProfile keeps only caller -> callee edges, so the self time of a
+    function is split between its callers in proportion to the time it
+    spent called by each of them, recursively up to the roots. Paths with
+    less than `min_share` of the total time are cut.
+    """
+    raw: Stats = stats.stats  # type: ignore[attr-defined]
+    total = sum(entry[2] for entry in raw.values())
+    if total <= 0:
+        return []
+    folded: tp.Dict[str, float] = {}
+
+    def walk(func: tp.Tuple[str, int, str], seconds: float, path: tp.List[tp.Tuple[str, int, str]]) -> None:
+        callers = raw[func][4] if func in raw else {}
+        callers = {caller: entry for caller, entry in callers.items() if caller not in path and caller != func}
+        if not callers or len(path) >= max_depth or seconds < min_share * total:
+            stack = ";".join(_label(frame) for frame in reversed(path + [func]))
+            folded[stack] = folded.get(stack, 0.0) + seconds
+            return
+        # Cumulative time spent in `func` when called by every caller
+        weights = {caller: entry[3] if isinstance(entry, tuple) else entry for caller, entry in callers.items()}
+        weights_sum = sum(weights.values())
+        for caller, weight in weights.items():
+            share = weight / weights_sum if weights_sum > 0 else 1 / len(weights)
+            walk(caller, seconds * share, path + [func])
+
+    for func, entry in raw.items():
+        if entry[2] > 0:
+            walk(func, entry[2], [])
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in sorted(folded.items()) if seconds * 1e6 >= 0.5]
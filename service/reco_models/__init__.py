@@ -1,17 +1,35 @@
+from .artifacts import ArtifactStore
+from .cache import ResponseCache, SqliteCacheBackend
 from .popular_in_category_model import PopularInCategory
 from .reco_models import (
     ANNLightFM,
+    LightFMArtifacts,
     OfflineKnnModel,
     OnlineFM,
     OnlineKnnModel,
+    RangeModel,
     SimplePopularModel,
 )
+from .registry import ModelRegistry, ModelSet
+from .routes import Recommender, Route, build_routes
+from .seen_items import SeenItemsStore
 
 __all__ = [
+    "ArtifactStore",
+    "ModelRegistry",
+    "ModelSet",
+    "Recommender",
+    "Route",
+    "build_routes",
+    "SeenItemsStore",
+    "ResponseCache",
+    "SqliteCacheBackend",
     "PopularInCategory",
     "ANNLightFM",
+    "LightFMArtifacts",
     "OfflineKnnModel",
     "OnlineFM",
     "OnlineKnnModel",
+    "RangeModel",
     "SimplePopularModel",
 ]
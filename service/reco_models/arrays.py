@@ -0,0 +1,151 @@
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .storage import load_array, save_array
+
+# Recos are returned either as a list or as a NumPy array of item ids
+Reco = Union[List[int], NDArray[np.int64]]
+
+
+def isin_sorted(values: NDArray, sorted_array: NDArray) -> NDArray[np.bool_]:
+    """Same as `np.isin(values, sorted_array)` using binary search over sorted array"""
+    if sorted_array.shape[0] == 0:
+        return np.zeros(values.shape[0], dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_array, values), sorted_array.shape[0] - 1)
+    return sorted_array[positions] == values
+
+
+class IntMapping:
+    """Read-only int -> int mapping stored in two NumPy arrays.
+
+    Unlike a dict, it keeps no per-entry Python objects, so its pages are
+    never written to by refcount updates and stay shared between forked
+    workers. Lookup is a binary search over sorted keys.
+
+    Attributes:
+        keys: The sorted keys
+        values: The values aligned with keys
+
+    """
+
+    __slots__ = ("keys", "values")
+
+    def __init__(self, keys: NDArray[np.int64], values: NDArray[np.int64]):
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, mapping: Dict[int, int]) -> "IntMapping":
+        keys = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+        values = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+        order = np.argsort(keys, kind="stable")
+        return cls(keys[order], values[order])
+
+    def save(self, directory: str, name: str) -> None:
+        save_array(directory, f"{name}.keys", self.keys)
+        save_array(directory, f"{name}.values", self.values)
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> "IntMapping":
+        return cls(load_array(directory, f"{name}.keys"), load_array(directory, f"{name}.values"))
+
+    def __len__(self) -> int:
+        return self.keys.shape[0]
+
+    def __contains__(self, key: int) -> bool:
+        return self._position(key) is not None
+
+    def _position(self, key: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < self.keys.shape[0] and self.keys[pos] == key:
+            return pos
+        return None
+
+    def get(self, key: int, default: Optional[int] = None) -> Optional[int]:
+        pos = self._position(key)
+        if pos is None:
+            return default
+        return int(self.values[pos])
+
+    def get_many(self, keys: NDArray[np.int64]) -> Tuple[NDArray[np.int64], NDArray[np.bool_]]:
+        """Returns values for `keys` and the mask of found keys
+
+        Values of not found keys are undefined.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if self.keys.shape[0] == 0:
+            return np.zeros(keys.shape[0], dtype=np.int64), np.zeros(keys.shape[0], dtype=bool)
+        positions = np.minimum(np.searchsorted(self.keys, keys), self.keys.shape[0] - 1)
+        found = self.keys[positions] == keys
+        return self.values[positions], found
+
+
+class ItemLists:
+    """Read-only int -> int array mapping in CSR layout.
+
+    Items of key `keys[i]` are `items[offsets[i]:offsets[i + 1]]`. Items
+    are sorted and unique unless built with `sort_items=False`, which
+    keeps ranked lists as they are.
+
+    Attributes:
+        keys: The sorted keys
+        offsets: The start of every key items, has len(keys) + 1 elements
+        items: The concatenated items of all keys
+
+    """
+
+    __slots__ = ("keys", "offsets", "items")
+
+    def __init__(self, keys: NDArray[np.int64], offsets: NDArray[np.int64], items: NDArray[np.int32]):
+        self.keys = keys
+        self.offsets = offsets
+        self.items = items
+
+    @classmethod
+    def from_dict(cls, mapping: Mapping[int, Iterable[int]], sort_items: bool = True) -> "ItemLists":
+        keys = np.array(sorted(mapping.keys()), dtype=np.int64)
+        rows = [np.fromiter(mapping[key], dtype=np.int32) for key in keys.tolist()]
+        if sort_items:
+            rows = [np.unique(row) for row in rows]
+        offsets = np.zeros(keys.shape[0] + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([row.shape[0] for row in rows])
+        items = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+        return cls(keys, offsets, items)
+
+    def save(self, directory: str, name: str) -> None:
+        save_array(directory, f"{name}.keys", self.keys)
+        save_array(directory, f"{name}.offsets", self.offsets)
+        save_array(directory, f"{name}.items", self.items)
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> "ItemLists":
+        return cls(
+            load_array(directory, f"{name}.keys"),
+            load_array(directory, f"{name}.offsets"),
+            load_array(directory, f"{name}.items"),
+        )
+
+    def __len__(self) -> int:
+        return self.keys.shape[0]
+
+    def __contains__(self, key: int) -> bool:
+        pos = int(np.searchsorted(self.keys, key))
+        return pos < self.keys.shape[0] and self.keys[pos] == key
+
+    def get_lengths(self, keys: NDArray[np.int64]) -> NDArray[np.int64]:
+        """Returns the number of items of every key, 0 for unknown keys"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if self.keys.shape[0] == 0:
+            return np.zeros(keys.shape[0], dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, keys), self.keys.shape[0] - 1)
+        lengths = self.offsets[positions + 1] - self.offsets[positions]
+        return np.where(self.keys[positions] == keys, lengths, 0)
+
+    def get(self, key: int) -> NDArray[np.int32]:
+        """Returns items of `key`, empty array for unknown key"""
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < self.keys.shape[0] and self.keys[pos] == key:
+            return self.items[self.offsets[pos] : self.offsets[pos + 1]]
+        return self.items[:0]
@@ -0,0 +1,158 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from threading import Lock
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import dill
+
+from service.log import app_logger
+
+Loader = Callable[[Any], Any]
+Converter = Callable[[Any], Any]
+
+
+class ArtifactSpec(NamedTuple):
+    """Artifact file to load.
+
+    Attributes:
+        path: The path to the artifact file
+        loader: The function to deserialize an opened binary file,
+            `dill.load` by default
+        convert: The function to transform the deserialized object, e.g.
+            into a compact container. Only the converted object is kept
+        required: The flag to raise if the file is missing, otherwise
+            None is loaded
+        keep: The flag to keep the artifact for later callers, objects
+            used only while building a model should not be kept
+
+    """
+
+    path: str
+    loader: Optional[Loader] = None
+    convert: Optional[Converter] = None
+    required: bool = True
+    keep: bool = True
+
+
+class ArtifactStats(NamedTuple):
+    seconds: float
+    file_size: int
+
+
+def read_artifact(path: str, loader: Optional[Loader] = None, convert: Optional[Converter] = None) -> Any:
+    """Deserializes and converts artifact, top-level to be run in a process pool"""
+    with open(path, "rb") as f:
+        artifact = (loader or dill.load)(f)
+    return convert(artifact) if convert is not None else artifact
+
+
+class ArtifactStore:
+    """Loads every artifact file at most once and shares it between models.
+
+    Model variants built over the same files (e.g. both `OnlineFM`
+    routes) get the very same objects instead of separate copies.
+    Independent artifacts are loaded concurrently by `load_many`: in
+    threads, which overlap file reading, and optionally with
+    deserialization and conversion done in a process pool, which is
+    worth it for CPU-heavy unpickling of large dicts converted to arrays.
+    Pools live only during a `load_many` call, so no threads are left
+    behind for a fork.
+
+    Attributes:
+        max_workers: The number of artifacts loaded at once
+        use_processes: The flag to deserialize in a process pool
+        stats: The load time and file size of every loaded artifact
+
+    """
+
+    def __init__(self, max_workers: int = 4, use_processes: bool = False) -> None:
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.stats: Dict[str, ArtifactStats] = {}
+        self._artifacts: Dict[Tuple[str, Optional[Converter]], Any] = {}
+        self._locks: DefaultDict[Tuple[str, Optional[Converter]], Lock] = defaultdict(Lock)
+        self._lock = Lock()
+
+    def __contains__(self, path: str) -> bool:
+        return any(stored_path == path for stored_path, _ in self._artifacts)
+
+    def load(
+        self, path: str, loader: Optional[Loader] = None, convert: Optional[Converter] = None, keep: bool = True
+    ) -> Any:
+        """Returns loaded artifact stored at `path`
+
+        :param path: str
+            Path to the artifact file
+        :param loader: Callable
+            Function to deserialize an opened binary file, `dill.load` by default
+        :param convert: Callable
+            Function to transform the deserialized object, e.g. into a compact
+            container. Only the converted object is kept
+        :param keep: bool
+            Whether to keep the artifact for later callers
+        :return: Any
+            The artifact shared with all previous callers
+        """
+        return self._load(ArtifactSpec(path, loader, convert, keep=keep))
+
+    def load_many(self, specs: Sequence[ArtifactSpec]) -> List[Any]:
+        """Returns loaded artifacts in order of `specs`, loading them concurrently"""
+        if self.max_workers <= 1 or len(specs) <= 1:
+            return [self._load(spec) for spec in specs]
+        process_pool = ProcessPoolExecutor(max_workers=self.max_workers) if self.use_processes else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="artifacts") as threads:
+                futures = [threads.submit(self._load, spec, process_pool) for spec in specs]
+                return [future.result() for future in futures]
+        finally:
+            if process_pool is not None:
+                process_pool.shutdown()
+
+    def _load(self, spec: ArtifactSpec, process_pool: Optional[Executor] = None) -> Any:
+        key = (spec.path, spec.convert)
+        with self._lock:
+            lock = self._locks[key]
+        with lock:
+            if key in self._artifacts:
+                return self._artifacts[key]
+            started_at = time.monotonic()
+            try:
+                if process_pool is not None:
+                    artifact = process_pool.submit(read_artifact, spec.path, spec.loader, spec.convert).result()
+                else:
+                    artifact = read_artifact(spec.path, spec.loader, spec.convert)
+            except FileNotFoundError:
+                if spec.required:
+                    raise
+                return None
+            if spec.keep:
+                self._artifacts[key] = artifact
+            self.stats[spec.path] = ArtifactStats(time.monotonic() - started_at, os.path.getsize(spec.path))
+        app_logger.info(
+            "Artifact %s loaded in %.2f s, %.1f MiB",
+            spec.path,
+            self.stats[spec.path].seconds,
+            self.stats[spec.path].file_size / 2**20,
+        )
+        return artifact
+
+    def log_stats(self) -> None:
+        """Logs loaded artifacts from the slowest one"""
+        for path, stats in sorted(self.stats.items(), key=lambda item: item[1].seconds, reverse=True):
+            app_logger.info("Artifact %s: %.2f s, %.1f MiB", path, stats.seconds, stats.file_size / 2**20)
@@ -0,0 +1,208 @@
+import asyncio
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+import orjson
+
+from .arrays import Reco
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Bounded in-process cache with least recently used eviction.
+
+    Attributes:
+        maxsize: The maximum number of stored entries
+        ttl: The number of seconds an entry lives, forever if None
+        hits: The number of successful lookups
+        misses: The number of failed lookups
+
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Tuple[V, float]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key, None)
+            if entry is not None and self.ttl is not None and entry[1] < time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: V) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else 0.0
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class CacheBackend(ABC):
+    """Shared storage of recos which outlives a single worker process"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Reco]:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, value: Reco) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    @abstractmethod
+    def purge(self, version: str) -> None:
+        """Deletes expired entries and entries of other artifacts versions"""
+
+
+class SqliteCacheBackend(CacheBackend):
+    """Shared cache backend in a local SQLite file.
+
+    It stands in for an external store such as Redis: every gunicorn
+    worker opens the same file, so recos computed by one worker are
+    served by others. Queries block on the file lock of other workers,
+    so `ResponseCache` runs them in the executor off the event loop.
+    Expired entries are deleted every `purge_interval` seconds on put.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, purge_interval: float = 60.0):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._next_purge = time.monotonic() + purge_interval
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS recos (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Reco]:
+        with self._lock:
+            row = self._connection.execute("SELECT value, expires_at FROM recos WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return orjson.loads(row[0])
+
+    def put(self, key: str, value: Reco) -> None:
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO recos (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode(), expires_at),
+            )
+            if self.ttl is not None and time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + self.purge_interval
+                self._connection.execute("DELETE FROM recos WHERE expires_at < ?", (time.time(),))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM recos")
+
+    def purge(self, version: str) -> None:
+        # Keys start with the version, see `ResponseCache._key`
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM recos WHERE expires_at < ? OR substr(key, 1, ?) != ?",
+                (time.time(), len(version) + 1, f"{version}:"),
+            )
+
+
+class ResponseCache:
+    """Cache of final recos keyed by model name, user and number of recos.
+
+    Lookups go to the in-process LRU first and then to the optional shared
+    backend. Keys include the version of artifacts the models are loaded
+    from, so recos computed by replaced artifacts are never served, even
+    by a persistent backend after restart, and workers serving different
+    artifacts do not share entries. Coroutines `get_async` and `put_async`
+    query the backend in the executor, so it never blocks the event loop.
+
+    Attributes:
+        local: The in-process LRU cache
+        backend: The optional shared cache backend
+        shared_hits: The number of lookups served by the backend
+
+    """
+
+    def __init__(self, maxsize: int = 100_000, ttl: Optional[float] = None, backend: Optional[CacheBackend] = None):
+        self.local: LRUCache[Reco] = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.backend = backend
+        self.shared_hits = 0
+
+    @staticmethod
+    def _key(model_name: str, user_id: int, k_recs: int, version: str) -> str:
+        return f"{version}:{model_name}:{user_id}:{k_recs}"
+
+    def get(self, model_name: str, user_id: int, k_recs: int, version: str = "") -> Optional[Reco]:
+        key = self._key(model_name, user_id, k_recs, version)
+        reco = self.local.get(key)
+        if reco is None and self.backend is not None:
+            reco = self.backend.get(key)
+            if reco is not None:
+                self.shared_hits += 1
+                self.local.put(key, reco)
+        return reco
+
+    def put(self, model_name: str, user_id: int, k_recs: int, reco: Reco, version: str = "") -> None:
+        key = self._key(model_name, user_id, k_recs, version)
+        self.local.put(key, reco)
+        if self.backend is not None:
+            self.backend.put(key, reco)
+
+    async def get_async(self, model_name: str, user_id: int, k_recs: int, version: str = "") -> Optional[Reco]:
+        key = self._key(model_name, user_id, k_recs, version)
+        reco = self.local.get(key)
+        if reco is None and self.backend is not None:
+            reco = await asyncio.get_running_loop().run_in_executor(None, self.backend.get, key)
+            if reco is not None:
+                self.shared_hits += 1
+                self.local.put(key, reco)
+        return reco
+
+    async def put_async(self, model_name: str, user_id: int, k_recs: int, reco: Reco, version: str = "") -> None:
+        key = self._key(model_name, user_id, k_recs, version)
+        self.local.put(key, reco)
+        if self.backend is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.backend.put, key, reco)
+
+    def invalidate(self, version: Optional[str] = None) -> None:
+        """Drops all local entries and backend entries of versions other than `version`, all if not set"""
+        self.local.clear()
+        if self.backend is None:
+            return
+        if version is None:
+            self.backend.clear()
+        else:
+            self.backend.purge(version)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.local),
+            "hits": self.local.hits,
+            "misses": self.local.misses,
+            "shared_hits": self.shared_hits,
+        }
@@ -0,0 +1,82 @@
+"""Converts dill/pickle model artifacts to the compact memory-mapped format.
+
+Usage: python -m service.reco_models.convert
+"""
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+from service.configuration import (
+    ANN_PATHS,
+    COMPACT_ANN,
+    COMPACT_LIGHT_FM,
+    COMPACT_POPULAR_IN_CATEGORY,
+    COMPACT_POPULAR_MODEL,
+    FEATURES_FOR_COLD,
+    ITEM_MAPPING,
+    LIGHT_FM,
+    POPULAR_IN_CATEGORY,
+    POPULAR_MODEL_RECS,
+    POPULAR_MODEL_USERS,
+    UNIQUE_FEATURES,
+    USER_MAPPING,
+)
+
+from .artifacts import ArtifactStore
+from .loaders import COMPACT_SOURCES
+from .popular_in_category_model import PopularInCategory
+from .reco_models import ANNLightFM, LightFMArtifacts, SimplePopularModel
+from .storage import remove_manifest, write_manifest
+
+
+def _missing(*paths: str) -> bool:
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        print(f"Skipped, missing {', '.join(missing)}. Run `make load_models` first")
+    return bool(missing)
+
+
+@contextmanager
+def converting(directory: str) -> Iterator[None]:
+    """Marks `directory` converted only when every file is written"""
+    remove_manifest(directory)
+    yield
+    write_manifest(directory, COMPACT_SOURCES[directory])
+
+
+def main() -> None:
+    popular_model = None
+    print(f"Converting popular model to {COMPACT_POPULAR_MODEL}")
+    if not _missing(POPULAR_MODEL_USERS, POPULAR_MODEL_RECS):
+        popular_model = SimplePopularModel(POPULAR_MODEL_USERS, POPULAR_MODEL_RECS)
+        with converting(COMPACT_POPULAR_MODEL):
+            popular_model.save_compact(COMPACT_POPULAR_MODEL)
+
+    print(f"Converting popular in category model to {COMPACT_POPULAR_IN_CATEGORY}")
+    if not _missing(POPULAR_IN_CATEGORY):
+        with converting(COMPACT_POPULAR_IN_CATEGORY):
+            PopularInCategory(POPULAR_IN_CATEGORY).save_compact(COMPACT_POPULAR_IN_CATEGORY)
+
+    print(f"Converting LightFM model to {COMPACT_LIGHT_FM}")
+    if not _missing(LIGHT_FM, USER_MAPPING, ITEM_MAPPING, FEATURES_FOR_COLD, UNIQUE_FEATURES):
+        artifacts = LightFMArtifacts(
+            ArtifactStore(),
+            name=LIGHT_FM,
+            USER_MAPPING=USER_MAPPING,
+            ITEM_MAPPING=ITEM_MAPPING,
+            FEATURES_FOR_COLD=FEATURES_FOR_COLD,
+            UNIQUE_FEATURES=UNIQUE_FEATURES,
+        )
+        with converting(COMPACT_LIGHT_FM):
+            artifacts.save_compact(COMPACT_LIGHT_FM)
+
+    print(f"Converting ANN LightFM model to {COMPACT_ANN}")
+    user_m, item_inv_m, _, user_emb, watched_u2i, cold_reco_dict = ANN_PATHS
+    if popular_model is not None and not _missing(user_m, item_inv_m, user_emb, watched_u2i, cold_reco_dict):
+        ann_lightfm = ANNLightFM(ANN_PATHS, popular_model)
+        with converting(COMPACT_ANN):
+            ann_lightfm.save_compact(COMPACT_ANN)
+
+
+if __name__ == "__main__":
+    main()
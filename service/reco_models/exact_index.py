@@ -0,0 +1,109 @@
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+Neighbours = Tuple[NDArray[np.int32], NDArray[np.float32]]
+
+DTYPES = ("float32", "float16", "int8")
+QUERY_CHUNK_SIZE = 256
+
+
+class ExactIndex:
+    """Exact nearest neighbours by dot product with nmslib index interface.
+
+    It is a drop-in replacement of HNSW index in `negdotprod` space:
+    queries return item ids ordered by increasing distance, which is the
+    negated dot product. Items are scored by blocks of `block_size` rows
+    with one BLAS matrix product per block, and only `k` candidates of a
+    block are kept with `np.argpartition`, so memory does not grow with
+    the catalog.
+
+    Item matrix may be stored quantized: float16 halves memory and keeps
+    ranking almost exact, int8 with a scale per item quarters it. Blocks
+    are converted to float32 before the product. Only float32 gives
+    exact results.
+
+    Attributes:
+        items: The (n_items, dim) item matrix in the storage dtype
+        scales: The per item scales of int8 matrix, None otherwise
+        block_size: The number of items scored at once
+
+    """
+
+    def __init__(self, items: NDArray, scales: Optional[NDArray[np.float32]] = None, block_size: int = 16384):
+        self.items = items
+        self.scales = scales
+        self.block_size = block_size
+
+    @classmethod
+    def from_vectors(
+        cls, vectors: NDArray[np.float32], dtype: str = "float32", block_size: int = 16384
+    ) -> "ExactIndex":
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if dtype == "float32":
+            return cls(vectors, block_size=block_size)
+        if dtype == "float16":
+            return cls(vectors.astype(np.float16), block_size=block_size)
+        if dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            items = np.round(vectors / scales[:, None]).astype(np.int8)
+            return cls(items, scales.astype(np.float32), block_size=block_size)
+        raise ValueError(f"Unknown dtype {dtype}, expected one of {DTYPES}")
+
+    @classmethod
+    def from_hnsw(cls, index: Any, dtype: str = "float32", block_size: int = 16384) -> "ExactIndex":
+        """Builds exact index over the item vectors stored in nmslib index loaded with data"""
+        vectors = np.vstack([index[item_id] for item_id in range(len(index))])
+        return cls.from_vectors(vectors, dtype, block_size)
+
+    def __len__(self) -> int:
+        return self.items.shape[0]
+
+    def _block_scores(self, vectors: NDArray[np.float32], start: int) -> NDArray[np.float32]:
+        block = self.items[start : start + self.block_size]
+        scores = vectors @ block.astype(np.float32, copy=False).T
+        if self.scales is not None:
+            scores *= self.scales[start : start + self.block_size]
+        return scores
+
+    def _top_k(self, vectors: NDArray[np.float32], k: int) -> Tuple[NDArray[np.int64], NDArray[np.float32]]:
+        n_items = self.items.shape[0]
+        k = min(k, n_items)
+        candidate_ids: List[NDArray[np.int64]] = []
+        candidate_scores: List[NDArray[np.float32]] = []
+        for start in range(0, n_items, self.block_size):
+            scores = self._block_scores(vectors, start)
+            if k < scores.shape[1]:
+                ids = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, ids, axis=1)
+            else:
+                ids = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            candidate_ids.append(ids + start)
+            candidate_scores.append(scores)
+
+        ids = np.hstack(candidate_ids)
+        scores = np.hstack(candidate_scores)
+        order = np.argsort(np.negative(scores), axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def knnQuery(self, vector: NDArray[np.float32], k: int = 10) -> Neighbours:  # pylint: disable=invalid-name
+        ids, scores = self._top_k(np.asarray(vector, dtype=np.float32)[None, :], k)
+        return ids[0].astype(np.int32), -scores[0]
+
+    def knnQueryBatch(  # pylint: disable=invalid-name
+        self, vectors: NDArray[np.float32], k: int = 10, num_threads: int = 0
+    ) -> List[Neighbours]:
+        """Same as `knnQuery` for every row of `vectors`
+
+        `num_threads` is accepted for compatibility, the products use
+        the threads of BLAS. Queries are scored by chunks of
+        `QUERY_CHUNK_SIZE`, which bounds the scores matrix of a block.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        neighbours: List[Neighbours] = []
+        for start in range(0, vectors.shape[0], QUERY_CHUNK_SIZE):
+            ids, scores = self._top_k(vectors[start : start + QUERY_CHUNK_SIZE], k)
+            neighbours.extend(zip(ids.astype(np.int32), -scores))
+        return neighbours
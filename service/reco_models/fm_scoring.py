@@ -0,0 +1,121 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+from lightfm import LightFM
+from numpy.typing import NDArray
+
+from .storage import load_array, save_array
+
+
+def top_k_indices(scores: NDArray[np.float32], k: int) -> NDArray[np.int64]:
+    """Returns indices of k highest scores ordered by descending score.
+
+    `np.argpartition` selects the k candidates in linear time, then only
+    those k are sorted instead of the whole catalog.
+    """
+    n_items = scores.shape[0]
+    k = min(k, n_items)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n_items:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n_items)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def top_k_indices_batch(scores: NDArray[np.float32], k: int) -> NDArray[np.int64]:
+    """Returns indices of k highest scores of every row ordered by descending score"""
+    n_rows, n_items = scores.shape
+    k = min(k, n_items)
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.int64)
+    if k < n_items:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_items), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class FMScorer:
+    """Scoring engine for a fitted LightFM model.
+
+    Item representations are computed once at load time, so scoring
+    a user is a single matrix-vector product over the whole catalog
+    instead of a `LightFM.predict` call. User bias is the same for every
+    item of a user and does not affect the ranking, so it is skipped.
+
+    Attributes:
+        item_embeddings: The (n_items, no_components) item representations
+        item_biases: The item biases
+        user_embeddings: The user feature embeddings; row `i` is the
+            embedding of hot user with internal id `i` or of the cold
+            user feature with index `i`
+        item_ids: The lookup array internal item id -> external item id
+
+    """
+
+    ARRAYS = ("item_embeddings", "item_biases", "user_embeddings", "item_ids")
+
+    def __init__(
+        self,
+        item_embeddings: NDArray[np.float32],
+        item_biases: NDArray[np.float32],
+        user_embeddings: NDArray[np.float32],
+        item_ids: NDArray[np.int64],
+    ):
+        self.item_embeddings = item_embeddings
+        self.item_biases = item_biases
+        self.user_embeddings = user_embeddings
+        self.item_ids = item_ids
+
+    @classmethod
+    def from_lightfm(cls, model: LightFM, item_mapping: Dict[int, int]) -> "FMScorer":
+        n_items = len(item_mapping)
+        item_biases, item_embeddings = model.get_item_representations()
+        return cls(
+            item_embeddings=np.ascontiguousarray(item_embeddings[:n_items], dtype=np.float32),
+            item_biases=np.ascontiguousarray(item_biases[:n_items], dtype=np.float32),
+            user_embeddings=np.ascontiguousarray(model.user_embeddings, dtype=np.float32),
+            item_ids=np.array([item_mapping[internal_id] for internal_id in range(n_items)], dtype=np.int64),
+        )
+
+    def save(self, directory: str) -> None:
+        for name in self.ARRAYS:
+            save_array(directory, name, getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str) -> "FMScorer":
+        return cls(**{name: load_array(directory, name) for name in cls.ARRAYS})
+
+    def user_vector(self, internal_user_id: int) -> NDArray[np.float32]:
+        return self.user_embeddings[internal_user_id]
+
+    def features_vector(self, feature_ids: NDArray[np.int64]) -> NDArray[np.float32]:
+        return self.user_embeddings[feature_ids].sum(axis=0)
+
+    def scores(self, user_vector: NDArray[np.float32]) -> NDArray[np.float32]:
+        return self.item_embeddings @ user_vector + self.item_biases
+
+    def recommend(self, user_vector: NDArray[np.float32], k_recs: int) -> NDArray[np.int64]:
+        """Returns external ids of top `k_recs` items as an array, it is serialized without conversion"""
+        idxs = top_k_indices(self.scores(user_vector), k_recs)
+        return self.item_ids[idxs]
+
+    def recommend_batch(
+        self, user_vectors: NDArray[np.float32], k_recs: int, chunk_size: int = 256
+    ) -> List[NDArray[np.int64]]:
+        """Returns recos for every row of `user_vectors`
+
+        Users are scored by chunks of `chunk_size` with a single matrix-matrix
+        product per chunk, which bounds memory used by the scores matrix.
+        """
+        recos: List[NDArray[np.int64]] = []
+        for start in range(0, user_vectors.shape[0], chunk_size):
+            scores = user_vectors[start : start + chunk_size] @ self.item_embeddings.T + self.item_biases
+            recos.extend(self.item_ids[top_k_indices_batch(scores, k_recs)])
+        return recos
+
+    def user_vectors(self, internal_user_ids: Sequence[int]) -> NDArray[np.float32]:
+        return self.user_embeddings[np.asarray(internal_user_ids, dtype=np.int64)]
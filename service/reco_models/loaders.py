@@ -0,0 +1,249 @@
+"""Builds served models from the artifacts listed in `service.configuration`.
+
+Every model is loaded from the compact memory-mapped format if it was
+converted with `make convert_models`, and from dill/pickle files otherwise.
+
+The version of models is derived from the artifact files, so every
+worker loading the same files reports the same version.
+"""
+import hashlib
+import json
+import os
+from collections import defaultdict
+from functools import partial
+from importlib import import_module
+from threading import Lock
+from typing import Any, Callable, DefaultDict, Dict, Iterable, Optional, Tuple
+
+from service.configuration import (
+    ANN_PATHS,
+    COMPACT_ANN,
+    COMPACT_LIGHT_FM,
+    COMPACT_POPULAR_IN_CATEGORY,
+    COMPACT_POPULAR_MODEL,
+    FEATURES_FOR_COLD,
+    ITEM_MAPPING,
+    LIGHT_FM,
+    OFFLINE_KNN_MODEL_PATH,
+    ONLINE_KNN_MODEL_PATH,
+    POPULAR_IN_CATEGORY,
+    POPULAR_MODEL_RECS,
+    POPULAR_MODEL_USERS,
+    UNIQUE_FEATURES,
+    USER_MAPPING,
+)
+
+from .artifacts import ArtifactStore
+from .exact_index import ExactIndex
+from .popular_in_category_model import PopularInCategory
+from .reco_models import (
+    ANNLightFM,
+    LightFMArtifacts,
+    OfflineKnnModel,
+    OnlineFM,
+    OnlineKnnModel,
+    RangeModel,
+    SimplePopularModel,
+)
+from .storage import MANIFEST, is_compact, source_stats
+
+# Files every compact artifact is converted from
+COMPACT_SOURCES = {
+    COMPACT_POPULAR_MODEL: (POPULAR_MODEL_USERS, POPULAR_MODEL_RECS),
+    COMPACT_POPULAR_IN_CATEGORY: (POPULAR_IN_CATEGORY,),
+    COMPACT_LIGHT_FM: (LIGHT_FM, USER_MAPPING, ITEM_MAPPING, FEATURES_FOR_COLD, UNIQUE_FEATURES),
+    # HNSW index is not converted, it is loaded by nmslib in both cases
+    COMPACT_ANN: tuple(path for path in ANN_PATHS if path != ANN_PATHS[2]),
+}
+
+
+# Files the served models are loaded from
+ARTIFACT_PATHS = (
+    POPULAR_MODEL_RECS,
+    POPULAR_MODEL_USERS,
+    POPULAR_IN_CATEGORY,
+    OFFLINE_KNN_MODEL_PATH,
+    ONLINE_KNN_MODEL_PATH,
+    LIGHT_FM,
+    USER_MAPPING,
+    ITEM_MAPPING,
+    FEATURES_FOR_COLD,
+    UNIQUE_FEATURES,
+    *ANN_PATHS,
+    # Data of HNSW index saved with `save_data=True`
+    f"{ANN_PATHS[2]}.dat",
+    *(os.path.join(directory, MANIFEST) for directory in COMPACT_SOURCES),
+)
+
+
+def artifacts_version(paths: Iterable[str] = ARTIFACT_PATHS) -> str:
+    """Returns the hash of modification times and sizes of artifact files"""
+    stats = json.dumps(source_stats(paths), sort_keys=True)
+    return hashlib.blake2b(stats.encode(), digest_size=6).hexdigest()
+
+
+def use_compact(directory: str) -> bool:
+    return is_compact(directory, COMPACT_SOURCES[directory])
+
+
+def load_popular_model(store: Optional[ArtifactStore] = None) -> SimplePopularModel:
+    if use_compact(COMPACT_POPULAR_MODEL):
+        return SimplePopularModel.from_compact(COMPACT_POPULAR_MODEL)
+    return SimplePopularModel(POPULAR_MODEL_USERS, POPULAR_MODEL_RECS, store)
+
+
+def load_popular_in_category(store: Optional[ArtifactStore] = None) -> PopularInCategory:
+    if use_compact(COMPACT_POPULAR_IN_CATEGORY):
+        return PopularInCategory.from_compact(COMPACT_POPULAR_IN_CATEGORY)
+    return PopularInCategory(POPULAR_IN_CATEGORY, store)
+
+
+def load_light_fm_artifacts(store: ArtifactStore) -> LightFMArtifacts:
+    if use_compact(COMPACT_LIGHT_FM):
+        return LightFMArtifacts.from_compact(COMPACT_LIGHT_FM)
+    return LightFMArtifacts(
+        store,
+        name=LIGHT_FM,
+        USER_MAPPING=USER_MAPPING,
+        ITEM_MAPPING=ITEM_MAPPING,
+        FEATURES_FOR_COLD=FEATURES_FOR_COLD,
+        UNIQUE_FEATURES=UNIQUE_FEATURES,
+    )
+
+
+def load_ann_lightfm(
+    popular_model: SimplePopularModel, store: Optional[ArtifactStore] = None, **params: Any
+) -> ANNLightFM:
+    """Loads ANN model, `params` are the query parameters of `ANNLightFM`"""
+    index_path = ANN_PATHS[2]
+    if use_compact(COMPACT_ANN):
+        return ANNLightFM.from_compact(COMPACT_ANN, index_path, popular_model, **params)
+    return ANNLightFM(ANN_PATHS, popular_model, store=store, **params)
+
+
+def load_plugin(path: str) -> Callable[["ModelFactory"], Any]:
+    """Imports the builder of a plugin model by its path, e.g. `package.module:build_model`"""
+    module_name, _, attribute = path.partition(":")
+    if not attribute:
+        raise ValueError(f"Plugin path {path} should be of form module:attribute")
+    return getattr(import_module(module_name), attribute)
+
+
+# Route names of models built by `ModelFactory`
+SERVED_MODELS = (
+    "test_model",
+    "baseline",
+    "popular",
+    "knn",
+    "online_knn",
+    "light_fm_1",
+    "light_fm_2",
+    "ann_lightfm",
+    "ann_lightfm_exact",
+)
+# Models without a route of their own, only fallbacks of others
+FALLBACK_MODELS = ("popular",)
+# Fallbacks of routes not set in `ModelsConfig.fallbacks`
+DEFAULT_FALLBACKS = ("popular",)
+
+
+class ModelFactory:
+    """Builds served models by their route name.
+
+    Dependencies of several models, the popular model and LightFM
+    artifacts, are loaded once per factory. Every dependency has its own
+    lock, so independent models may be built in parallel threads. A new
+    factory reads artifacts from disk again, which is how replaced
+    artifacts are picked up on reload.
+
+    Models besides `SERVED_MODELS` are plugins: a plugin is built by a
+    function imported by its path, which is given the factory to share
+    the loaded dependencies.
+
+    Attributes:
+        store: The store of loaded pickled artifacts, it loads files of
+            one model concurrently
+        ann_params: The query parameters of `ANNLightFM`: ef_search,
+            num_threads and max_fetch
+        exact_params: The parameters of `ExactIndex` of the exact route:
+            dtype and block_size
+        plugins: The paths of plugin builders by model name
+        builders: The builders of every model by its name
+        version: The version of artifact files when the factory was created
+
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        max_workers: int = 4,
+        use_processes: bool = False,
+        ann_params: Optional[Dict[str, Any]] = None,
+        exact_params: Optional[Dict[str, Any]] = None,
+        plugins: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.store = ArtifactStore(max_workers, use_processes)
+        self.ann_params = ann_params or {}
+        self.exact_params = exact_params or {}
+        self.plugins = plugins or {}
+        self.version = artifacts_version()
+        self._shared: Dict[str, Any] = {}
+        self._locks: DefaultDict[str, Lock] = defaultdict(Lock)
+        self._lock = Lock()
+        self.builders: Dict[str, Callable[[], Any]] = {
+            "test_model": RangeModel,
+            "baseline": partial(load_popular_in_category, self.store),
+            "popular": self.popular_model,
+            "knn": partial(OfflineKnnModel, OFFLINE_KNN_MODEL_PATH, self.store),
+            "online_knn": partial(OnlineKnnModel, ONLINE_KNN_MODEL_PATH, self.store),
+            # Use popular model to predict recos for all cold
+            "light_fm_1": lambda: OnlineFM(self.light_fm_artifacts(), cold_with_fm=False),
+            # Use LightFM model to predict recos for cold with features,
+            # popular for others
+            "light_fm_2": lambda: OnlineFM(self.light_fm_artifacts()),
+            "ann_lightfm": self.ann_lightfm,
+            "ann_lightfm_exact": self.ann_lightfm_exact,
+        }
+        for name, path in self.plugins.items():
+            self.builders[name] = partial(load_plugin(path), self)
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Loaded state is not sent to other processes, they load their own
+        return ModelFactory, (
+            self.store.max_workers,
+            self.store.use_processes,
+            self.ann_params,
+            self.exact_params,
+            self.plugins,
+        )
+
+    def _shared_get(self, key: str, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            lock = self._locks[key]
+        with lock:
+            if key not in self._shared:
+                self._shared[key] = load()
+        return self._shared[key]
+
+    def popular_model(self) -> SimplePopularModel:
+        return self._shared_get("popular", partial(load_popular_model, self.store))
+
+    def light_fm_artifacts(self) -> LightFMArtifacts:
+        # Both LightFM variants share one loaded model
+        return self._shared_get("light_fm", partial(load_light_fm_artifacts, self.store))
+
+    def ann_lightfm(self) -> ANNLightFM:
+        return self._shared_get(
+            "ann_lightfm", lambda: load_ann_lightfm(self.popular_model(), self.store, **self.ann_params)
+        )
+
+    def ann_lightfm_exact(self) -> ANNLightFM:
+        # Same model with brute-force search over item vectors of HNSW index
+        ann_lightfm = self.ann_lightfm()
+        return ann_lightfm.with_index(ExactIndex.from_hnsw(ann_lightfm.index, **self.exact_params))
+
+    def build(self, name: str) -> Any:
+        builder = self.builders.get(name, None)
+        if builder is None:
+            raise KeyError(name)
+        return builder()
@@ -1,26 +1,86 @@
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional, Sequence
 
-import dill
+import numpy as np
+from numpy.typing import NDArray
+
+from .arrays import IntMapping, ItemLists
+from .artifacts import ArtifactStore
+from .seen_items import SeenItemsStore
+from .storage import load_array, save_array
+
+
+def merge_with_default(recs: NDArray[np.int64], default: NDArray[np.int64]) -> NDArray[np.int64]:
+    """Returns category recs followed by default recs missing in them"""
+    return np.concatenate([recs, default[~np.isin(default, recs)]])
 
 
 class PopularInCategory:
     """This class is implementation of recommendations generation with
     popular model by user category
 
+    Recs of every category are completed with "default" recs once at load
+    time, so a prediction is a single vectorized filter of already watched
+    items. Users without watched history get the precomputed answer of
+    their category.
+
     Parameters
     ----------
     model_path: str
         Path to dilled model
     """
 
-    __slots__ = {"model"}
+    __slots__ = {"user_to_watched_items", "user_to_category", "categories", "category_recs", "no_history_recs"}
 
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, store: Optional[ArtifactStore] = None):
         try:
-            with open(model_path, "rb") as file:
-                self.model: Dict[str, Any] = dill.load(file)
+            model: Dict[str, Any] = (store if store is not None else ArtifactStore()).load(model_path, keep=False)
         except FileNotFoundError as e:
             print(f"ERROR while loading model: {e}" f"\nRun `make load_models` to load model from GDrive")
+            return
+
+        self.user_to_watched_items = SeenItemsStore.from_dict(model["user_to_watched_items_map"])
+        self.categories: List[str] = list(dict.fromkeys(model["user_to_category_map"].values()))
+        codes = {category: code for code, category in enumerate(self.categories)}
+        self.user_to_category = IntMapping.from_dict(
+            {user_id: codes[category] for user_id, category in model["user_to_category_map"].items()}
+        )
+        category_to_popular_recs: Dict[str, List[int]] = model["category_to_popular_recs"]
+        default = np.array(category_to_popular_recs["default"], dtype=np.int64)
+        self._init_recs(
+            {
+                category: merge_with_default(np.array(recs, dtype=np.int64), default)
+                for category, recs in category_to_popular_recs.items()
+            }
+        )
+
+    def _init_recs(self, category_recs: Dict[str, NDArray[np.int64]]) -> None:
+        self.category_recs = category_recs
+        self.no_history_recs: Dict[str, List[int]] = {
+            category: recs.tolist() for category, recs in category_recs.items()
+        }
+
+    def save_compact(self, directory: str) -> None:
+        self.user_to_watched_items.save(directory, "user_to_watched_items")
+        self.user_to_category.save(directory, "user_to_category")
+        save_array(directory, "categories", np.array(self.categories, dtype=np.unicode_))
+        save_array(directory, "recs_categories", np.array(list(self.category_recs), dtype=np.unicode_))
+        recs = dict(enumerate(self.category_recs.values()))
+        ItemLists.from_dict(recs, sort_items=False).save(directory, "category_recs")
+
+    @classmethod
+    def from_compact(cls, directory: str) -> "PopularInCategory":
+        model = cls.__new__(cls)
+        model.user_to_watched_items = SeenItemsStore.load(directory, "user_to_watched_items")
+        model.user_to_category = IntMapping.load(directory, "user_to_category")
+        model.categories = load_array(directory, "categories").tolist()
+        recs = ItemLists.load(directory, "category_recs")
+        model._init_recs(  # pylint: disable=protected-access
+            {
+                category: recs.get(code)
+                for code, category in enumerate(load_array(directory, "recs_categories").tolist())
+            }
+        )
+        return model
 
     def predict(self, user_id: int, k: int) -> List[int]:
         """Returns top k items for specific user_id
@@ -32,33 +92,16 @@ class PopularInCategory:
         :return: List[int]
             Returns k item_ids
         """
-        user_to_watched_items_map: Dict[int, Set[int]] = self.model["user_to_watched_items_map"]
-        user_to_category_map: Dict[int, str] = self.model["user_to_category_map"]
-        category_to_popular_recs: Dict[str, List[int]] = self.model["category_to_popular_recs"]
-
-        watched_items = set()
-        if user_id in user_to_watched_items_map:
-            watched_items = user_to_watched_items_map[user_id]
-
         user_category = "default"
-        if user_id in user_to_category_map:
-            user_category = user_to_category_map[user_id]
-
-        recs_for_user_category = category_to_popular_recs[user_category]
-        result = []
-        current_recs_in_result = 0
-        for item_id in recs_for_user_category:
-            if item_id not in watched_items:
-                result.append(item_id)
-                current_recs_in_result += 1
-            if current_recs_in_result == k:
-                return result
-
-        recs_default = category_to_popular_recs["default"]
-        for item_id in recs_default:
-            if item_id not in watched_items and item_id not in result:
-                result.append(item_id)
-                current_recs_in_result += 1
-            if current_recs_in_result == k:
-                return result
+        category_code = self.user_to_category.get(user_id, None)
+        if category_code is not None:
+            user_category = self.categories[category_code]
+
+        if user_id not in self.user_to_watched_items:
+            result = self.no_history_recs[user_category][:k]
+        else:
+            result = self.user_to_watched_items.exclude_seen(user_id, self.category_recs[user_category])[:k].tolist()
         return result + [item_id + 1 for item_id in range(k - len(result))]
+
+    def predict_batch(self, user_ids: Sequence[int], k: int) -> List[List[int]]:
+        return [self.predict(user_id, k) for user_id in user_ids]
@@ -1,24 +1,88 @@
+import copy
 import pickle
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Tuple
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-import dill
 import nmslib
 import numpy as np
 from lightfm import LightFM
 from numpy.typing import NDArray
-from scipy import sparse
+
+from .arrays import IntMapping, ItemLists, Reco
+from .artifacts import ArtifactSpec, ArtifactStore
+from .cache import LRUCache
+from .fm_scoring import FMScorer
+from .seen_items import SeenItemsStore
+from .storage import load_array, save_array
+
+FeaturesSets = Tuple[IntMapping, ItemLists]
+
+
+def index_categories(mapping: Dict[int, str]) -> Tuple[IntMapping, List[str]]:
+    """Replaces dict user -> category with user -> category code mapping"""
+    categories = list(dict.fromkeys(mapping.values()))
+    codes = {category: code for code, category in enumerate(categories)}
+    return IntMapping.from_dict({user: codes[category] for user, category in mapping.items()}), categories
+
+
+def index_features_sets(features_for_cold: Dict[int, Dict[str, str]], features: NDArray[np.unicode_]) -> FeaturesSets:
+    """Replaces dict user -> features with user -> features set code mapping
+
+    There are few distinct features sets, so each one is stored once as
+    indices of its values in `features`. Users without features are skipped.
+    """
+    users_features = {user: frozenset(values.values()) for user, values in features_for_cold.items() if values}
+    features_sets = list(dict.fromkeys(users_features.values()))
+    codes = {features_set: code for code, features_set in enumerate(features_sets)}
+    features_ids = {
+        code: np.flatnonzero(np.isin(features, list(features_set))) for code, features_set in enumerate(features_sets)
+    }
+    users_codes = {user: codes[features_set] for user, features_set in users_features.items()}
+    return IntMapping.from_dict(users_codes), ItemLists.from_dict(features_ids)
+
+
+def lookup_array(mapping: Dict[int, int]) -> NDArray[np.int64]:
+    """Returns array `a` with `a[key] == mapping[key]` for small int keys"""
+    array = np.full(max(mapping.keys(), default=-1) + 1, -1, dtype=np.int64)
+    array[np.fromiter(mapping.keys(), dtype=np.int64)] = np.fromiter(mapping.values(), dtype=np.int64)
+    return array
 
 
 class SimplePopularModel:
-    def __init__(self, users_path: str, recs_path: str):
-        self.users_dictionary: Dict[int, str] = pickle.load(open(users_path, "rb"))
-        self.popular_dictionary: Dict[str, List[int]] = pickle.load(open(recs_path, "rb"))
+    def __init__(self, users_path: str, recs_path: str, store: Optional[ArtifactStore] = None):
+        store = store if store is not None else ArtifactStore()
+        self.popular_dictionary: Dict[str, List[int]]
+        (self.users_categories, self.categories), self.popular_dictionary = store.load_many(
+            [
+                ArtifactSpec(users_path, loader=pickle.load, convert=index_categories),
+                ArtifactSpec(recs_path, loader=pickle.load),
+            ]
+        )
 
-    def predict(self, user_id: int, k_recs: int) -> List[int]:
+    def save_compact(self, directory: str) -> None:
+        self.users_categories.save(directory, "users_categories")
+        save_array(directory, "categories", np.array(self.categories, dtype=np.unicode_))
+        save_array(directory, "recs_categories", np.array(list(self.popular_dictionary), dtype=np.unicode_))
+        recs = dict(enumerate(self.popular_dictionary.values()))
+        ItemLists.from_dict(recs, sort_items=False).save(directory, "recs")
+
+    @classmethod
+    def from_compact(cls, directory: str) -> "SimplePopularModel":
+        model = cls.__new__(cls)
+        model.users_categories = IntMapping.load(directory, "users_categories")
+        model.categories = load_array(directory, "categories").tolist()
+        recs = ItemLists.load(directory, "recs")
+        model.popular_dictionary = {
+            category: recs.get(code).tolist()
+            for code, category in enumerate(load_array(directory, "recs_categories").tolist())
+        }
+        return model
+
+    def _predict_for_category(self, category_code: Optional[int], k_recs: int) -> List[int]:
         try:
             # Check if user is suitable for category reco
-            category = self.users_dictionary.get(user_id, None)
+            category = self.categories[category_code] if category_code is not None else None
             if category:
                 return self.popular_dictionary[category][:k_recs]
             # If not the case, give him popular on average
@@ -26,121 +90,239 @@ class SimplePopularModel:
         except TypeError:
             return list(range(k_recs))
 
+    def predict(self, user_id: int, k_recs: int) -> List[int]:
+        return self._predict_for_category(self.users_categories.get(user_id, None), k_recs)
+
+    def predict_batch(self, user_ids: Sequence[int], k_recs: int) -> List[List[int]]:
+        codes, found = self.users_categories.get_many(np.asarray(user_ids, dtype=np.int64))
+        # There are few categories, so every distinct answer is built once
+        recos_by_code: Dict[int, List[int]] = {}
+        recos = []
+        for code in np.where(found, codes, -1).tolist():
+            if code not in recos_by_code:
+                recos_by_code[code] = self._predict_for_category(code if code >= 0 else None, k_recs)
+            recos.append(list(recos_by_code[code]))
+        return recos
+
+
+class RangeModel:
+    """Recommends items 0, ..., k - 1 to everyone, the model of `test_model` route"""
+
+    def predict(self, user_id: int, k_recs: int) -> List[int]:
+        return list(range(k_recs))
+
+    def predict_batch(self, user_ids: Sequence[int], k_recs: int) -> List[List[int]]:
+        return [list(range(k_recs)) for _ in user_ids]
+
 
 class KnnModel(ABC):
-    def __init__(self, name: str):
-        with open(f"{name}", "rb") as f:
-            self.model = dill.load(f)
+    """KNN model with the number of recos fixed at training, `k_recs` is ignored"""
+
+    def __init__(self, name: str, store: Optional[ArtifactStore] = None):
+        self.model = (store if store is not None else ArtifactStore()).load(name)
 
     @abstractmethod
-    def predict(self, user_id: int) -> Optional[List[int]]:
+    def predict(self, user_id: int, k_recs: Optional[int] = None) -> Optional[List[int]]:
         pass
 
+    def predict_batch(self, user_ids: Sequence[int], k_recs: Optional[int] = None) -> List[Optional[List[int]]]:
+        return [self.predict(user_id) for user_id in user_ids]
+
 
 class OfflineKnnModel(KnnModel):
-    def predict(self, user_id: int) -> Optional[List[int]]:
+    def predict(self, user_id: int, k_recs: Optional[int] = None) -> Optional[List[int]]:
         if user_id in self.model.keys():
             return self.model[user_id]
         return None
 
 
 class OnlineKnnModel(KnnModel):
-    def predict(self, user_id: int) -> Optional[List[int]]:
+    def predict(self, user_id: int, k_recs: Optional[int] = None) -> Optional[List[int]]:
         return self.model.predict(user_id)
 
 
-class OnlineFM:
-    """This class is implementation of recommendations generation with LightFM.
+class LightFMArtifacts:
+    """This class is the state of LightFM model shared by `OnlineFM` variants.
 
-    LightFM library realization is utilized. We use built-in method predict()
-    to generate recos both for hot users — i.e. who has interactions — and
-    cold users — i.e. who could possibly have only features. If cold user
-    has no features at all then popular model is the best option to make
-    recommendation.
+    Every artifact is loaded through `ArtifactStore`, so it is loaded once
+    per process. Hot users — i.e. who has interactions — are scored by
+    `FMScorer` over precomputed item representations. Cold users — i.e.
+    who could possibly have only features — with the same features set get
+    the same recos, so top `cold_top_n` items are memoized per distinct
+    features set.
 
     Attributes:
-        name: The model name to load
-        model: The LightFM model itself
-        user_mapping: The dictionary to make the transition
-            internal (generated during the model fitting) -> external
-        item_mapping: The dictionary to make the transition
+        user_mapping: The mapping to make the transition
             external -> internal (generated during the model fitting)
-        features_for_cold: The features values for every known cold user
-        features: The all possible features values set
-        items_internal_ids:
-        cold_with_fm: The flag to use LightFM model to to generate recos
-            for cold users having features or not (use popular instead)
+        cold_users: The features set code for every known cold user
+        cold_features: The features indices of every features set
+        scorer: The scoring engine
+        cold_top_n: The number of recos memoized per cold features set
+        cold_cache: The LRU cache features set code -> top `cold_top_n` recos
 
     """
 
     def __init__(
         self,
+        store: ArtifactStore,
         name: str,
         USER_MAPPING: str,
         ITEM_MAPPING: str,
         FEATURES_FOR_COLD: str,
         UNIQUE_FEATURES: str,
-        cold_with_fm: bool = True,
+        cold_top_n: int = 100,
+        cold_cache_size: int = 4096,
     ):
         try:
-            with open(f"{name}", "rb") as f:
-                self.model: LightFM = dill.load(f)
+            model: LightFM
+            item_mapping: Dict[int, int]
+            features: NDArray[np.unicode_]
+            model, self.user_mapping, item_mapping, features = store.load_many(
+                [
+                    # Only scoring arrays are kept from the model
+                    ArtifactSpec(name, keep=False),
+                    ArtifactSpec(USER_MAPPING, convert=IntMapping.from_dict),
+                    ArtifactSpec(ITEM_MAPPING, keep=False),
+                    ArtifactSpec(UNIQUE_FEATURES, keep=False),
+                ]
+            )
         except FileNotFoundError:
             print("Run `make script` to load a pickled object")
+            raise
+
+        # Indexing of features sets needs loaded features
+        self.cold_users, self.cold_features = store.load(
+            FEATURES_FOR_COLD, convert=partial(index_features_sets, features=features)
+        )
+        self.scorer = FMScorer.from_lightfm(model, item_mapping)
+        self._init_cache(cold_top_n, cold_cache_size)
 
-        with open(USER_MAPPING, "rb") as f:
-            self.user_mapping: Dict[int, int] = dill.load(f)
-        with open(ITEM_MAPPING, "rb") as f:
-            self.item_mapping: Dict[int, int] = dill.load(f)
-        with open(FEATURES_FOR_COLD, "rb") as f:
-            self.features_for_cold: Dict[int, Dict[str, str]] = dill.load(f)
-        with open(UNIQUE_FEATURES, "rb") as f:
-            self.features: NDArray[np.unicode_] = dill.load(f)
-
-        self.items_internal_ids = np.arange(len(self.item_mapping.keys()), dtype=int)
-        self.cold_with_fm: bool = cold_with_fm
-
-    def _get_hot_reco(self, iternal_user_id: int, k_recs: int) -> List[int]:
-        hot_scores: NDArray[np.float32] = self.model.predict(iternal_user_id, item_ids=self.items_internal_ids)
-        idxs = np.argsort(hot_scores)[::-1]
-        recs = self.items_internal_ids[idxs][:k_recs]
-        recs = [self.item_mapping[reco] for reco in recs]
-        return recs
-
-    def _get_cold_reco(self, user_feature: Dict[str, str], k_recs: int) -> List[int]:
-        user_feature_list = list(user_feature.values())
-        feature_mask = np.isin(self.features, user_feature_list)
-        feature_row = sparse.csr_matrix(feature_mask)
-
-        cold_scores: NDArray[np.float32] = self.model.predict(0, self.items_internal_ids, user_features=feature_row)
-        idxs = np.argsort(cold_scores)[::-1]
-        recs = self.items_internal_ids[idxs][:k_recs]
-        recs = [self.item_mapping[reco] for reco in recs]
-        return recs
-
-    def predict(self, user_id: int, k_recs: int) -> Optional[List[int]]:
+    def _init_cache(self, cold_top_n: int, cold_cache_size: int) -> None:
+        self.cold_top_n = cold_top_n
+        self.cold_cache: LRUCache[NDArray[np.int64]] = LRUCache(maxsize=cold_cache_size)
+
+    def save_compact(self, directory: str) -> None:
+        self.scorer.save(directory)
+        self.user_mapping.save(directory, "user_mapping")
+        self.cold_users.save(directory, "cold_users")
+        self.cold_features.save(directory, "cold_features")
+
+    @classmethod
+    def from_compact(cls, directory: str, cold_top_n: int = 100, cold_cache_size: int = 4096) -> "LightFMArtifacts":
+        artifacts = cls.__new__(cls)
+        artifacts.user_mapping = IntMapping.load(directory, "user_mapping")
+        artifacts.cold_users = IntMapping.load(directory, "cold_users")
+        artifacts.cold_features = ItemLists.load(directory, "cold_features")
+        artifacts.scorer = FMScorer.load(directory)
+        artifacts._init_cache(cold_top_n, cold_cache_size)  # pylint: disable=protected-access
+        return artifacts
+
+    def get_hot_reco(self, iternal_user_id: int, k_recs: int) -> NDArray[np.int64]:
+        return self.scorer.recommend(self.scorer.user_vector(iternal_user_id), k_recs)
+
+    def get_hot_reco_batch(self, iternal_user_ids: Sequence[int], k_recs: int) -> List[NDArray[np.int64]]:
+        return self.scorer.recommend_batch(self.scorer.user_vectors(iternal_user_ids), k_recs)
+
+    def get_cold_reco(self, features_set_code: int, k_recs: int) -> NDArray[np.int64]:
+        recs = self.cold_cache.get(features_set_code)
+        if recs is None or len(recs) < k_recs:
+            user_vector = self.scorer.features_vector(self.cold_features.get(features_set_code))
+            recs = self.scorer.recommend(user_vector, max(k_recs, self.cold_top_n))
+            self.cold_cache.put(features_set_code, recs)
+        return recs[:k_recs]
+
+
+class OnlineFM:
+    """This class is implementation of recommendations generation with LightFM.
+
+    It is a thin policy over `LightFMArtifacts`, so several variants share
+    one loaded model. If cold user has no features at all then popular
+    model is the best option to make recommendation.
+
+    Attributes:
+        artifacts: The shared LightFM state
+        cold_with_fm: The flag to use LightFM model to to generate recos
+            for cold users having features or not (use popular instead)
+
+    """
+
+    __slots__ = ("artifacts", "cold_with_fm")
+
+    def __init__(self, artifacts: LightFMArtifacts, cold_with_fm: bool = True):
+        self.artifacts = artifacts
+        self.cold_with_fm = cold_with_fm
+
+    def predict(self, user_id: int, k_recs: int) -> Optional[NDArray[np.int64]]:
         # Check if user is hot or not
-        iternal_user_id = self.user_mapping.get(user_id, None)
-        if iternal_user_id:
-            return self._get_hot_reco(iternal_user_id=iternal_user_id, k_recs=k_recs)
+        iternal_user_id = self.artifacts.user_mapping.get(user_id, None)
+        if iternal_user_id is not None:
+            return self.artifacts.get_hot_reco(iternal_user_id=iternal_user_id, k_recs=k_recs)
 
         if self.cold_with_fm:
             # Check if cold user have any features
-            user_feature = self.features_for_cold.get(user_id, None)
-            if user_feature:
-                return self._get_cold_reco(user_feature=user_feature, k_recs=k_recs)
+            features_set_code = self.artifacts.cold_users.get(user_id, None)
+            if features_set_code is not None:
+                return self.artifacts.get_cold_reco(features_set_code=features_set_code, k_recs=k_recs)
         # If not the case, let the popular model to make recos
         return None
 
+    def predict_batch(self, user_ids: Sequence[int], k_recs: int) -> List[Optional[NDArray[np.int64]]]:
+        user_ids_array = np.asarray(user_ids, dtype=np.int64)
+        recos: List[Optional[NDArray[np.int64]]] = [None] * len(user_ids_array)
+
+        iternal_user_ids, is_hot = self.artifacts.user_mapping.get_many(user_ids_array)
+        hot_positions = np.flatnonzero(is_hot)
+        if hot_positions.size:
+            hot_recos = self.artifacts.get_hot_reco_batch(iternal_user_ids[hot_positions], k_recs)
+            for position, reco in zip(hot_positions.tolist(), hot_recos):
+                recos[position] = reco
+
+        if self.cold_with_fm:
+            features_set_codes, has_features = self.artifacts.cold_users.get_many(user_ids_array)
+            for position in np.flatnonzero(~is_hot & has_features).tolist():
+                recos[position] = self.artifacts.get_cold_reco(int(features_set_codes[position]), k_recs)
+        return recos
+
+
+def load_hnsw_index(index_path: str, ef_search: Optional[int] = None) -> Any:
+    """Loads HNSW index over LightFM item embeddings
+
+    `ef_search` is the size of the candidates list kept during a query:
+    larger values give higher recall at the cost of latency. The index
+    default is used if not set.
+    """
+    index = nmslib.init(method="hnsw", space="negdotprod")
+    index.loadIndex(index_path, load_data=True)
+    if ef_search is not None:
+        index.setQueryTimeParams({"efSearch": ef_search})
+    return index
+
 
 class ANNLightFM:
+    """Recos of LightFM approximated by nearest neighbours search in HNSW index.
+
+    Watched items are filtered out of the neighbours by `SeenItemsStore`,
+    so a user is queried for `k_recs` plus the number of watched items, up
+    to `max_fetch`.
+    Popular items complete recos only when the cap leaves less than
+    `k_recs` unseen items.
+
+    Attributes:
+        num_threads: The number of threads of a batch query, all cores if 0
+        max_fetch: The maximum number of neighbours queried per user
+
+    """
+
     # pylint: disable=too-many-instance-attributes
     # Eight is reasonable in this case.
     def __init__(
         self,
         ann_paths: Tuple[str, str, str, str, str, str],
         popular_model: SimplePopularModel,
-        k: int = 10,
+        store: Optional[ArtifactStore] = None,
+        ef_search: Optional[int] = None,
+        num_threads: int = 0,
+        max_fetch: int = 1000,
     ):
         (
             user_m,
@@ -150,44 +332,112 @@ class ANNLightFM:
             watched_u2i,
             cold_reco_dict,
         ) = ann_paths
-        self.K = k
-        with open(user_m, "rb") as f:
-            self.user_m: Dict[int, int] = dill.load(f)
-        with open(item_inv_m, "rb") as f:
-            self.item_inv_m: Dict[int, int] = dill.load(f)
-        self.index = nmslib.init(method="hnsw", space="negdotprod")
-        self.index.loadIndex(index_path, load_data=True)
-        try:
-            with open(user_emb, "rb") as f:
-                self.user_emb: NDArray[np.float32] = dill.load(f)
-        except FileNotFoundError:
+        self.num_threads = num_threads
+        self.max_fetch = max_fetch
+        store = store if store is not None else ArtifactStore()
+        self.user_emb: NDArray[np.float32]
+        self.user_m, self.item_inv_m, self.user_emb, self.watched_u2i, self.cold_reco_dict = store.load_many(
+            [
+                ArtifactSpec(user_m, convert=IntMapping.from_dict),
+                ArtifactSpec(item_inv_m, convert=lookup_array),
+                ArtifactSpec(user_emb, required=False),
+                ArtifactSpec(watched_u2i, convert=SeenItemsStore.from_dict),
+                ArtifactSpec(cold_reco_dict, convert=partial(ItemLists.from_dict, sort_items=False)),
+            ]
+        )
+        if self.user_emb is None:
             print("Run `make user_emb` to load a pickled object")
-        with open(watched_u2i, "rb") as f:
-            self.watched_u2i: Dict[int, List[int]] = dill.load(f)
-        with open(cold_reco_dict, "rb") as f:
-            self.cold_reco_dict: Dict[int, List[int]] = dill.load(f)
+        self.index = load_hnsw_index(index_path, ef_search)
         self.popular_model: SimplePopularModel = popular_model
 
-    def predict(self, user_id: int) -> Optional[List[int]]:
-        if user_id in self.user_m:
-            user_vector = self.user_emb[self.user_m[user_id]]
-            pr_internal_items = self.index.knnQuery(vector=user_vector, k=self.K)[0]
-            pr_items = [self.item_inv_m[item] for item in pr_internal_items]
-
-            # Delete already seen items
-            pr_items_numpy = np.array(pr_items, dtype="uint16")
-            already_seen_items = np.array(self.watched_u2i[user_id], dtype="uint16")
-
-            unseen_items = pr_items_numpy[~np.isin(pr_items_numpy, already_seen_items)]
-            num_lost_items = self.K - unseen_items.shape[0]
-            if num_lost_items > 0:
-                popular_items = np.array(self.popular_model.predict(user_id, 5 * self.K))
-
-                popular_items = popular_items[~np.isin(popular_items, already_seen_items)]
-                popular_items = popular_items[~np.isin(popular_items, unseen_items)]
-
-                unseen_items = np.append(unseen_items, popular_items[:num_lost_items])
-                if len(unseen_items) != 10:
-                    return self.popular_model.predict(user_id, k_recs=self.K)
-            return unseen_items[: self.K].tolist()
-        return self.popular_model.predict(user_id, k_recs=self.K)
+    def with_index(self, index: Any) -> "ANNLightFM":
+        """Returns the same model searching neighbours in `index`, e.g. `ExactIndex`"""
+        model = copy.copy(self)
+        model.index = index
+        return model
+
+    def save_compact(self, directory: str) -> None:
+        self.user_m.save(directory, "user_m")
+        save_array(directory, "item_inv_m", self.item_inv_m)
+        save_array(directory, "user_emb", np.asarray(self.user_emb, dtype=np.float32))
+        self.watched_u2i.save(directory, "watched_u2i")
+        self.cold_reco_dict.save(directory, "cold_reco_dict")
+
+    @classmethod
+    def from_compact(
+        cls,
+        directory: str,
+        index_path: str,
+        popular_model: SimplePopularModel,
+        ef_search: Optional[int] = None,
+        num_threads: int = 0,
+        max_fetch: int = 1000,
+    ) -> "ANNLightFM":
+        model = cls.__new__(cls)
+        model.num_threads = num_threads
+        model.max_fetch = max_fetch
+        model.user_m = IntMapping.load(directory, "user_m")
+        model.item_inv_m = load_array(directory, "item_inv_m")
+        model.index = load_hnsw_index(index_path, ef_search)
+        model.user_emb = load_array(directory, "user_emb")
+        model.watched_u2i = SeenItemsStore.load(directory, "watched_u2i")
+        model.cold_reco_dict = ItemLists.load(directory, "cold_reco_dict")
+        model.popular_model = popular_model
+        return model
+
+    def _fetch_size(self, n_watched: NDArray[np.int64], k_recs: int) -> NDArray[np.int64]:
+        """Returns the number of neighbours to query so that `k_recs` unseen remain"""
+        return np.minimum(k_recs + n_watched, min(self.max_fetch, self.item_inv_m.shape[0]))
+
+    def _filter_seen(self, user_id: int, pr_internal_items: NDArray[np.int32], k_recs: int) -> NDArray[np.int64]:
+        unseen_items = self.watched_u2i.exclude_seen(user_id, self.item_inv_m[pr_internal_items])[:k_recs]
+        if unseen_items.shape[0] < k_recs:
+            # Only when the query is capped by `max_fetch`
+            n_watched = int(self.watched_u2i.counts(np.array([user_id]))[0])
+            popular_items = self.watched_u2i.exclude_seen(
+                user_id, np.asarray(self.popular_model.predict(user_id, k_recs + n_watched), dtype=np.int64)
+            )
+            popular_items = popular_items[~np.isin(popular_items, unseen_items)]
+            unseen_items = np.concatenate([unseen_items, popular_items[: k_recs - unseen_items.shape[0]]])
+        return unseen_items
+
+    def predict(self, user_id: int, k_recs: int) -> Reco:
+        internal_user_id = self.user_m.get(user_id, None)
+        if internal_user_id is None:
+            return self.popular_model.predict(user_id, k_recs=k_recs)
+        fetch_size = int(self._fetch_size(self.watched_u2i.counts(np.array([user_id])), k_recs)[0])
+        pr_internal_items = self.index.knnQuery(vector=self.user_emb[internal_user_id], k=fetch_size)[0]
+        return self._filter_seen(user_id, pr_internal_items, k_recs)
+
+    def predict_batch(
+        self, user_ids: Sequence[int], k_recs: int, num_threads: Optional[int] = None
+    ) -> List[Optional[Reco]]:
+        """Returns recos of every user
+
+        Hot users are queried by groups of the same fetch size rounded up
+        to a power of two, so a heavy watcher does not make the whole batch
+        over-fetch.
+        """
+        user_ids_array = np.asarray(user_ids, dtype=np.int64)
+        recos: List[Optional[Reco]] = [None] * len(user_ids_array)
+
+        internal_user_ids, is_hot = self.user_m.get_many(user_ids_array)
+        hot_positions = np.flatnonzero(is_hot)
+        if hot_positions.size:
+            fetch_sizes = self._fetch_size(self.watched_u2i.counts(user_ids_array[hot_positions]), k_recs)
+            buckets = np.minimum(2 ** np.ceil(np.log2(np.maximum(fetch_sizes, 1))).astype(np.int64), fetch_sizes.max())
+            for fetch_size in np.unique(buckets).tolist():
+                positions = hot_positions[buckets == fetch_size]
+                neighbours = self.index.knnQueryBatch(
+                    self.user_emb[internal_user_ids[positions]],
+                    k=fetch_size,
+                    num_threads=self.num_threads if num_threads is None else num_threads,
+                )
+                for position, (pr_internal_items, _) in zip(positions.tolist(), neighbours):
+                    recos[position] = self._filter_seen(int(user_ids_array[position]), pr_internal_items, k_recs)
+
+        cold_positions = np.flatnonzero(~is_hot).tolist()
+        cold_recos = self.popular_model.predict_batch(user_ids_array[cold_positions], k_recs=k_recs)
+        for position, reco in zip(cold_positions, cold_recos):
+            recos[position] = reco
+        return recos
@@ -0,0 +1,236 @@
+import asyncio
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock
+from typing import (
+    Any,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+)
+from uuid import uuid4
+from weakref import WeakValueDictionary
+
+import numpy as np
+
+from service.log import app_logger
+
+
+def _array_sizeof(array: np.ndarray, seen: Set[int]) -> int:
+    # Array owning its data already reports it in `sys.getsizeof`,
+    # memory-mapped and foreign buffers are not on the process heap
+    base: Any = array.base
+    if isinstance(base, np.ndarray):
+        return sys.getsizeof(array) + deep_sizeof(base, seen)
+    return sys.getsizeof(array)
+
+
+def _referents_sizeof(obj: Any, seen: Set[int]) -> int:
+    if isinstance(obj, dict):
+        return sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sum(deep_sizeof(item, seen) for item in obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return 0
+    size = deep_sizeof(vars(obj), seen) if hasattr(obj, "__dict__") else 0
+    for slot in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, slot):
+            size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """Estimates memory used by `obj` and everything it references.
+
+    Objects already present in `seen` are not counted again, which allows
+    to attribute shared state only to the first model referencing it.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return _array_sizeof(obj, seen)
+    return sys.getsizeof(obj) + _referents_sizeof(obj, seen)
+
+
+class ModelBuilder(Protocol):
+    def build(self, name: str) -> Any:
+        ...
+
+
+# Every model set of the process by its key, forked processes inherit it
+_model_sets: "WeakValueDictionary[str, ModelSet]" = WeakValueDictionary()
+# The last model set built on unpickling in a process pool worker. Task
+# arguments are dropped after every task, so it would be built again
+# by every next task without this reference. Older sets are released.
+_restored: "Optional[ModelSet]" = None
+
+
+def _restore_model_set(key: str, version: str, builder: Optional[ModelBuilder], enabled: Set[str]) -> "ModelSet":
+    global _restored  # pylint: disable=global-statement
+    model_set = _model_sets.get(key, None)
+    if model_set is None:
+        model_set = ModelSet(version=version, builder=builder, enabled=enabled)
+        model_set.key = key
+        _model_sets[key] = model_set
+        _restored = model_set
+    return model_set
+
+
+class ModelSet:
+    """Snapshot of served models.
+
+    Requests pin the snapshot they started with, so a reload never mixes
+    models of different versions within one request. Enabled models
+    missing from `models` are built by `builder` on first use.
+
+    A model set is pickled by reference: a process pool worker forked
+    after it was created uses the same models, other workers build their
+    own ones lazily.
+
+    Attributes:
+        models: The loaded models by their route name
+        version: The version of artifacts the models are loaded from, see
+            `loaders.artifacts_version`
+        builder: The builder of not yet loaded models
+        enabled: The names of models which are served
+        in_flight: The number of requests using the snapshot
+        key: The unique key of the snapshot within the process tree
+
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        models: Optional[Dict[str, Any]] = None,
+        version: str = "",
+        builder: Optional[ModelBuilder] = None,
+        enabled: Optional[Iterable[str]] = None,
+    ):
+        self.models = dict(models or {})
+        self.version = version
+        self.builder = builder
+        self.enabled = set(enabled if enabled is not None else self.models)
+        self.in_flight = 0
+        self.key = uuid4().hex
+        self._locks: DefaultDict[str, Lock] = defaultdict(Lock)
+        self._lock = Lock()
+        _model_sets[self.key] = self
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return _restore_model_set, (self.key, self.version, self.builder, self.enabled)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.enabled
+
+    def get(self, name: str) -> Any:
+        model = self.models.get(name, None)
+        if model is not None:
+            return model
+        if name not in self.enabled or self.builder is None:
+            raise KeyError(name)
+        with self._lock:
+            lock = self._locks[name]
+        with lock:
+            if name not in self.models:
+                started_at = time.monotonic()
+                self.models[name] = self.builder.build(name)
+                app_logger.info("Model %s loaded in %.1f s", name, time.monotonic() - started_at)
+        return self.models[name]
+
+    def is_loaded(self, names: Iterable[str]) -> bool:
+        return all(name in self.models for name in names)
+
+    def warm_up(self, names: Iterable[str], max_workers: int = 1) -> None:
+        """Loads `names` using up to `max_workers` threads"""
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warm_up") as executor:
+            for _ in executor.map(self.get, names):
+                pass
+
+
+class ModelRegistry:
+    """Keeps all served models by their route name.
+
+    Models may share state with each other, see `ArtifactStore`. The
+    registry holds the current `ModelSet`, which is replaced as a whole
+    by `swap`; `version` identifies the loaded artifacts and
+    `generation` counts swaps in this process.
+    """
+
+    def __init__(self) -> None:
+        self.current = ModelSet()
+        self.generation = 0
+        self._lock = Lock()
+
+    @property
+    def version(self) -> str:
+        return self.current.version
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.current
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.current.models)
+
+    def register(self, name: str, model: Any) -> Any:
+        self.current.models[name] = model
+        self.current.enabled.add(name)
+        return model
+
+    def get(self, name: str) -> Any:
+        return self.current.get(name)
+
+    def swap(self, model_set: ModelSet) -> ModelSet:
+        """Makes `model_set` current and returns the replaced set"""
+        with self._lock:
+            previous = self.current
+            self.current = model_set
+            self.generation += 1
+        return previous
+
+    @contextmanager
+    def acquire(self) -> Iterator[ModelSet]:
+        """Pins the current model set for the duration of a request"""
+        with self._lock:
+            model_set = self.current
+            model_set.in_flight += 1
+        try:
+            yield model_set
+        finally:
+            with self._lock:
+                model_set.in_flight -= 1
+
+    async def drain(self, model_set: ModelSet, timeout: float, poll_interval: float = 0.01) -> bool:
+        """Waits until no request uses `model_set`, returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while model_set.in_flight > 0:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(poll_interval)
+        return True
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Returns estimated bytes per model
+
+        State shared between models is attributed to the first model
+        registered with it, so the values sum up to the total usage.
+        """
+        seen: Set[int] = set()
+        return {name: deep_sizeof(model, seen) for name, model in self.current.models.items()}
+
+    def log_memory_usage(self) -> None:
+        usage = self.memory_usage()
+        for name, size in usage.items():
+            app_logger.info("Model %s uses %.1f MiB", name, size / 2**20)
+        app_logger.info("Models use %.1f MiB in total", sum(usage.values()) / 2**20)
@@ -0,0 +1,58 @@
+from typing import (
+    Dict,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+)
+
+from .arrays import Reco
+
+
+class Recommender(Protocol):
+    """Interface of every served model.
+
+    A model returns `None` or empty recos for users it knows nothing
+    about, they are recommended by the fallbacks of the route.
+    """
+
+    def predict(self, user_id: int, k_recs: int) -> Optional[Reco]:
+        ...
+
+    def predict_batch(self, user_ids: Sequence[int], k_recs: int) -> Sequence[Optional[Reco]]:
+        ...
+
+
+class Route(NamedTuple):
+    """Models queried for `/reco/{name}`: the model of the route, then its fallbacks in order.
+
+    Attributes:
+        name: The route name
+        chain: The names of models, every next one recommends to users
+            left without recos by the previous ones
+
+    """
+
+    name: str
+    chain: Tuple[str, ...]
+
+
+def build_routes(
+    names: Iterable[str],
+    default_fallbacks: Sequence[str],
+    fallbacks: Optional[Mapping[str, Sequence[str]]] = None,
+) -> Dict[str, Route]:
+    """Returns routes of models `names`, keyed by name
+
+    Every route falls back to `default_fallbacks` unless its own chain is
+    set in `fallbacks`, e.g. `{"ann_lightfm": ["light_fm_2", "popular"]}`.
+    """
+    fallbacks = fallbacks or {}
+    routes: Dict[str, Route] = {}
+    for name in names:
+        chain = dict.fromkeys([name, *fallbacks.get(name, default_fallbacks)])
+        routes[name] = Route(name, tuple(chain))
+    return routes
@@ -0,0 +1,84 @@
+from typing import Iterable, Mapping
+
+import numpy as np
+from numpy.typing import NDArray
+
+from service.metrics import SEEN_FILTER_SECONDS
+
+from .arrays import ItemLists, isin_sorted
+
+
+class SeenItemsStore:
+    """Items already seen by every user, used to filter them out of recos.
+
+    Items are kept in CSR layout of sorted int32 arrays, see `ItemLists`,
+    which is memory-mapped when loaded from compact files and shared by
+    all workers. A candidate is checked with binary search over the user
+    items. Users with more than `heavy_threshold` items also get a bitset
+    row over the item ids, so their check does not depend on history
+    length. Bitsets are built at load time from the lists.
+
+    Attributes:
+        lists: The seen items of every user
+        heavy_threshold: The number of items above which a user gets a bitset
+        heavy_users: The sorted users having a bitset row
+        bitsets: The (len(heavy_users), n_bytes) bitsets, bit `i` of a row
+            is set if the user has seen item `i`
+
+    """
+
+    __slots__ = ("lists", "heavy_threshold", "heavy_users", "bitsets")
+
+    def __init__(self, lists: ItemLists, heavy_threshold: int = 1000):
+        self.lists = lists
+        self.heavy_threshold = heavy_threshold
+        lengths = np.diff(lists.offsets)
+        heavy_positions = np.flatnonzero(lengths > heavy_threshold)
+        self.heavy_users = lists.keys[heavy_positions]
+        n_bytes = int(lists.items.max()) // 8 + 1 if heavy_positions.size else 0
+        self.bitsets = np.zeros((heavy_positions.shape[0], n_bytes), dtype=np.uint8)
+        for row, position in enumerate(heavy_positions.tolist()):
+            items = lists.items[lists.offsets[position] : lists.offsets[position + 1]]
+            np.bitwise_or.at(self.bitsets[row], items >> 3, np.left_shift(1, items & 7).astype(np.uint8))
+
+    @classmethod
+    def from_dict(cls, mapping: Mapping[int, Iterable[int]], heavy_threshold: int = 1000) -> "SeenItemsStore":
+        return cls(ItemLists.from_dict(mapping), heavy_threshold)
+
+    def save(self, directory: str, name: str) -> None:
+        self.lists.save(directory, name)
+
+    @classmethod
+    def load(cls, directory: str, name: str, heavy_threshold: int = 1000) -> "SeenItemsStore":
+        return cls(ItemLists.load(directory, name), heavy_threshold)
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.lists
+
+    def get(self, user_id: int) -> NDArray[np.int32]:
+        """Returns sorted items seen by `user_id`, empty array for unknown user"""
+        return self.lists.get(user_id)
+
+    def counts(self, user_ids: NDArray[np.int64]) -> NDArray[np.int64]:
+        """Returns the number of items seen by every user"""
+        return self.lists.get_lengths(user_ids)
+
+    def seen_mask(self, user_id: int, candidates: NDArray) -> NDArray[np.bool_]:
+        """Returns the mask of `candidates` seen by `user_id`"""
+        candidates = np.asarray(candidates)
+        row = int(np.searchsorted(self.heavy_users, user_id))
+        if row < self.heavy_users.shape[0] and self.heavy_users[row] == user_id:
+            bitset = self.bitsets[row]
+            in_range = (candidates >= 0) & (candidates < bitset.shape[0] * 8)
+            clipped = np.where(in_range, candidates, 0)
+            return in_range & ((bitset[clipped >> 3] >> (clipped & 7)) & 1).astype(bool)
+        return isin_sorted(candidates, self.lists.get(user_id))
+
+    def exclude_seen(self, user_id: int, candidates: NDArray) -> NDArray:
+        """Returns `candidates` not seen by `user_id` keeping their order"""
+        with SEEN_FILTER_SECONDS.time():
+            candidates = np.asarray(candidates)
+            return candidates[~self.seen_mask(user_id, candidates)]
@@ -0,0 +1,77 @@
+"""Compact on-disk format of model artifacts.
+
+Every artifact is a directory of plain `.npy` files: sorted id arrays,
+CSR-style offsets for per-user item lists and float32 matrices. They are
+opened with `np.load(mmap_mode="r")`, so loading takes milliseconds,
+pages are shared between processes through the page cache and, unlike
+dill, loading never executes code.
+
+A converted directory holds a manifest with modification times and
+sizes of the files it was converted from. It is written after every
+array, so an interrupted conversion is never loaded, and compact files
+are only used while the source files are unchanged.
+"""
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, List, Literal, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+def array_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.npy")
+
+
+def save_array(directory: str, name: str, array: NDArray) -> None:
+    os.makedirs(directory, exist_ok=True)
+    np.save(array_path(directory, name), np.ascontiguousarray(array), allow_pickle=False)
+
+
+MANIFEST = "manifest.json"
+
+MmapMode = Literal["r", "r+", "w+", "c"]
+
+
+def load_array(directory: str, name: str, mmap_mode: Optional[MmapMode] = "r") -> NDArray:
+    return np.load(array_path(directory, name), mmap_mode=mmap_mode, allow_pickle=False)
+
+
+def source_stats(sources: Iterable[str]) -> Dict[str, List[int]]:
+    """Returns modification time in ns and size of every existing file of `sources`"""
+    stats = {}
+    for path in sources:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stats[path] = [stat.st_mtime_ns, stat.st_size]
+    return stats
+
+
+def write_manifest(directory: str, sources: Iterable[str]) -> None:
+    """Marks conversion of `directory` from `sources` finished"""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"sources": source_stats(sources)}, f)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+
+def remove_manifest(directory: str) -> None:
+    try:
+        os.remove(os.path.join(directory, MANIFEST))
+    except FileNotFoundError:
+        pass
+
+
+def is_compact(directory: str, sources: Iterable[str] = ()) -> bool:
+    """Checks if artifact in compact format converted from current `sources` exists at `directory`
+
+    Sources missing on disk are not compared, so compact files may be
+    deployed without the files they were converted from.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as f:
+            converted_from = json.load(f)["sources"]
+    except (OSError, ValueError, KeyError):
+        return False
+    return all(converted_from.get(path) == stat for path, stat in source_stats(sources).items())
@@ -1,4 +1,3 @@
-import json
 import typing as tp
 from http import HTTPStatus
 
@@ -8,30 +7,61 @@ from pydantic import BaseModel
 
 from service.models import Error
 
+# NumPy arrays are serialized natively, without `.tolist()`
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
 
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o: tp.Any) -> tp.Any:
-        if isinstance(o, BaseModel):
-            return o.dict()
-        try:
-            orjson.dumps(o)
-        except TypeError:
-            return str(o)
-        return super().default(o)
+
+def orjson_default(o: tp.Any) -> tp.Any:
+    """Serializes objects unknown to orjson"""
+    if isinstance(o, BaseModel):
+        return o.dict()
+    return str(o)
+
+
+def dumps(content: tp.Any) -> bytes:
+    return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS | orjson.OPT_NON_STR_KEYS)
 
 
 class DataclassJSONResponse(JSONResponse):
     media_type = "application/json"
 
     def render(self, content: tp.Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-            cls=EnhancedJSONEncoder,
-        ).encode("utf-8")
+        return dumps(content)
+
+
+class RecoJSONResponse(JSONResponse):
+    """Response with recos rendered by orjson.
+
+    It is returned by recommendation endpoints as is, so FastAPI skips
+    validation and re-encoding of `response_model`. Items may be a list
+    or a NumPy int array. The version of models which computed recos is
+    sent in the `X-Model-Version` header.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: tp.Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+MODEL_VERSION_HEADER = "X-Model-Version"
+
+
+def _version_headers(version: tp.Optional[str]) -> tp.Optional[tp.Dict[str, str]]:
+    return {MODEL_VERSION_HEADER: version} if version else None
+
+
+def reco_response(user_id: int, items: tp.Any, version: tp.Optional[str] = None) -> JSONResponse:
+    return RecoJSONResponse({"user_id": user_id, "items": items}, headers=_version_headers(version))
+
+
+def reco_batch_response(
+    user_ids: tp.Sequence[int], recos: tp.Sequence[tp.Any], version: tp.Optional[str] = None
+) -> JSONResponse:
+    return RecoJSONResponse(
+        {"recos": [{"user_id": user_id, "items": items} for user_id, items in zip(user_ids, recos)]},
+        headers=_version_headers(version),
+    )
 
 
 def create_response(
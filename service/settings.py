@@ -1,3 +1,5 @@
+import typing as tp
+
 from pydantic import BaseSettings
 
 
@@ -9,22 +11,158 @@ class Config(BaseSettings):
 class LogConfig(Config):
     level: str = "INFO"
     datetime_format: str = "%Y-%m-%d %H:%M:%S"
+    use_queue: bool = False
+    queue_size: int = 10000
+    batch_size: int = 256
+    flush_interval: float = 0.5
+    info_sample_rate: float = 1.0
 
     class Config:
         case_sensitive = False
+        env_prefix = "log_"
         fields = {
             "level": {"env": ["log_level"]},
         }
 
 
+class ExecutorConfig(Config):
+    kind: str = "thread"
+    max_workers: tp.Optional[int] = None
+    max_concurrency: int = 4
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "executor_"
+
+
+class BatchingConfig(Config):
+    enabled: bool = False
+    max_batch_size: int = 64
+    max_delay_ms: float = 2.0
+    models: tp.List[str] = ["ann_lightfm", "light_fm_1", "light_fm_2"]
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "batching_"
+
+
+class CacheConfig(Config):
+    enabled: bool = False
+    maxsize: int = 100_000
+    ttl_seconds: tp.Optional[float] = None
+    sqlite_path: tp.Optional[str] = None
+    models: tp.List[str] = ["online_knn", "light_fm_1", "light_fm_2", "ann_lightfm"]
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "cache_"
+
+
+class ModelsConfig(Config):
+    # Served models, all of them if not set
+    enabled: tp.Optional[tp.List[str]] = None
+    # eager: load in the master process before fork,
+    # background: warm up in every worker after start,
+    # lazy: load on first request
+    loading: str = "eager"
+    warmup_workers: int = 4
+    # Artifact files of one model loaded at once, in threads
+    # or with unpickling in a process pool
+    artifact_workers: int = 4
+    artifact_processes: bool = False
+    # Seconds worker startup waits for background warm-up
+    startup_budget: tp.Optional[float] = None
+    # Fallback chains of routes, popular model if not set,
+    # e.g. {"ann_lightfm": ["light_fm_2", "popular"]}
+    fallbacks: tp.Dict[str, tp.List[str]] = {}
+    # Builders of plugin models by route name, called with `ModelFactory`,
+    # e.g. {"my_model": "package.module:build_model"}
+    plugins: tp.Dict[str, str] = {}
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "models_"
+
+
+class AnnConfig(Config):
+    # HNSW query candidates list size, index default if not set
+    ef_search: tp.Optional[int] = None
+    # Threads of a batch query, all cores if 0
+    num_threads: int = 0
+    # Neighbours queried per user at most, watched items are filtered out of them
+    max_fetch: int = 1000
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "ann_"
+
+
+class ExactConfig(Config):
+    # Storage of item matrix of ann_lightfm_exact: float32, float16 or int8
+    dtype: str = "float32"
+    block_size: int = 16384
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "exact_"
+
+
+class MetricsConfig(Config):
+    # Directory where every process writes its metrics to aggregate them
+    # across gunicorn workers and a process pool, only the process serving
+    # `/metrics` is reported if not set. Gunicorn config sets it by default
+    directory: tp.Optional[str] = None
+    flush_interval: float = 1.0
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "metrics_"
+
+
+class ProfilingConfig(Config):
+    # Requests are profiled only if enabled: sampled ones and ones with the header,
+    # which is honoured only together with the bearer `token` of admin endpoints
+    enabled: bool = False
+    sample_rate: float = 0.0
+    header: str = "X-Profile"
+    token: str = "Team_5"
+    directory: str = "profiles"
+    max_profiles: int = 200
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "profiling_"
+
+
 class ServiceConfig(Config):
     service_name: str = "reco_service"
     k_recs: int = 10
+    max_batch_size: int = 10000
+    reload_drain_timeout: float = 30.0
+    # Workers reload models when `/admin/reload` bumps the number in this file
+    reload_generation_path: tp.Optional[str] = "models/reload_generation"
+    reload_poll_interval: float = 1.0
 
     log_config: LogConfig
+    executor_config: ExecutorConfig
+    batching_config: BatchingConfig
+    cache_config: CacheConfig
+    models_config: ModelsConfig
+    ann_config: AnnConfig
+    exact_config: ExactConfig
+    metrics_config: MetricsConfig
+    profiling_config: ProfilingConfig
 
 
 def get_config() -> ServiceConfig:
     return ServiceConfig(
         log_config=LogConfig(),
+        executor_config=ExecutorConfig(),
+        batching_config=BatchingConfig(),
+        cache_config=CacheConfig(),
+        models_config=ModelsConfig(),
+        ann_config=AnnConfig(),
+        exact_config=ExactConfig(),
+        metrics_config=MetricsConfig(),
+        profiling_config=ProfilingConfig(),
     )
@@ -0,0 +1,40 @@
+import asyncio
+import typing as tp
+
+from service.api.batching import MicroBatcher
+
+
+def test_micro_batcher_coalesces_concurrent_requests() -> None:
+    batches: tp.List[tp.List[int]] = []
+
+    async def run_batch(user_ids: tp.List[int], k_recs: int) -> tp.List[tp.List[int]]:
+        batches.append(user_ids)
+        return [[user_id] * k_recs for user_id in user_ids]
+
+    async def scenario() -> tp.List[tp.List[int]]:
+        batcher = MicroBatcher(run_batch, max_batch_size=3, max_delay=0.01)
+        return await asyncio.gather(*(batcher.predict(user_id, 2) for user_id in range(4)))
+
+    recos = asyncio.new_event_loop().run_until_complete(scenario())
+    assert recos == [[0, 0], [1, 1], [2, 2], [3, 3]]
+    assert batches == [[0, 1, 2], [3]]
+
+
+def test_micro_batcher_keeps_running_batches() -> None:
+    running: tp.List[int] = []
+
+    async def scenario() -> tp.List[int]:
+        async def run_batch(user_ids: tp.List[int], k_recs: int) -> tp.List[tp.List[int]]:
+            running.append(len(batcher._tasks))  # pylint: disable=protected-access
+            await asyncio.sleep(0)
+            return [[user_id] * k_recs for user_id in user_ids]
+
+        batcher = MicroBatcher(run_batch, max_batch_size=2, max_delay=0.01)
+        recos = await asyncio.gather(*(batcher.predict(user_id, 1) for user_id in range(2)))
+        await asyncio.sleep(0)
+        running.append(len(batcher._tasks))  # pylint: disable=protected-access
+        return [reco[0] for reco in recos]
+
+    assert asyncio.new_event_loop().run_until_complete(scenario()) == [0, 1]
+    # The batch task is referenced while it runs and released after
+    assert running == [1, 0]
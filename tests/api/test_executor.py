@@ -0,0 +1,29 @@
+import asyncio
+import threading
+from concurrent.futures.thread import ThreadPoolExecutor
+
+from service.api.executor import PredictExecutor
+
+
+def test_predict_executor_limits_concurrency_per_model() -> None:
+    executor = PredictExecutor(ThreadPoolExecutor(max_workers=4), max_concurrency=1)
+    release = threading.Event()
+
+    def slow() -> str:
+        release.wait(timeout=5)
+        return threading.current_thread().name
+
+    async def scenario() -> None:
+        tasks = [asyncio.ensure_future(executor.run("slow", slow)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert executor.stats()["slow"] == {"queued": 2, "running": 1}
+
+        # Other models and the loop itself stay responsive
+        assert await executor.run("fast", len, [1, 2]) == 2
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert executor.stats()["slow"] == {"queued": 0, "running": 0}
+
+    asyncio.new_event_loop().run_until_complete(scenario())
+    executor.shutdown()
@@ -0,0 +1,20 @@
+from http import HTTPStatus
+
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from service.api.middlewares import add_middlewares
+
+
+def test_unhandled_exception_returns_server_error() -> None:
+    app = FastAPI()
+
+    @app.get("/fail")
+    async def fail() -> None:
+        raise RuntimeError("boom")
+
+    add_middlewares(app)
+    with TestClient(app=app) as client:
+        response = client.get("/fail")
+    assert response.status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert response.json()["errors"][0]["error_key"] == "server_error"
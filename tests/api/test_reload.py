@@ -0,0 +1,62 @@
+import asyncio
+import typing as tp
+from pathlib import Path
+
+from service.api.reload import ModelReloader
+from service.reco_models import ModelRegistry, ModelSet
+
+
+def test_reloader_swaps_models_and_runs_callbacks() -> None:
+    registry = ModelRegistry()
+    registry.register("model", "old")
+    swaps: tp.List[str] = []
+
+    def build() -> ModelSet:
+        return ModelSet({"model": "new"}, version="new_artifacts")
+
+    reloader = ModelReloader(registry, build, drain_timeout=1.0, on_swap=[lambda: swaps.append(registry.version)])
+    asyncio.new_event_loop().run_until_complete(reloader.reload())
+
+    assert registry.get("model") == "new"
+    assert swaps == ["new_artifacts"]
+    assert registry.generation == 1
+    assert reloader.status() == {"version": "new_artifacts", "generation": 0, "state": "idle", "error": None}
+
+
+def test_failed_reload_keeps_serving_models() -> None:
+    registry = ModelRegistry()
+    registry.register("model", "old")
+
+    def build() -> ModelSet:
+        raise FileNotFoundError("models/lightfm.dill")
+
+    reloader = ModelReloader(registry, build)
+    asyncio.new_event_loop().run_until_complete(reloader.reload())
+
+    assert registry.get("model") == "old"
+    assert registry.generation == 0
+    assert reloader.state == "failed"
+
+
+def test_reload_is_broadcast_to_other_workers(tmp_path: Path) -> None:
+    generation_path = str(tmp_path / "reload_generation")
+    registry, other_registry = ModelRegistry(), ModelRegistry()
+
+    def build() -> ModelSet:
+        return ModelSet({"model": "new"})
+
+    reloader = ModelReloader(registry, build, generation_path=generation_path)
+    other_reloader = ModelReloader(other_registry, build, generation_path=generation_path, poll_interval=0)
+
+    async def scenario() -> None:
+        other_reloader.poll()
+        assert not other_reloader.in_progress
+        assert reloader.start()
+        other_reloader.poll()
+        assert other_reloader.in_progress
+        while reloader.in_progress or other_reloader.in_progress:
+            await asyncio.sleep(0.01)
+
+    asyncio.new_event_loop().run_until_complete(scenario())
+    assert other_registry.get("model") == "new"
+    assert reloader.generation == other_reloader.generation == 1
@@ -1,10 +1,36 @@
 from http import HTTPStatus
+from pathlib import Path
+from typing import List, Optional, Sequence
 
 from starlette.testclient import TestClient
 
+from service.api.app import create_app
+from service.api.views import predict_batch
+from service.reco_models import ModelSet, RangeModel, Route
+from service.reco_models.loaders import ModelFactory
 from service.settings import ServiceConfig
 
 GET_RECO_PATH = "/reco/{model_name}/{user_id}"
+GET_RECO_BATCH_PATH = "/reco/{model_name}/batch"
+
+
+class ParityModel:
+    """Recommends `item` to users with ids of `parity` only"""
+
+    def __init__(self, item: int, parity: int):
+        self.item = item
+        self.parity = parity
+
+    def predict(self, user_id: int, k_recs: int) -> Optional[List[int]]:
+        return [self.item] * k_recs if user_id % 2 == self.parity else None
+
+    def predict_batch(self, user_ids: Sequence[int], k_recs: int) -> List[Optional[List[int]]]:
+        return [self.predict(user_id, k_recs) for user_id in user_ids]
+
+
+def build_plugin_model(factory: ModelFactory) -> RangeModel:
+    assert isinstance(factory, ModelFactory)
+    return RangeModel()
 
 
 def test_health(
@@ -63,3 +89,102 @@ def test_bearer_failed(
         response = client.get(path, headers={"Authorization": f"Bearer {incorrect_bearer}"})
     assert response.status_code == HTTPStatus.UNAUTHORIZED
     assert response.json()["errors"][0]["error_key"] == "incorrect_bearer_key"
+
+
+def test_get_reco_batch_success(
+    client: TestClient,
+    service_config: ServiceConfig,
+) -> None:
+    user_ids = [1, 2, 3]
+    path = GET_RECO_BATCH_PATH.format(model_name="test_model")
+    with client:
+        response = client.post(path, json={"user_ids": user_ids}, headers={"Authorization": "Bearer Team_5"})
+    assert response.status_code == HTTPStatus.OK
+    recos = response.json()["recos"]
+    assert [reco["user_id"] for reco in recos] == user_ids
+    assert all(len(reco["items"]) == service_config.k_recs for reco in recos)
+
+
+def test_get_reco_batch_for_unknown_model(
+    client: TestClient,
+) -> None:
+    path = GET_RECO_BATCH_PATH.format(model_name="_")
+    with client:
+        response = client.post(path, json={"user_ids": [1]}, headers={"Authorization": "Bearer Team_5"})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json()["errors"][0]["error_key"] == "model_not_found"
+
+
+def test_executor_stats(
+    client: TestClient,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="test_model", user_id=1)
+    with client:
+        client.get(path, headers={"Authorization": "Bearer Team_5"})
+        response = client.get("/health/executor")
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["test_model"] == {"queued": 0, "running": 0}
+
+
+def test_get_reco_tagged_with_model_version(
+    client: TestClient,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="test_model", user_id=123)
+    with client:
+        response = client.get(path, headers={"Authorization": "Bearer Team_5"})
+        status = client.get("/admin/reload", headers={"Authorization": "Bearer Team_5"})
+    assert response.headers["X-Model-Version"] == str(status.json()["version"])
+
+
+def test_metrics_report_reco_latency(
+    client: TestClient,
+) -> None:
+    path = GET_RECO_PATH.format(model_name="test_model", user_id=123)
+    with client:
+        client.get(path, headers={"Authorization": "Bearer Team_5"})
+        response = client.get("/metrics")
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'reco_request_seconds_count{model="test_model",endpoint="reco"}' in response.text
+    assert 'reco_stage_seconds_count{model="test_model",stage="scoring"}' in response.text
+
+
+def test_profiled_request_is_stored(
+    service_config: ServiceConfig,
+    tmp_path: Path,
+) -> None:
+    service_config.profiling_config.enabled = True
+    service_config.profiling_config.directory = str(tmp_path)
+    path = GET_RECO_PATH.format(model_name="test_model", user_id=123)
+    with TestClient(app=create_app(service_config)) as client:
+        client.get(path, headers={"Authorization": "Bearer Team_5"})
+        client.get(path, headers={"Authorization": "Bearer Team_5", "X-Profile": "1"})
+        # The header is ignored without the admin token
+        client.get(path, headers={"X-Profile": "1"})
+        profiles = client.get("/admin/profiles", headers={"Authorization": "Bearer Team_5"})
+        stacks = client.get("/admin/profiles/test_model", headers={"Authorization": "Bearer Team_5"})
+    assert profiles.json() == {"test_model": 1}
+    assert "predict (views.py" in stacks.text
+
+
+def test_fallback_chain_fills_missing_recos() -> None:
+    models = ModelSet({"even": ParityModel(7, 0), "odd": ParityModel(8, 1), "popular": RangeModel()})
+
+    route = Route("even", ("even", "popular"))
+    assert predict_batch(models, route, [1, 2, 3], 2) == [[0, 1], [7, 7], [0, 1]]
+    route = Route("even", ("even", "odd", "popular"))
+    assert predict_batch(models, route, [1, 2, 3], 2) == [[8, 8], [7, 7], [8, 8]]
+    route = Route("even", ("even",))
+    assert predict_batch(models, route, [1, 2], 2) == [[], [7, 7]]
+
+
+def test_plugin_model_is_served(
+    service_config: ServiceConfig,
+) -> None:
+    service_config.models_config.enabled = ["test_model", "plugin"]
+    service_config.models_config.plugins = {"plugin": "tests.api.test_views:build_plugin_model"}
+    path = GET_RECO_PATH.format(model_name="plugin", user_id=123)
+    with TestClient(app=create_app(service_config)) as client:
+        response = client.get(path, headers={"Authorization": "Bearer Team_5"})
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["items"] == list(range(service_config.k_recs))
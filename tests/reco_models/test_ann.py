@@ -0,0 +1,75 @@
+import typing as tp
+
+import numpy as np
+
+from service.reco_models.arrays import IntMapping
+from service.reco_models.reco_models import ANNLightFM
+from service.reco_models.seen_items import SeenItemsStore
+
+N_ITEMS = 200
+
+
+class _ExactIndex:
+    """Exact stand-in of HNSW index with `negdotprod` space"""
+
+    def __init__(self, items: np.ndarray):
+        self.items = items
+
+    def knnQuery(self, vector: np.ndarray, k: int) -> tp.Tuple[np.ndarray, np.ndarray]:
+        scores = self.items @ vector
+        ids = np.argsort(-scores, kind="stable")[:k]
+        return ids.astype(np.int32), -scores[ids]
+
+    def knnQueryBatch(self, vectors: np.ndarray, k: int, num_threads: int = 0) -> tp.List[tp.Tuple]:
+        return [self.knnQuery(vector, k) for vector in vectors]
+
+
+class _Popular:
+    def predict(self, user_id: int, k_recs: int) -> tp.List[int]:
+        return list(range(100_000, 100_000 + k_recs))
+
+    def predict_batch(self, user_ids: tp.Sequence[int], k_recs: int) -> tp.List[tp.List[int]]:
+        return [self.predict(user_id, k_recs) for user_id in user_ids]
+
+
+def _model(max_fetch: int = 1000) -> ANNLightFM:
+    rng = np.random.default_rng(0)
+    model = ANNLightFM.__new__(ANNLightFM)
+    model.num_threads = 0
+    model.max_fetch = max_fetch
+    model.user_m = IntMapping.from_dict({1: 0, 2: 1})
+    # External ids above uint16 range
+    model.item_inv_m = np.arange(N_ITEMS, dtype=np.int64) + 70_000
+    model.user_emb = rng.random((2, 8), dtype=np.float32)
+    model.index = _ExactIndex(rng.random((N_ITEMS, 8), dtype=np.float32))
+    top = model.index.knnQuery(model.user_emb[0], N_ITEMS)[0]
+    # User 1 has watched its 50 best items
+    model.watched_u2i = SeenItemsStore.from_dict({1: (model.item_inv_m[top[:50]]).tolist()})
+    model.popular_model = _Popular()
+    return model
+
+
+def test_heavy_watcher_gets_unseen_neighbours() -> None:
+    model = _model()
+    watched = model.watched_u2i.get(1)
+    top = model.index.knnQuery(model.user_emb[0], N_ITEMS)[0]
+
+    reco = model.predict(1, 20)
+
+    assert np.asarray(reco).tolist() == model.item_inv_m[top[50:70]].tolist()
+    assert not np.isin(reco, watched).any()
+
+
+def test_capped_fetch_is_completed_with_popular() -> None:
+    model = _model(max_fetch=55)
+    reco = model.predict(1, 10)
+    assert len(reco) == 10
+    assert np.asarray(reco[5:]).tolist() == list(range(100_000, 100_005))
+
+
+def test_predict_batch_matches_predict() -> None:
+    model = _model()
+    recos = model.predict_batch([1, 2, 3], 7)
+    assert [np.asarray(reco).tolist() for reco in recos] == [
+        np.asarray(model.predict(user_id, 7)).tolist() for user_id in (1, 2, 3)
+    ]
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import numpy as np
+
+from service.reco_models.arrays import IntMapping, ItemLists
+
+
+def test_int_mapping_behaves_like_dict() -> None:
+    mapping = {10: 1, 3: 2, 7: 0}
+    int_mapping = IntMapping.from_dict(mapping)
+
+    assert len(int_mapping) == 3
+    assert all(int_mapping.get(key) == value for key, value in mapping.items())
+    assert int_mapping.get(5) is None
+    assert 11 not in int_mapping
+
+    values, found = int_mapping.get_many(np.array([7, 8, 10]))
+    assert found.tolist() == [True, False, True]
+    assert values[found].tolist() == [0, 1]
+
+
+def test_item_lists_returns_sorted_items() -> None:
+    item_lists = ItemLists.from_dict({5: [3, 1, 2], 1: [], 2: {9}})
+
+    assert item_lists.get(5).tolist() == [1, 2, 3]
+    assert item_lists.get(1).tolist() == []
+    assert item_lists.get(2).tolist() == [9]
+    assert item_lists.get(4).tolist() == []
+    assert 2 in item_lists
+
+
+def test_compact_containers_roundtrip(tmp_path: Path) -> None:
+    directory = str(tmp_path)
+    IntMapping.from_dict({4: 40, 2: 20}).save(directory, "mapping")
+    ItemLists.from_dict({1: [7, 5, 6]}, sort_items=False).save(directory, "lists")
+
+    mapping = IntMapping.load(directory, "mapping")
+    lists = ItemLists.load(directory, "lists")
+
+    keys: np.ndarray = mapping.keys
+    assert isinstance(keys, np.memmap)
+    assert mapping.get(2) == 20
+    assert lists.get(1).tolist() == [7, 5, 6]
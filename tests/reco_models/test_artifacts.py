@@ -0,0 +1,35 @@
+import pickle
+from pathlib import Path
+
+from service.reco_models.artifacts import ArtifactSpec, ArtifactStore
+
+
+def _dump(path: Path, obj: object) -> str:
+    with open(path, "wb") as f:
+        pickle.dump(obj, f)
+    return str(path)
+
+
+def test_load_many_keeps_order_and_shares_artifacts(tmp_path: Path) -> None:
+    first = _dump(tmp_path / "first.pickle", {1: 2})
+    second = _dump(tmp_path / "second.pickle", [3, 4])
+    store = ArtifactStore(max_workers=2)
+
+    loaded = store.load_many([ArtifactSpec(first), ArtifactSpec(second, convert=len)])
+
+    assert loaded == [{1: 2}, 2]
+    assert store.load(first) is loaded[0]
+    assert set(store.stats) == {first, second}
+    assert store.stats[first].file_size > 0
+
+
+def test_load_many_skips_missing_optional_and_not_kept(tmp_path: Path) -> None:
+    path = _dump(tmp_path / "model.pickle", {"model": 1})
+    store = ArtifactStore(max_workers=2)
+
+    loaded = store.load_many(
+        [ArtifactSpec(path, keep=False), ArtifactSpec(str(tmp_path / "missing.pickle"), required=False)]
+    )
+
+    assert loaded == [{"model": 1}, None]
+    assert path not in store
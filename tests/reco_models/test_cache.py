@@ -0,0 +1,78 @@
+import asyncio
+import sqlite3
+import time
+from pathlib import Path
+
+from service.reco_models.cache import (
+    LRUCache,
+    ResponseCache,
+    SqliteCacheBackend,
+)
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache: LRUCache[int] = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_lru_cache_expires_entries() -> None:
+    cache: LRUCache[int] = LRUCache(maxsize=2, ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_response_cache_is_keyed_by_models_version(tmp_path: Path) -> None:
+    backend = SqliteCacheBackend(str(tmp_path / "cache.sqlite"))
+    cache = ResponseCache(maxsize=10, backend=backend)
+    cache.put("light_fm_1", 1, 10, [1, 2, 3], version="a1")
+
+    assert cache.get("light_fm_1", 1, 10, version="a1") == [1, 2, 3]
+    assert cache.get("light_fm_1", 1, 10, version="b2") is None
+    assert cache.get("light_fm_1", 1, 5, version="a1") is None
+
+    other_worker_cache = ResponseCache(maxsize=10, backend=SqliteCacheBackend(str(tmp_path / "cache.sqlite")))
+    assert other_worker_cache.get("light_fm_1", 1, 10, version="a1") == [1, 2, 3]
+    assert other_worker_cache.stats()["shared_hits"] == 1
+
+    cache.invalidate()
+    assert cache.get("light_fm_1", 1, 10, version="a1") is None
+
+
+def test_response_cache_queries_backend_off_event_loop(tmp_path: Path) -> None:
+    cache = ResponseCache(maxsize=10, backend=SqliteCacheBackend(str(tmp_path / "cache.sqlite")))
+    other_worker_cache = ResponseCache(maxsize=10, backend=SqliteCacheBackend(str(tmp_path / "cache.sqlite")))
+
+    async def run() -> None:
+        await cache.put_async("light_fm_1", 1, 10, [1, 2, 3], version="a1")
+        assert await other_worker_cache.get_async("light_fm_1", 1, 10, version="a1") == [1, 2, 3]
+        assert await other_worker_cache.get_async("light_fm_1", 2, 10, version="a1") is None
+
+    asyncio.run(run())
+    assert other_worker_cache.stats()["shared_hits"] == 1
+
+
+def test_invalidate_purges_expired_and_other_versions(tmp_path: Path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(maxsize=10, backend=SqliteCacheBackend(path, ttl=60.0))
+    cache.put("light_fm_1", 1, 10, [1], version="a1")
+    cache.put("light_fm_1", 2, 10, [2], version="b2")
+    cache.put("light_fm_1", 3, 10, [3], version="b2")
+    expired = SqliteCacheBackend(path, ttl=-1.0)
+    expired.put("b2:light_fm_1:4:10", [4])
+
+    cache.invalidate("b2")
+
+    with sqlite3.connect(path) as connection:
+        keys = [row[0] for row in connection.execute("SELECT key FROM recos ORDER BY key")]
+    assert keys == ["b2:light_fm_1:2:10", "b2:light_fm_1:3:10"]
+    assert cache.get("light_fm_1", 2, 10, version="b2") == [2]
+    assert cache.stats()["shared_hits"] == 1
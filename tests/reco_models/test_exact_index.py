@@ -0,0 +1,42 @@
+# pylint: disable=redefined-outer-name
+import numpy as np
+import pytest
+
+from service.reco_models.exact_index import ExactIndex
+
+
+@pytest.fixture
+def vectors() -> np.ndarray:
+    return np.random.default_rng(0).standard_normal((1000, 16)).astype(np.float32)
+
+
+def test_knn_query_matches_full_sort(vectors: np.ndarray) -> None:
+    query = np.random.default_rng(1).standard_normal(16).astype(np.float32)
+    index = ExactIndex.from_vectors(vectors, block_size=128)
+
+    ids, distances = index.knnQuery(query, k=10)
+
+    scores = vectors @ query
+    assert ids.tolist() == np.argsort(-scores)[:10].tolist()
+    assert np.allclose(distances, -scores[ids])
+
+
+def test_knn_query_batch_matches_knn_query(vectors: np.ndarray) -> None:
+    queries = np.random.default_rng(2).standard_normal((300, 16)).astype(np.float32)
+    index = ExactIndex.from_vectors(vectors, block_size=300)
+
+    neighbours = index.knnQueryBatch(queries, k=5)
+
+    assert len(neighbours) == 300
+    for query, (ids, _) in zip(queries, neighbours):
+        assert ids.tolist() == index.knnQuery(query, k=5)[0].tolist()
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_index_keeps_most_neighbours(vectors: np.ndarray, dtype: str) -> None:
+    queries = np.random.default_rng(3).standard_normal((50, 16)).astype(np.float32)
+    exact = ExactIndex.from_vectors(vectors).knnQueryBatch(queries, k=10)
+    quantized = ExactIndex.from_vectors(vectors, dtype=dtype).knnQueryBatch(queries, k=10)
+
+    hits = sum(np.intersect1d(e, q).shape[0] for (e, _), (q, _) in zip(exact, quantized))
+    assert hits / 500 > 0.9
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from service.reco_models.fm_scoring import (
+    FMScorer,
+    top_k_indices,
+    top_k_indices_batch,
+)
+
+
+def test_top_k_indices_matches_full_sort() -> None:
+    rng = np.random.default_rng(42)
+    scores = rng.random(1000, dtype=np.float32)
+    expected = np.argsort(-scores)[:10]
+    assert np.array_equal(top_k_indices(scores, 10), expected)
+
+
+def test_top_k_indices_k_greater_than_catalog() -> None:
+    scores = np.array([0.1, 0.3, 0.2], dtype=np.float32)
+    assert top_k_indices(scores, 10).tolist() == [1, 2, 0]
+
+
+def test_fm_scorer_recommend_matches_dot_product() -> None:
+    rng = np.random.default_rng(0)
+    item_embeddings = rng.random((50, 8), dtype=np.float32)
+    item_biases = rng.random(50, dtype=np.float32)
+    model = SimpleNamespace(
+        get_item_representations=lambda: (item_biases, item_embeddings),
+        user_embeddings=rng.random((5, 8), dtype=np.float32),
+    )
+    item_mapping = {internal_id: internal_id + 1000 for internal_id in range(50)}
+    scorer = FMScorer.from_lightfm(model, item_mapping)
+
+    user_vector = scorer.user_vector(3)
+    scores = item_embeddings @ model.user_embeddings[3] + item_biases
+    expected = [item_mapping[idx] for idx in np.argsort(-scores)[:10]]
+    assert scorer.recommend(user_vector, 10).tolist() == expected
+
+
+def test_top_k_indices_batch_matches_rows() -> None:
+    rng = np.random.default_rng(1)
+    scores = rng.random((7, 300), dtype=np.float32)
+    expected = np.stack([top_k_indices(row, 10) for row in scores])
+    assert np.array_equal(top_k_indices_batch(scores, 10), expected)
@@ -0,0 +1,51 @@
+# pylint: disable=redefined-outer-name
+import typing as tp
+from pathlib import Path
+
+import dill
+import pytest
+
+from service.reco_models import PopularInCategory
+
+MODEL: tp.Dict[str, tp.Dict[tp.Any, tp.Any]] = {
+    "user_to_watched_items_map": {1: {10, 11}, 2: {30, 20, 21, 22}},
+    "user_to_category_map": {1: "kids", 2: "kids", 3: "adults"},
+    "category_to_popular_recs": {
+        "kids": [10, 20, 12, 11],
+        "adults": [30, 31],
+        "default": [20, 21, 22, 23, 24, 30],
+    },
+}
+
+
+def reference_predict(user_id: int, k: int) -> tp.List[int]:
+    watched = MODEL["user_to_watched_items_map"].get(user_id, set())
+    category = MODEL["user_to_category_map"].get(user_id, "default")
+    result: tp.List[int] = []
+    for item_id in MODEL["category_to_popular_recs"][category]:
+        if item_id not in watched and len(result) < k:
+            result.append(item_id)
+    for item_id in MODEL["category_to_popular_recs"]["default"]:
+        if item_id not in watched and item_id not in result and len(result) < k:
+            result.append(item_id)
+    return result + [item_id + 1 for item_id in range(k - len(result))]
+
+
+@pytest.fixture
+def model(tmp_path: Path) -> PopularInCategory:
+    model_path = tmp_path / "popular_in_category_model.dill"
+    with open(model_path, "wb") as f:
+        dill.dump(MODEL, f)
+    return PopularInCategory(str(model_path))
+
+
+@pytest.mark.parametrize("user_id", [1, 2, 3, 4])
+@pytest.mark.parametrize("k", [1, 3, 10])
+def test_predict_matches_reference(model: PopularInCategory, user_id: int, k: int) -> None:
+    assert model.predict(user_id, k) == reference_predict(user_id, k)
+
+
+def test_compact_model_predicts_the_same(model: PopularInCategory, tmp_path: Path) -> None:
+    model.save_compact(str(tmp_path / "compact"))
+    compact_model = PopularInCategory.from_compact(str(tmp_path / "compact"))
+    assert compact_model.predict_batch([1, 2, 3, 4], 5) == model.predict_batch([1, 2, 3, 4], 5)
@@ -0,0 +1,90 @@
+import asyncio
+import multiprocessing
+import pickle
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from service.reco_models.registry import ModelRegistry, ModelSet
+
+
+class _Model:
+    def __init__(self, state: np.ndarray):
+        self.state = state
+
+
+def test_shared_state_is_counted_once() -> None:
+    shared = np.zeros(10**6, dtype=np.float32)
+    registry = ModelRegistry()
+    registry.register("first", _Model(shared))
+    registry.register("second", _Model(shared))
+
+    usage = registry.memory_usage()
+    assert usage["first"] > shared.nbytes
+    assert usage["second"] < shared.nbytes
+
+
+def test_swap_keeps_pinned_model_set_until_drained() -> None:
+    registry = ModelRegistry()
+    registry.register("model", "old")
+
+    async def scenario() -> None:
+        with registry.acquire() as models:
+            previous = registry.swap(ModelSet({"model": "new"}))
+            assert previous is models
+            assert models.get("model") == "old"
+            assert registry.get("model") == "new"
+            assert not await registry.drain(previous, timeout=0.01)
+        assert await registry.drain(previous, timeout=0.01)
+
+    asyncio.new_event_loop().run_until_complete(scenario())
+    assert registry.generation == 1
+
+
+class _Builder:
+    def __init__(self) -> None:
+        self.built: tp.List[str] = []
+
+    def build(self, name: str) -> str:
+        self.built.append(name)
+        return name.upper()
+
+
+def test_model_set_builds_enabled_models_once() -> None:
+    builder = _Builder()
+    model_set = ModelSet(builder=builder, enabled=["first", "second"])
+
+    assert not model_set.is_loaded(["first"])
+    model_set.warm_up(["first", "second"], max_workers=2)
+    assert model_set.get("first") == "FIRST"
+    assert model_set.is_loaded(["first", "second"])
+    assert sorted(builder.built) == ["first", "second"]
+    assert "third" not in model_set
+    with pytest.raises(KeyError):
+        model_set.get("third")
+
+
+def test_model_set_is_pickled_by_reference() -> None:
+    model_set = ModelSet({"model": object()})
+    assert pickle.loads(pickle.dumps(model_set)) is model_set
+
+
+class _UniqueBuilder:
+    def build(self, name: str) -> str:
+        return uuid4().hex
+
+
+def _get_model(model_set: ModelSet) -> str:
+    return model_set.get("model")
+
+
+def test_restored_model_set_is_kept_by_pool_worker() -> None:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as executor:
+        # Worker is forked before the model set is created, so it is restored by unpickling
+        executor.submit(sum, [1]).result()
+        model_set = ModelSet(builder=_UniqueBuilder(), enabled=["model"])
+        models = [executor.submit(_get_model, model_set).result() for _ in range(3)]
+    assert len(set(models)) == 1
@@ -0,0 +1,14 @@
+from service.reco_models.routes import Route, build_routes
+
+
+def test_routes_fall_back_to_defaults() -> None:
+    routes = build_routes(["knn", "ann_lightfm"], ("popular",), {"ann_lightfm": ["light_fm_2", "popular"]})
+
+    assert routes["knn"] == Route("knn", ("knn", "popular"))
+    assert routes["ann_lightfm"] == Route("ann_lightfm", ("ann_lightfm", "light_fm_2", "popular"))
+
+
+def test_route_chain_has_no_repeated_models() -> None:
+    routes = build_routes(["popular_in_chain"], ("popular",), {"popular_in_chain": ["popular", "popular_in_chain"]})
+
+    assert routes["popular_in_chain"].chain == ("popular_in_chain", "popular")
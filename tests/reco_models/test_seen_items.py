@@ -0,0 +1,43 @@
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from service.reco_models.seen_items import SeenItemsStore
+
+SEEN: tp.Dict[int, tp.List[int]] = {1: [5, 3, 70_000], 2: list(range(0, 3000, 2)), 3: []}
+
+
+def test_exclude_seen_keeps_candidates_order() -> None:
+    store = SeenItemsStore.from_dict(SEEN, heavy_threshold=100)
+    candidates = np.array([70_000, 4, 3, 2, 1, 5000, -1])
+
+    assert store.exclude_seen(1, candidates).tolist() == [4, 2, 1, 5000, -1]
+    # User 2 is a heavy one checked by bitset
+    assert store.heavy_users.tolist() == [2]
+    assert store.exclude_seen(2, candidates).tolist() == [70_000, 3, 1, 5000, -1]
+    assert store.exclude_seen(3, candidates).tolist() == candidates.tolist()
+    assert store.exclude_seen(4, candidates).tolist() == candidates.tolist()
+
+
+def test_bitset_matches_sorted_lists() -> None:
+    heavy = SeenItemsStore.from_dict(SEEN, heavy_threshold=0)
+    light = SeenItemsStore.from_dict(SEEN)
+    candidates = np.random.default_rng(0).integers(0, 4000, size=500)
+
+    for user_id in SEEN:
+        assert heavy.seen_mask(user_id, candidates).tolist() == light.seen_mask(user_id, candidates).tolist()
+    assert light.counts(np.array([1, 2, 3, 4])).tolist() == [3, 1500, 0, 0]
+
+
+def test_store_loads_memory_mapped(tmp_path: Path) -> None:
+    directory = str(tmp_path)
+    SeenItemsStore.from_dict(SEEN).save(directory, "seen")
+
+    store = SeenItemsStore.load(directory, "seen", heavy_threshold=100)
+
+    items: np.ndarray = store.lists.items
+    assert isinstance(items, np.memmap)
+    assert store.heavy_users.tolist() == [2]
+    assert store.get(1).tolist() == [3, 5, 70_000]
+    assert store.exclude_seen(2, np.array([2, 3])).tolist() == [3]
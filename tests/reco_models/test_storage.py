@@ -0,0 +1,44 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+from service.reco_models.loaders import artifacts_version
+from service.reco_models.storage import (
+    is_compact,
+    remove_manifest,
+    save_array,
+    write_manifest,
+)
+
+
+def test_compact_artifact_is_used_while_sources_are_unchanged(tmp_path: Path) -> None:
+    source = tmp_path / "model.dill"
+    source.write_bytes(b"model")
+    directory = str(tmp_path / "compact")
+    save_array(directory, "array", np.arange(3))
+
+    # Conversion is not finished until the manifest is written
+    assert not is_compact(directory, [str(source)])
+    write_manifest(directory, [str(source)])
+    assert is_compact(directory, [str(source)])
+
+    source.write_bytes(b"retrained model")
+    os.utime(source, ns=(0, 0))
+    assert not is_compact(directory, [str(source)])
+
+    # Compact files are served alone if sources are not deployed
+    source.unlink()
+    assert is_compact(directory, [str(source)])
+    remove_manifest(directory)
+    assert not is_compact(directory, [str(source)])
+
+
+def test_artifacts_version_changes_with_files(tmp_path: Path) -> None:
+    paths = [str(tmp_path / "model.dill"), str(tmp_path / "missing.dill")]
+    (tmp_path / "model.dill").write_bytes(b"model")
+    version = artifacts_version(paths)
+
+    assert artifacts_version(paths) == version
+    (tmp_path / "model.dill").write_bytes(b"retrained model")
+    assert artifacts_version(paths) != version
@@ -0,0 +1,50 @@
+import io
+import logging
+import queue
+
+from service.log import (
+    BatchingQueueListener,
+    DroppingQueueHandler,
+    SamplingFilter,
+)
+from service.metrics import LOG_RECORDS_DROPPED
+
+
+def test_dropping_queue_handler_counts_dropped_records() -> None:
+    log_queue: queue.Queue = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(log_queue)
+    record = logging.LogRecord("app", logging.INFO, __file__, 0, "message", None, None)
+    dropped_before = LOG_RECORDS_DROPPED.values.get((), 0)
+
+    handler.handle(record)
+    handler.handle(record)
+
+    assert log_queue.qsize() == 1
+    assert handler.dropped == 1
+    assert LOG_RECORDS_DROPPED.values[()] == dropped_before + 1
+
+
+def test_listener_logs_dropped_records_on_stop() -> None:
+    log_queue: queue.Queue = queue.Queue(maxsize=1)
+    queue_handler = DroppingQueueHandler(log_queue)
+    stream = io.StringIO()
+    listener = BatchingQueueListener(
+        log_queue, {"app": [logging.StreamHandler(stream)]}, flush_interval=0.01, queue_handler=queue_handler
+    )
+    record = logging.LogRecord("app", logging.INFO, __file__, 0, "message", None, None)
+    queue_handler.handle(record)
+    queue_handler.handle(record)
+
+    listener.ensure_started()
+    listener.stop()
+
+    assert stream.getvalue().splitlines() == ["message", "Dropped 1 log records since the queue was full"]
+
+
+def test_sampling_filter_keeps_warnings() -> None:
+    sampling_filter = SamplingFilter(rate=0.0)
+    info = logging.LogRecord("app", logging.INFO, __file__, 0, "message", None, None)
+    warning = logging.LogRecord("app", logging.WARNING, __file__, 0, "message", None, None)
+
+    assert not sampling_filter.filter(info)
+    assert sampling_filter.filter(warning)
@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import time
+import typing as tp
+from pathlib import Path
+
+from service.metrics import MetricsRegistry
+
+
+def _registry(directory: str, flush_interval: float = 60.0) -> MetricsRegistry:
+    registry = MetricsRegistry(directory, flush_interval)
+    registry.counter("requests_total", "Requests", ("model",))
+    registry.gauge("queued", "Queued requests", ("model",))
+    registry.histogram("latency_seconds", "Latency", ("model",), buckets=(0.1, 1.0))
+    return registry
+
+
+def _observe_in_worker(registry: MetricsRegistry) -> None:
+    registry.metrics["requests_total"].inc(2, model="a")  # type: ignore
+    registry.metrics["queued"].set(5, model="a")  # type: ignore
+    registry.metrics["latency_seconds"].observe(0.5, model="a")  # type: ignore
+
+
+def test_histogram_is_rendered_cumulative() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("model",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, model="a")
+    histogram.observe(0.5, model="a")
+    histogram.observe(2, model="a")
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{model="a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{model="a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{model="a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{model="a"} 3' in lines
+
+
+def test_metrics_are_summed_over_processes(tmp_path: Path) -> None:
+    registry = _registry(str(tmp_path))
+    registry.metrics["requests_total"].inc(model="a")  # type: ignore
+    registry.metrics["queued"].set(1, model="a")  # type: ignore
+
+    # Forked worker starts with empty values and flushes its own ones on exit
+    worker = multiprocessing.get_context("fork").Process(target=_observe_in_worker, args=(registry,))
+    worker.start()
+    worker.join()
+
+    lines = registry.render().splitlines()
+
+    assert 'requests_total{model="a"} 3' in lines
+    assert 'latency_seconds_count{model="a"} 1' in lines
+    # Gauges of exited processes are dropped
+    assert 'queued{model="a"} 1' in lines
+    # Files of the exited worker are merged into a single one, which is not summed twice
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == ["exited.json"]
+    assert registry.render().splitlines() == lines
+
+
+def _observe_until_stopped(registry: MetricsRegistry, stopped: tp.Any) -> None:
+    _observe_in_worker(registry)
+    registry.flush()
+    stopped.wait()
+
+
+def test_gauges_of_live_processes_are_summed(tmp_path: Path) -> None:
+    registry = _registry(str(tmp_path))
+    context = multiprocessing.get_context("fork")
+    stopped = context.Event()
+    worker = context.Process(target=_observe_until_stopped, args=(registry, stopped))
+    worker.start()
+    deadline = time.monotonic() + 5
+    while not list(tmp_path.glob("metrics_*.json")) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    lines = registry.render().splitlines()
+    stopped.set()
+    worker.join()
+
+    assert 'queued{model="a"} 5' in lines
+    assert 'requests_total{model="a"} 2' in lines
+
+
+def test_idle_process_flushes_periodically(tmp_path: Path) -> None:
+    registry = _registry(str(tmp_path), flush_interval=0.01)
+    registry.metrics["requests_total"].inc(model="a")  # type: ignore
+
+    deadline = time.monotonic() + 5
+    while not list(tmp_path.glob(f"metrics_{os.getpid()}_*.json")) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    registry.close()
+
+    (path,) = tmp_path.glob(f"metrics_{os.getpid()}_*.json")
+    assert '"requests_total": [[["a"], 1]]' in path.read_text()
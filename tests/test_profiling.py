@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from service.profiling import (
+    ProfileRing,
+    RequestProfile,
+    folded_stacks,
+    profiled_call,
+)
+
+
+def _leaf(n: int) -> list:
+    return sorted(range(n), key=lambda x: -x)
+
+
+def _root() -> int:
+    _leaf(20_000)
+    return 1
+
+
+def test_profiles_are_folded_into_stacks(tmp_path: Path) -> None:
+    result, stats = profiled_call(_root)
+    profile = RequestProfile()
+    profile.add(stats)
+    ring = ProfileRing(str(tmp_path), max_profiles=2)
+    ring.save("light_fm_1", profile.stats())
+    ring.save("light_fm_1", profile.stats())
+
+    n_profiles, merged = ring.load("light_fm_1")
+
+    assert result == 1
+    assert n_profiles == 2
+    stacks = folded_stacks(merged)
+    assert any(line.startswith("_root (test_profiling.py:15);_leaf (test_profiling.py:11);") for line in stacks)
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in stacks)
+
+
+def test_profile_ring_keeps_latest_profiles(tmp_path: Path) -> None:
+    ring = ProfileRing(str(tmp_path), max_profiles=2)
+    _, stats = profiled_call(_root)
+    for route in ("knn", "knn", "ann_lightfm"):
+        ring.save(route, stats)
+
+    assert ring.routes() == {"knn": 1, "ann_lightfm": 1}
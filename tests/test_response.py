@@ -0,0 +1,21 @@
+import numpy as np
+import orjson
+
+from service.models import Error
+from service.response import create_response, reco_response
+
+
+def test_reco_response_serializes_numpy_items() -> None:
+    response = reco_response(42, np.array([3, 1, 2], dtype=np.int64))
+    assert orjson.loads(response.body) == {"user_id": 42, "items": [3, 1, 2]}
+
+
+def test_error_response_serializes_pydantic_models() -> None:
+    error = Error(error_key="user_not_found", error_message="User is unknown", error_loc=("path", "user_id"))
+    response = create_response(404, errors=[error])
+    assert response.status_code == 404
+    assert orjson.loads(response.body) == {
+        "errors": [
+            {"error_key": "user_not_found", "error_message": "User is unknown", "error_loc": ["path", "user_id"]}
+        ]
+    }
@@ -0,0 +1,24 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from service import configuration
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_synthetic_knn_is_loaded_by_fresh_interpreter(tmp_path: Path) -> None:
+    # The documented way to generate artifacts, the module is run as `__main__`
+    command = [sys.executable, "-m", "benchmarks.synthetic", "--root", str(tmp_path)]
+    command += ["--users", "300", "--cold-users", "50", "--items", "200", "--components", "4"]
+    subprocess.run(command, cwd=ROOT, check=True, capture_output=True)  # nosec
+    code = (
+        "import dill\n"
+        f"with open({str(tmp_path / configuration.ONLINE_KNN_MODEL_PATH)!r}, 'rb') as f:\n"
+        "    model = dill.load(f)\n"
+        "print(len(model.predict(next(iter(model.neighbours)))))\n"
+    )
+
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True)  # nosec
+
+    assert int(loaded.stdout) > 0